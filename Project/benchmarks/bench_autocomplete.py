@@ -0,0 +1,57 @@
+# Compare the old per-keystroke scan with the NameIndex lookup on a large guild.
+# The old scan stops at the first 15 substring hits in channel order, so it is
+# cheap for common queries but unranked; misses and typos scan everything.
+# Run from the Project directory: python benchmarks/bench_autocomplete.py
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channelindex import NameIndex
+
+WORDS = ["general", "chat", "memes", "announcements", "support", "ticket", "voice", "art",
+         "music", "gaming", "clips", "rules", "welcome", "bots", "staff", "logs", "events", "trade"]
+
+
+def make_channels(n, seed=7):
+    rng = random.Random(seed)
+    return [(i, "-".join(rng.sample(WORDS, rng.randint(1, 3))) + f"-{i}", i) for i in range(n)]
+
+
+def old_scan(channels, current, limit=15):
+    choices = []
+    for cid, name, _ in channels:
+        if current.lower() in name.lower():
+            choices.append(cid)
+        if len(choices) >= limit:
+            break
+    return choices
+
+
+def timed(fn, repeat=200):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def main():
+    print(f"{'channels':>9} {'query':>10} {'scan µs':>10} {'index µs':>10}")
+    for n in (500, 5000, 20000):
+        channels = make_channels(n)
+        index = NameIndex()
+        for cid, name, pos in channels:
+            index.add(cid, name, pos)
+        recent = [cid for cid, _, _ in channels[:10]]
+        for query in ("", "ge", "announ", "suport", "zzz"):
+            scan = timed(lambda: old_scan(channels, query))
+            indexed = timed(lambda: index.search(query, 15, recent))
+            print(f"{n:>9} {query!r:>10} {scan:>10.1f} {indexed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
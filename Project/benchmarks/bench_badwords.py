@@ -0,0 +1,71 @@
+# Compare the old linear BAD_WORDS scan with the compiled matcher.
+# Run from the Project directory: python benchmarks/bench_badwords.py
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wordfilter import BadWordMatcher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHAT_WORDS = (
+    "hey guys anyone online today the new update is out check announcements "
+    "script key free paid ticket giveaway lol gg nice bro thanks help please "
+    "how do i get a key where is the download link it is not working for me"
+).split()
+
+
+def load_words():
+    with open(os.path.join(ROOT, "badwords.txt"), "r", encoding="utf-8") as f:
+        return [w.strip().lower() for w in f if w.strip()]
+
+
+def build_corpus(n=5000, seed=42):
+    rnd = random.Random(seed)
+    with open(os.path.join(ROOT, "automsg.json"), "r", encoding="utf-8") as f:
+        corpus = [line.strip() for line in f if line.strip()]
+    while len(corpus) < n:
+        corpus.append(" ".join(rnd.choice(CHAT_WORDS) for _ in range(rnd.randint(2, 25))))
+    return corpus
+
+
+def linear_scan(bad_words, content):
+    content_lower = content.lower()
+    for bad in bad_words:
+        if bad and bad in content_lower:
+            return bad
+    return None
+
+
+def run(label, fn, corpus, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for msg in corpus:
+            fn(msg)
+        best = min(best, time.perf_counter() - start)
+    per_msg = best / len(corpus) * 1e6
+    print(f"{label:<32} {per_msg:8.2f} µs/msg  {len(corpus) / best:10.0f} msg/s")
+    return per_msg
+
+
+def main():
+    words = load_words()
+    corpus = build_corpus()
+    print(f"{len(words)} bad words, {len(corpus)} messages")
+
+    start = time.perf_counter()
+    matcher = BadWordMatcher(words)
+    print(f"automaton build: {(time.perf_counter() - start) * 1000:.1f} ms")
+    boundary = BadWordMatcher(words, word_boundary=True, normalize=True)
+
+    base = run("linear scan (old)", lambda m: linear_scan(words, m), corpus)
+    fast = run("BadWordMatcher", matcher.find, corpus)
+    run("BadWordMatcher boundary+normalize", boundary.find, corpus)
+    print(f"speedup: {base / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
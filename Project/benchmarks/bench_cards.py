@@ -0,0 +1,81 @@
+# Rank / leaderboard card throughput, in-process and through the process pool.
+# Run from the Project directory: python benchmarks/bench_cards.py
+import asyncio
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import cards
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample_avatar():
+    buf = io.BytesIO()
+    Image.new("RGB", (256, 256), (40, 120, 200)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def rank_data(i):
+    return {
+        "name": f"member{i}", "rank": "A", "level": 10 + i % 30,
+        "total_xp": 20000 + i, "daily_xp": 300 + i % 200,
+        "xp_progress": i % 1000, "xp_needed": 1000, "color": 0xE74C3C,
+    }
+
+
+def board_data(i):
+    rows = [(n + 1, f"member{n}", "B", 500 - n * 10, 10, 0xE67E22) for n in range(15)]
+    return {"title": f"Guild {i} — Daily Leaderboard", "subtitle": "Page 1/1", "rows": rows}
+
+
+def report(label, n, seconds):
+    print(f"{label:<34} {n / seconds:8.1f} cards/s  ({seconds / n * 1000:.1f} ms/card)")
+
+
+async def pooled(renderer, n, avatar):
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        renderer.rank_card((i,), rank_data(i), fetch_avatar=lambda: asyncio.sleep(0, avatar))
+        for i in range(n)
+    ))
+    report(f"rank, pool x{renderer.workers}", n, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(renderer.rank_card((i,), rank_data(i)) for i in range(n)))
+    report("rank, cache hits", n, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(renderer.leaderboard_card((i,), board_data(i)) for i in range(n // 2)))
+    report(f"leaderboard, pool x{renderer.workers}", n // 2, time.perf_counter() - start)
+
+
+def main(n=60):
+    avatar = sample_avatar()
+    cards.load_assets(ROOT)
+
+    start = time.perf_counter()
+    for i in range(n):
+        cards.render_rank_card(rank_data(i), avatar)
+    report("rank, in-process", n, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(n // 2):
+        cards.render_leaderboard_card(board_data(i))
+    report("leaderboard, in-process", n // 2, time.perf_counter() - start)
+
+    renderer = cards.CardRenderer(ROOT, workers=max(1, min(4, os.cpu_count() or 1)), cache_size=n * 2)
+    renderer.start()
+    try:
+        asyncio.run(pooled(renderer, n, avatar))
+    finally:
+        renderer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# Per-message hot paths of bot.py, measured against the real module: the
+# bad-word check (real badwords.txt), the link check, XP / level / rank math,
+# the leaderboard embed and update_recent_channel. The database pool and the
+# guild are stand-ins, so no token or network is needed.
+# Results are written as JSON; pass --compare with an older file to see deltas.
+# Run from the Project directory:
+#   python benchmarks/bench_hotpath.py [--output FILE] [--compare OLD.json]
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bot
+from bench_badwords import build_corpus
+
+GUILD_ID = 1000
+DOMAINS = ["youtube.com", "github.com", "tenor.com", "cdn.discordapp.com", "imgur.com",
+           "free-nitro.gift", "bit.ly", "example.org", "pastebin.com"]
+
+
+class StubConn:
+    async def fetchval(self, *args):
+        return None
+
+
+class StubAcquire:
+    async def __aenter__(self):
+        return StubConn()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class StubPool:
+    # Every lookup misses, like a member who never had state saved
+    def acquire(self, timeout=None):
+        return StubAcquire()
+
+
+class StubMember:
+    def __init__(self, uid):
+        self.id = uid
+        self.mention = f"<@{uid}>"
+
+
+class StubGuild:
+    def __init__(self, gid, members):
+        self.id = gid
+        self.name = "Benchmark Guild"
+        self.icon = None
+        self.vanity_url_code = None
+        self._members = {m.id: m for m in members}
+
+    def get_member(self, uid):
+        return self._members.get(uid)
+
+
+class StubChannel:
+    def __init__(self, cid):
+        self.id = cid
+
+
+class StubMessage:
+    def __init__(self, guild, content):
+        self.guild = guild
+        self.content = content
+
+
+def link_corpus(n=2000, seed=3):
+    # Mostly plain chat, some allowed / blocked links and own-guild invites
+    rnd = random.Random(seed)
+    chat = build_corpus(n, seed)
+    out = []
+    for msg in chat[:n]:
+        roll = rnd.random()
+        if roll < 0.15:
+            msg += f" https://{rnd.choice(DOMAINS)}/watch?v={rnd.randint(1, 10 ** 6)}"
+        elif roll < 0.18:
+            msg += " discord.gg/benchguild"
+        out.append(msg)
+    return out
+
+
+def measure(fn, inputs, repeat):
+    # Best-of-repeat mean time per call, in ns
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for x in inputs:
+            fn(x)
+        best = min(best, time.perf_counter() - start)
+    return best / len(inputs) * 1e9
+
+
+def measure_async(loop, fn, inputs, repeat):
+    async def once():
+        for x in inputs:
+            await fn(x)
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loop.run_until_complete(once())
+        best = min(best, time.perf_counter() - start)
+    return best / len(inputs) * 1e9
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_all(repeat):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    bot.state_store.pool = StubPool()
+    bot.invite_cache.put("benchguild", GUILD_ID)
+
+    corpus = build_corpus()
+    links = link_corpus()
+    members = [StubMember(uid) for uid in range(1, 5001)]
+    guild = StubGuild(GUILD_ID, members)
+    rnd = random.Random(11)
+    board = bot.leaderboards.board(GUILD_ID)
+    for m in members:
+        board.set(m.id, rnd.randint(1, 800), rnd.randint(1000, 2_000_000))
+    xp_values = [int(10 ** (i / 250)) for i in range(2000)]  # 1 .. ~10M, log-spaced
+    daily_values = [rnd.randint(0, 700) for _ in range(5000)]
+    link_messages = [StubMessage(guild, m) for m in links]
+    pages = list(range(1, 11))
+    recent_hits = [(uid % 50, uid % 7) for uid in range(5000)]
+    recent_misses = [(100_000 + i, i % 7) for i in range(5000)]
+
+    benches = [
+        ("badword_find", len(corpus), lambda: measure(bot.BAD_WORD_MATCHER.find, corpus, repeat)),
+        ("find_blocked_link", len(link_messages),
+         lambda: measure_async(loop, bot.find_blocked_link, link_messages, repeat)),
+        ("xp_for_message", len(corpus), lambda: measure(bot.xp_for_message, corpus, repeat)),
+        ("compute_level_from_total_xp", len(xp_values),
+         lambda: measure(bot.compute_level_from_total_xp, xp_values, repeat)),
+        ("rank_for_daily_xp", len(daily_values), lambda: measure(bot.rank_for_daily_xp, daily_values, repeat)),
+        ("build_leaderboard_embed", len(pages),
+         lambda: measure_async(loop, lambda p: bot.build_leaderboard_embed(guild, p, members[p]), pages, repeat)),
+        ("update_recent_channel_cached", len(recent_hits),
+         lambda: measure_async(loop, lambda a: bot.update_recent_channel(a[0], GUILD_ID, a[1]), recent_hits, repeat)),
+        # Every pass uses fresh user IDs so each call goes through the (stub) pool
+        ("update_recent_channel_miss", len(recent_misses), lambda: measure_async(
+            loop, lambda a: bot.update_recent_channel(a[0] + random.getrandbits(40), GUILD_ID, a[1]),
+            recent_misses, repeat)),
+    ]
+
+    results = {}
+    for name, n, fn in benches:
+        ns = fn()
+        results[name] = {"ns_per_op": round(ns, 1), "ops_per_sec": round(1e9 / ns), "inputs": n}
+        print(f"{name:<32} {ns / 1000:10.2f} µs/op  {1e9 / ns:12.0f} op/s")
+    loop.close()
+    return results
+
+
+def compare(results, old_path):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)["results"]
+    print(f"\nvs {old_path}:")
+    for name, r in results.items():
+        if name in old:
+            ratio = r["ns_per_op"] / old[name]["ns_per_op"]
+            flag = "  slower" if ratio > 1.1 else ("  faster" if ratio < 0.9 else "")
+            print(f"{name:<32} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "hotpath.json"))
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{len(bot.BAD_WORDS)} bad words, python {platform.python_version()}")
+    results = run_all(args.repeat)
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
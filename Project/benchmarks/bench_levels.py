@@ -0,0 +1,53 @@
+# Compare the old O(L²) level lookup with the precomputed LevelCurve.
+# Run from the Project directory: python benchmarks/bench_levels.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from levels import LevelCurve
+
+
+def required_xp_for_level(level):
+    return 50 * (level ** 2) + 100
+
+
+def total_xp_to_reach_level(level):
+    total = 0
+    for L in range(1, level + 1):
+        total += required_xp_for_level(L)
+    return total
+
+
+def compute_level_from_total_xp(total_xp):
+    level = 0
+    while total_xp >= total_xp_to_reach_level(level + 1):
+        level += 1
+    return level
+
+
+def timed(fn, values, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(values)
+        best = min(best, time.perf_counter() - start)
+    return best / len(values) * 1e6
+
+
+def main():
+    curve = LevelCurve.polynomial(coef=50, power=2, base=100)
+    print(f"{'level':>6} {'total xp':>12} {'old µs':>10} {'bisect µs':>10} {'batch µs':>10} {'speedup':>8}")
+    for level in (1, 5, 10, 25, 50, 100, 200):
+        xp = curve.total_for_level(level) + 1
+        values = [xp] * (200 if level <= 50 else 20)
+        assert compute_level_from_total_xp(xp) == curve.level_for(xp) == level
+        old = timed(lambda vs: [compute_level_from_total_xp(v) for v in vs], values)
+        new = timed(lambda vs: [curve.level_for(v) for v in vs], values * 50)
+        batch = timed(curve.levels_for, values * 50)
+        print(f"{level:>6} {xp:>12} {old:>10.2f} {new:>10.3f} {batch:>10.3f} {old / new:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+# End-to-end load test of on_message: a synthetic (or recorded) message stream
+# is replayed through the real client event handler using fake Guild / Member /
+# Channel objects. The database is an in-process stand-in with configurable
+# query latency and pool size, or a throwaway Postgres given with --dsn (its
+# tables are created by init_db). REST calls sleep for a configurable latency
+# and are sometimes rate limited; like discord.py, a 429 is retried after
+# retry_after. Each replay speed runs in its own process, so no state leaks
+# between runs. After the last handler returns, the run waits for the outbound
+# queue to drain and the XP buffer to flush before taking its snapshot; "drain s"
+# is how long that took.
+#
+# Replaying faster compresses time for the flood detector and the XP cooldown
+# too, so at 100x they act exactly as they would on a stream that dense and
+# most messages stop at the flood stage. --no-limits switches both off so
+# every message takes the full path (moderation, XP, notifications).
+#
+# Run from the Project directory:
+#   python benchmarks/bench_replay.py [--speeds 1,10,100] [--rate 50] [--seconds 20]
+#   python benchmarks/bench_replay.py --stream recorded.jsonl   # {"t", "guild", "channel", "author", "content"} per line
+#   python benchmarks/bench_replay.py --save-stream out.jsonl   # write the synthetic stream and exit
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+XP_CHANNEL = 900_000_001
+NOTIFY_CHANNEL = 900_000_002
+REPORT_CHANNEL = 900_000_003
+FIRST_GUILD = 800_000_000
+OWN_INVITE = "replayguild"
+DOMAINS = ["youtube.com", "github.com", "tenor.com", "imgur.com", "free-nitro.gift", "bit.ly"]
+
+
+# ---------- Stream ----------
+def synthetic_stream(rate, seconds, guilds, members, channels, xp_share, seed=1):
+    # Poisson arrivals; a few members do most of the talking (Zipf-like)
+    from bench_badwords import build_corpus, load_words
+    rnd = random.Random(seed)
+    corpus = build_corpus(5000, seed)
+    bad = load_words()
+    weights = [1 / (i + 1) ** 0.5 for i in range(members)]
+    events, t = [], 0.0
+    while True:
+        t += rnd.expovariate(rate)
+        if t >= seconds:
+            return events
+        gid = FIRST_GUILD + rnd.randrange(guilds)
+        author = rnd.choices(range(1, members + 1), weights)[0]
+        content = rnd.choice(corpus)
+        roll = rnd.random()
+        if roll < 0.10:
+            content += f" https://{rnd.choice(DOMAINS)}/x/{rnd.randint(1, 10 ** 6)}"
+        elif roll < 0.12:
+            content += f" discord.gg/{OWN_INVITE}"
+        elif roll < 0.13:
+            content += f" {rnd.choice(bad)}"
+        elif roll < 0.14:
+            content = "!ping"
+        # Spread over the channels so 1x stays under the per-channel raid limit
+        channel = XP_CHANNEL if gid == FIRST_GUILD and rnd.random() < xp_share else gid * 100 + rnd.randrange(channels)
+        events.append({"t": round(t, 4), "guild": gid, "channel": channel, "author": author, "content": content})
+
+
+def load_stream(path):
+    with open(path, "r", encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda e: e["t"])
+    start = events[0]["t"] if events else 0.0
+    for e in events:
+        e["t"] -= start
+    return events
+
+
+# ---------- REST stand-in ----------
+class RestStub:
+    def __init__(self, latency, jitter, rate_429, retry_after, seed=2):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self._rnd = random.Random(seed)
+
+    async def call(self, kind, result=None):
+        import discord
+        self.calls[kind] += 1
+        for _ in range(5):
+            await asyncio.sleep(max(0.0, self._rnd.gauss(self.latency, self.jitter)))
+            if self._rnd.random() >= self.rate_429:
+                return result
+            self.rate_limited[kind] += 1
+            await asyncio.sleep(self.retry_after)
+        raise discord.HTTPException(SimpleNamespace(status=429, reason="Too Many Requests"), "rate limited")
+
+
+# ---------- Database stand-in ----------
+class FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    # Answers the bot's queries as if every row were missing
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def _query(self):
+        await asyncio.sleep(self.latency)
+
+    async def fetchrow(self, query, *args):
+        await self._query()
+        return {"total_xp": None, "daily_xp": None, "daily_msgs": None, "forced_rank": None}
+
+    async def fetchval(self, query, *args):
+        await self._query()
+        return None
+
+    async def fetch(self, query, *args):
+        await self._query()
+        return []
+
+    async def execute(self, query, *args):
+        await self._query()
+        return "OK"
+
+    async def copy_records_to_table(self, table, records, columns):
+        await self._query()
+
+    def transaction(self):
+        return FakeTransaction()
+
+
+class FakePool:
+    def __init__(self, size, latency):
+        self._size = size
+        self._free = [FakeConnection(latency) for _ in range(size)]
+        self._available = asyncio.Semaphore(size)
+
+    def get_size(self):
+        return self._size
+
+    def get_idle_size(self):
+        return len(self._free)
+
+    async def acquire(self, timeout=None):
+        await self._available.acquire()
+        return self._free.pop()
+
+    async def release(self, conn):
+        self._free.append(conn)
+        self._available.release()
+
+
+class MeasuredPool:
+    # Records every wait for a connection; works over FakePool and asyncpg pools
+    def __init__(self, pool):
+        self._pool = pool
+        self.waits = []
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def busy(self):
+        return self._pool.get_size() - self._pool.get_idle_size()
+
+    def acquire(self, timeout=None):
+        return _MeasuredAcquire(self, timeout)
+
+
+class _MeasuredAcquire:
+    def __init__(self, owner, timeout):
+        self.owner = owner
+        self.timeout = timeout
+        self.conn = None
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        self.conn = await self.owner._pool.acquire(timeout=self.timeout)
+        self.owner.waits.append(time.perf_counter() - start)
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        await self.owner._pool.release(self.conn)
+
+
+# ---------- Fake Discord objects ----------
+def fake_classes(bot, rest):
+    import discord
+
+    class FakeRole:
+        def __init__(self, rid, name, default=False):
+            self.id = rid
+            self.name = name
+            self._default = default
+            self.members = []
+
+        def is_default(self):
+            return self._default
+
+    class FakeMember(discord.Member):
+        # Only what the message handlers touch; passes isinstance(..., discord.Member)
+        id = name = display_name = mention = bot = roles = guild_permissions = display_avatar = None
+
+        def __init__(self, guild, uid, admin=False):
+            self.guild = guild
+            self.id = uid
+            self.name = self.display_name = f"member{uid}"
+            self.mention = f"<@{uid}>"
+            self.bot = False
+            self.roles = [guild.default_role]
+            self.guild_permissions = discord.Permissions(administrator=admin)
+            self.display_avatar = SimpleNamespace(url=f"https://cdn.example/avatars/{uid}.png", key=str(uid))
+
+        def __eq__(self, other):
+            return isinstance(other, FakeMember) and other.id == self.id
+
+        def __hash__(self):
+            return self.id >> 22
+
+        def get_role(self, role_id):
+            return next((r for r in self.roles if r.id == role_id), None)
+
+        async def edit(self, *, roles=None, reason=None):
+            await rest.call("member_edit")
+            if roles is not None:
+                self.roles = [self.guild.default_role] + list(roles)
+
+        async def timeout(self, until, *, reason=None):
+            await rest.call("member_timeout")
+
+    class FakeChannel:
+        def __init__(self, cid):
+            self.id = cid
+            self.name = f"channel-{cid}"
+            self.mention = f"<#{cid}>"
+
+        def permissions_for(self, member):
+            return SimpleNamespace(send_messages=True)
+
+        async def send(self, *args, **kwargs):
+            return await rest.call("channel_send")
+
+    class FakeGuild:
+        def __init__(self, gid, members):
+            self.id = gid
+            self.shard_id = 0
+            self.name = f"Guild {gid}"
+            self.icon = None
+            self.vanity_url_code = None
+            self.chunked = True
+            self.default_role = FakeRole(gid, "@everyone", default=True)
+            self.roles = [self.default_role] + [
+                FakeRole(gid * 10 + i, f"{bot.ROLE_PREFIX}{name}") for i, name in enumerate(bot.RANK_ORDER)
+            ]
+            self._roles = {r.id: r for r in self.roles}
+            self.me = FakeMember(self, 1, admin=True)
+            self._members = {uid: FakeMember(self, uid) for uid in range(2, members + 2)}
+            self.member_count = members
+
+        def get_member(self, uid):
+            return self._members.get(uid)
+
+        def get_role(self, rid):
+            return self._roles.get(rid)
+
+        async def create_role(self, *, name, reason=None, color=None):
+            role = FakeRole(self.id * 10 + len(self.roles), name)
+            self.roles.append(role)
+            self._roles[role.id] = role
+            return await rest.call("create_role", role)
+
+    class FakeMessage:
+        def __init__(self, guild, channel, author, content):
+            self.guild = guild
+            self.channel = channel
+            self.author = author
+            self.content = content
+
+        async def delete(self):
+            await rest.call("message_delete")
+
+    return FakeGuild, FakeChannel, FakeMessage
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# ---------- One replay (child process) ----------
+async def replay(args, events):
+    import bot
+
+    rest = RestStub(args.rest_ms / 1000, args.rest_jitter_ms / 1000, args.rate_429, args.retry_after)
+    FakeGuild, FakeChannel, FakeMessage = fake_classes(bot, rest)
+
+    guild_ids = sorted({e["guild"] for e in events})
+    authors = max((e["author"] for e in events), default=1)
+    guilds = {gid: FakeGuild(gid, authors) for gid in guild_ids}
+    channels = {cid: FakeChannel(cid) for cid in {e["channel"] for e in events} | {NOTIFY_CHANNEL, REPORT_CHANNEL}}
+    bot.client.get_channel = channels.get
+    type(bot.client).latency = 0.05  # for !ping; there is no gateway connection
+    bot.client.get_guild = guilds.get
+    bot.fleet_locks.owns_shard = lambda shard_id: True  # no lock connection; this process owns every shard
+    bot.client.fetch_invite = lambda code, **kw: rest.call(
+        "fetch_invite", SimpleNamespace(guild=SimpleNamespace(id=FIRST_GUILD) if code == OWN_INVITE else None)
+    )
+
+    if args.dsn:
+        bot.DATABASE_URL = args.dsn
+        await bot.init_db()
+        pool = MeasuredPool(bot.db_pool)
+    else:
+        pool = MeasuredPool(FakePool(args.pool_size, args.db_ms / 1000))
+        bot.xp_buffer.start(pool)
+        bot.state_store.start(pool)
+    bot.db_pool = bot.xp_buffer.pool = bot.state_store.pool = pool
+    bot.dispatcher.start()
+    if args.no_limits:
+        bot.flood_detector.user_limit = bot.flood_detector.channel_limit = float("inf")
+        bot.xp_cooldowns = bot.BucketTable(10 ** 9, 1)
+
+    # Build every message up front so the replay loop only schedules
+    messages = []
+    for e in events:
+        guild = guilds[e["guild"]]
+        author = guild.get_member(e["author"] + 1)
+        messages.append((e["t"] / args.speed, FakeMessage(guild, channels[e["channel"]], author, e["content"])))
+
+    handler = bot.client.on_message
+    handler_times, e2e_times = [], []
+    busy_samples = []
+    done = asyncio.Event()
+
+    async def sample_pool():
+        while not done.is_set():
+            busy_samples.append(pool.busy())
+            await asyncio.sleep(0.01)
+
+    async def handle(due, message):
+        started = time.perf_counter()
+        try:
+            await handler(message)
+        except Exception as e:
+            print(f"⚠️ on_message raised: {e}")
+        finished = time.perf_counter()
+        handler_times.append(finished - started)
+        e2e_times.append(finished - (t0 + due))
+
+    sampler = asyncio.create_task(sample_pool())
+    tasks = []
+    t0 = time.perf_counter()
+    for due, message in messages:
+        delay = t0 + due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0)  # behind schedule: still let handlers run
+        tasks.append(asyncio.create_task(handle(due, message)))
+    await asyncio.gather(*tasks)
+    handlers_done = time.perf_counter()
+    # The work handlers queued is part of the run: outbound REST calls and the XP write path
+    await bot.dispatcher.drain()
+    await bot.xp_buffer.flush()
+    elapsed = time.perf_counter() - t0
+    done.set()
+    await sampler
+
+    dispatch = bot.dispatcher.stats()
+    result = {
+        "speed": args.speed,
+        "messages": len(messages),
+        "offered_per_sec": round(len(messages) / (messages[-1][0] or 1), 1) if messages else 0,
+        "throughput_per_sec": round(len(messages) / (handlers_done - t0), 1),
+        "drain_seconds": round(t0 + elapsed - handlers_done, 2),
+        "handler_ms": {q: round(percentile(handler_times, p) * 1000, 2) for q, p in (("p50", .5), ("p99", .99))},
+        "end_to_end_ms": {q: round(percentile(e2e_times, p) * 1000, 2) for q, p in (("p50", .5), ("p99", .99))},
+        "pool": {
+            "size": pool.get_size(),
+            "peak_busy": max(busy_samples, default=0),
+            "mean_busy": round(sum(busy_samples) / len(busy_samples), 2) if busy_samples else 0,
+            "saturated_pct": round(100 * sum(b >= pool.get_size() for b in busy_samples) / max(1, len(busy_samples)), 1),
+            "acquires": len(pool.waits),
+            "acquire_wait_p99_ms": round(percentile(pool.waits, .99) * 1000, 2),
+        },
+        "rest_calls": dict(rest.calls),
+        "rest_429": dict(rest.rate_limited),
+        "dispatcher": {k: dispatch[k] for k in ("queued", "waiting_for_route", "sent", "coalesced", "dropped")},
+        "flood": {"user": bot.flood_detector.user_floods, "channel": bot.flood_detector.channel_floods},
+        "stages": {name: {"calls": calls, "stopped": stopped, "avg_ms": round(avg, 3)}
+                   for name, calls, stopped, _, avg, _ in bot.message_pipeline.snapshot()},
+    }
+    await bot.dispatcher.stop()
+    return result
+
+
+def run_child(args):
+    # Before bot is imported: route XP / notifications to the fake channels, no metrics port
+    os.environ["XP_CHANNEL_ID"] = str(XP_CHANNEL)
+    os.environ["METRICS_PORT"] = "0"
+    os.environ.setdefault("SLOW_OP_MS", "1000")
+    import bot
+    bot.guild_configs.defaults = bot.guild_configs.defaults._replace(
+        notification_channel_id=NOTIFY_CHANNEL, report_channel_id=REPORT_CHANNEL
+    )
+
+    events = load_stream(args.stream)
+    result = asyncio.run(replay(args, events))
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+# ---------- Driver ----------
+def print_report(results):
+    print(f"\n{'speed':>6} {'msgs':>7} {'offered/s':>10} {'done/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'e2e p99':>9} {'drain s':>8} {'pool peak':>10} {'saturated':>10} {'rest calls':>11} {'429s':>5}")
+    for r in results:
+        pool = r["pool"]
+        print(f"{r['speed']:>5g}x {r['messages']:>7} {r['offered_per_sec']:>10} {r['throughput_per_sec']:>9} "
+              f"{r['handler_ms']['p50']:>8} {r['handler_ms']['p99']:>8} {r['end_to_end_ms']['p99']:>9} {r['drain_seconds']:>8} "
+              f"{pool['peak_busy']:>4}/{pool['size']:<5} {pool['saturated_pct']:>9}% "
+              f"{sum(r['rest_calls'].values()):>11} {sum(r['rest_429'].values()):>5}")
+    for r in results:
+        print(f"\n{r['speed']:g}x  rest: {r['rest_calls']}  dispatcher: {r['dispatcher']}  flood: {r['flood']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speeds", default="1,10,100")
+    parser.add_argument("--stream", help="recorded JSONL stream; synthetic if omitted")
+    parser.add_argument("--save-stream", help="write the synthetic stream here and exit")
+    parser.add_argument("--rate", type=float, default=50.0, help="synthetic messages per second at 1x")
+    parser.add_argument("--seconds", type=float, default=20.0, help="synthetic stream length at 1x")
+    parser.add_argument("--guilds", type=int, default=1)
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--xp-share", type=float, default=0.05, help="fraction of messages sent in the XP channel")
+    parser.add_argument("--dsn", help="throwaway Postgres to use instead of the in-process pool")
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--db-ms", type=float, default=1.0, help="stand-in query latency")
+    parser.add_argument("--rest-ms", type=float, default=80.0)
+    parser.add_argument("--rest-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--rate-429", type=float, default=0.01, help="fraction of REST calls that get a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--no-limits", action="store_true", help="disable flood detection and the XP cooldown")
+    parser.add_argument("--output", help="also write all results here as JSON")
+    parser.add_argument("--speed", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.result:
+        return run_child(args)
+
+    stream = args.stream
+    if not stream or args.save_stream:
+        events = synthetic_stream(args.rate, args.seconds, args.guilds, args.members, args.channels, args.xp_share)
+        stream = args.save_stream or os.path.join(tempfile.mkdtemp(), "stream.jsonl")
+        with open(stream, "w", encoding="utf-8") as f:
+            for e in events:
+                f.write(json.dumps(e) + "\n")
+        if args.save_stream:
+            print(f"Saved {len(events)} messages to {stream}")
+            return
+
+    results = []
+    for speed in (float(s) for s in args.speeds.split(",")):
+        print(f"Replaying at {speed:g}x ...")
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            result_path = f.name
+        argv = ["--stream", stream, "--speed", str(speed), "--result", result_path,
+                "--pool-size", str(args.pool_size), "--db-ms", str(args.db_ms), "--rest-ms", str(args.rest_ms),
+                "--rest-jitter-ms", str(args.rest_jitter_ms), "--rate-429", str(args.rate_429),
+                "--retry-after", str(args.retry_after)] + (["--dsn", args.dsn] if args.dsn else []) \
+            + (["--no-limits"] if args.no_limits else [])
+        subprocess.run([sys.executable, os.path.abspath(__file__), *argv], cwd=ROOT, check=True)
+        with open(result_path, "r", encoding="utf-8") as f:
+            results.append(json.load(f))
+        os.unlink(result_path)
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
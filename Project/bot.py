@@ -1,18 +1,44 @@
 import os
+import io
+import logging
+import math
 import re
 import json
 import random
 import asyncio
+import signal
+import threading
 import discord
 from discord import app_commands
 from dotenv import load_dotenv
 import time
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import pytz
 import asyncpg
 from asyncpg.pool import Pool
-import aiohttp
+from wordfilter import BadWordMatcher
+from xpbuffer import XPBuffer
+from memberstate import MemberState, MemberStateCache
+from levels import LevelCurve
+from roles import RankRoleCache, RoleNameCache, RoleSyncJob, desired_roles, plan_rank_changes
+from dispatcher import Dispatcher, MODERATION, WARNING, NOTIFICATION, COSMETIC
+from leaderboard import Leaderboards
+from cards import CardRenderer
+from httpclient import BotHTTP
+from counters import CounterScheduler
+from statestore import StateStore
+from cleanup import LeaveBuffer, sweep_left_users
+from channelindex import NameIndex
+from linkpolicy import LinkPolicy, InviteCache, normalize_domain
+from pipeline import Pipeline, MessageContext, STOP
+from flood import FloodDetector, USER_FLOOD
+from ratelimit import BucketTable
+from metrics import Registry, MetricsServer, TimedPool, RateLimitLogCounter, watch_loop_lag
+from tracing import Tracer, StackSampler, format_profile
+from fleet import FleetLocks, parse_shard_ids, LEADER_LOCK, SHARD_LOCK
+from rollover import roll_over_guild, reset_offset
+from guildconfig import GuildConfig, GuildConfigStore, SETTINGS, CHANNEL_SETTINGS, parse_setting, format_ranks
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -20,16 +46,63 @@ GUILD_ID_ENV = os.getenv("GUILD_ID")
 AUTO_FILE_URL = os.getenv("AUTO_MESSAGES_URL")
 DATABASE_URL = os.getenv("DATABASE_URL")
 XP_CHANNEL_ID = int(os.getenv("XP_CHANNEL_ID", 0))
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # ---------- Config ----------
+# Channel IDs, BYPASS_ROLE, RANKS and RESET_TIMEZONE are defaults; /setconfig overrides them per guild
 AUTO_CHANNEL_ID = 1412316924536422405
 AUTO_INTERVAL = 7200  # 2 hours
+AUTO_RELOAD_SECONDS = 3600  # conditional GET, so unchanged files cost a 304
+AUTO_LOCAL_FILE = os.path.join(BASE_DIR, "automsg.json")  # fallback when the URL is unset/unreachable
 BYPASS_ROLE = "Basic"
+RESET_TIMEZONE = "Asia/Karachi"  # daily leaderboard reset at local midnight
+RESET_SPREAD_SECONDS = 1800  # guilds roll over at a stable offset within 30 min after their midnight
 STATUS_SWITCH_SECONDS = 30
-COUNTER_UPDATE_SECONDS = 30
+COUNTER_RENAMES_PER_WINDOW = 2  # Discord channel rename budget...
+COUNTER_RENAME_WINDOW = 600  # ...per 10 minutes
+COUNTER_SETTLE_SECONDS = 5  # wait for join/leave bursts before renaming
 NOTIFICATION_CHANNEL_ID = 1412316924536422405
 REPORT_CHANNEL_ID = 1412325934291484692
-CACHE_DURATION = 300
+LEADERBOARD_PAGE_SIZE = 15
+RANK_CARDS = True  # attach Pillow rank / leaderboard cards to the embeds
+CARD_WORKERS = 2  # card render processes
+CARD_CACHE_SIZE = 512  # rendered cards kept in memory
+ASSET_CACHE_DIR = os.path.join(BASE_DIR, ".cache", "assets")
+ASSET_CACHE_MEMORY_MB = 16
+ASSET_CACHE_DISK_MB = 128
+BADWORD_WORD_BOUNDARY = os.getenv("BADWORD_WORD_BOUNDARY", "0") == "1"  # only match whole words
+BADWORD_NORMALIZE = os.getenv("BADWORD_NORMALIZE", "0") == "1"  # catch "f u c k", "sh1t", etc.
+# Domains (and their subdomains) links may point to in every guild; /linkrule adds per-guild rules
+LINK_ALLOW_DOMAINS = [d for d in os.getenv("LINK_ALLOW_DOMAINS", "").split(",") if d.strip()]
+INVITE_CACHE_SECONDS = 3600  # resolved invite codes; invalid ones are kept for 5 minutes
+INVITE_LOOKUP_TIMEOUT = 1.5  # longest on_message waits for an uncached invite before treating it as foreign
+FLOOD_USER_LIMIT = int(os.getenv("FLOOD_USER_LIMIT", 6))  # messages per member...
+FLOOD_USER_WINDOW = float(os.getenv("FLOOD_USER_WINDOW", 5))  # ...within this many seconds
+FLOOD_CHANNEL_LIMIT = int(os.getenv("FLOOD_CHANNEL_LIMIT", 25))  # messages per channel (raids)...
+FLOOD_CHANNEL_WINDOW = float(os.getenv("FLOOD_CHANNEL_WINDOW", 5))  # ...within this many seconds
+FLOOD_TIMEOUT_SECONDS = int(os.getenv("FLOOD_TIMEOUT_SECONDS", 300))  # timeout for a flooding member
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 0)) or None  # shards across the whole fleet; unset lets Discord decide
+SHARD_IDS = parse_shard_ids(os.getenv("SHARD_IDS", ""))  # this process's shards, e.g. "0-3"; unset runs all of them
+FLEET_LOCK_RETRY_SECONDS = 15  # standby processes retry the shard / leader locks this often
+FLEET_STALE_SECONDS = 300  # guild member counts older than this are left out of the fleet total
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))  # Prometheus /metrics; 0 disables it
+SLOW_OP_MS = int(os.getenv("SLOW_OP_MS", 250))  # commands / events / DB helpers slower than this are logged
+PROFILE_MAX_SECONDS = 120
+XP_COOLDOWN_MESSAGES = 3  # XP-earning messages a member can burst...
+XP_COOLDOWN_SECONDS = 60  # ...refilled over this many seconds; /xpcooldown overrides per guild
+XP_FLUSH_SECONDS = 2  # write buffered XP at least this often
+XP_FLUSH_EVENTS = 500  # ...or after this many XP messages
+XP_MAX_PENDING = 10000  # members buffered before on_message waits for a flush
+MEMBER_CACHE_PER_GUILD = 20000  # hot member states kept per guild (LRU)
+STATE_FLUSH_SECONDS = 5  # write-behind interval for recent channels / status / counters
+STATE_CACHE_ENTRIES = 50000  # runtime state entries kept in memory (LRU)
+RECENT_CHANNELS_KEPT = 30
+LEAVE_FLUSH_SECONDS = 2  # member leaves are deleted in batches this often
+LEFT_SWEEP_CHUNK = 500  # users rows checked per step of the hourly sweep
+LEFT_SWEEP_PAUSE = 0.5  # seconds between sweep steps
+ROLE_SYNC_CONCURRENCY = 3  # parallel member edits during bulk rank updates
+ROLE_SYNC_PER_SECOND = 1.0  # member edit route allows ~10 requests / 10 s per guild
 
 # Rank thresholds
 RANKS = [("S+", 500), ("A", 400), ("B", 300), ("C", 200), ("D", 125), ("E", 50)]
@@ -45,27 +118,209 @@ RANK_COLORS = {
 }
 ROLE_PREFIX = "Rank "
 
+DEFAULT_GUILD_CONFIG = GuildConfig(
+    auto_channel_id=AUTO_CHANNEL_ID,
+    notification_channel_id=NOTIFICATION_CHANNEL_ID,
+    report_channel_id=REPORT_CHANNEL_ID,
+    xp_channel_id=XP_CHANNEL_ID,
+    bypass_role=BYPASS_ROLE,
+    ranks=tuple(RANKS),
+    timezone=RESET_TIMEZONE
+)
+
+# XP needed per level: 50*L² + 100 (see levels.py for linear / exponential curves)
+LEVEL_CURVE = LevelCurve.polynomial(coef=50, power=2, base=100)
+
 # ---------- Intents / Client / Tree ----------
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.guilds = True
-client = discord.Client(intents=intents)
-tree = app_commands.CommandTree(client)
+
+class BotClient(discord.AutoShardedClient):
+    async def setup_hook(self):
+        if RANK_CARDS:
+            card_renderer.start()
+        await bot_http.start()
+        if METRICS_PORT:
+            try:
+                await metrics_server.start()
+                print(f"✅ Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+            except OSError as e:
+                print(f"⚠️ Metrics server not started: {e}")
+        track_task("loop_lag", watch_loop_lag(loop_lag, loop_lag_seconds))
+        # Railway stops containers with SIGTERM; close cleanly so buffered XP is written
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(self.close()))
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    def event(self, coro):
+        # Every @client.event handler is timed (see tracing.py)
+        return super().event(tracer.span(coro))
+
+    async def close(self):
+        await xp_buffer.stop()
+        await state_store.stop()
+        await leave_buffer.stop()
+        await dispatcher.stop()
+        card_renderer.close()
+        await bot_http.close()
+        await metrics_server.stop()
+        await fleet_locks.stop()
+        await guild_configs.stop()
+        await super().close()
+
+class BotTree(app_commands.CommandTree):
+    def command(self, **kwargs):
+        # Every @tree.command callback is timed as "/name" (see tracing.py)
+        register = super().command(**kwargs)
+        return lambda fn: register(tracer.span(fn, name=f"/{kwargs.get('name') or fn.__name__}"))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if not owns_events(interaction.guild):
+            return False  # the process holding the shard lock answers it
+        # Start of the command latency measured in on_app_command_completion / on_error
+        interaction.extras["started"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        observe_command(interaction, "error")
+        await super().on_error(interaction, error)
+
+client = BotClient(intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+tree = BotTree(client)
+
+def owns_events(guild) -> bool:
+    # A standby or an overlapping deploy connects the same shards and gets the same
+    # gateway events; only the holder of the shard lock acts on them (DMs arrive on shard 0)
+    return fleet_locks.owns_shard(guild.shard_id if guild else 0)
+
+# ---------- Metrics ----------
+metrics = Registry()
+message_seconds = metrics.histogram("bot_on_message_seconds", "Time to handle one message")
+stage_seconds = metrics.histogram("bot_message_stage_seconds", "Time per on_message stage", ("stage",))
+command_seconds = metrics.histogram("bot_command_seconds", "Slash command latency", ("command", "status"))
+db_acquire_seconds = metrics.histogram("bot_db_acquire_seconds", "Wait for a db_pool connection")
+db_query_seconds = metrics.histogram("bot_db_query_seconds", "Database query duration", ("statement",))
+db_query_errors = metrics.counter("bot_db_query_errors_total", "Failed database queries", ("statement",))
+outbound_seconds = metrics.histogram("bot_outbound_seconds", "Outbound REST call duration", ("kind", "status"))
+rate_limited = metrics.counter("bot_discord_429_total", "429 responses from Discord (retried by discord.py)", ("method",))
+loop_lag = metrics.gauge("bot_event_loop_lag_seconds", "Latest event loop lag")
+loop_lag_seconds = metrics.histogram("bot_event_loop_lag_samples_seconds", "Event loop lag samples")
+loop_last_tick = metrics.gauge("bot_loop_last_tick_timestamp", "Unix time of a background loop's last iteration", ("loop",))
+loop_errors = metrics.counter("bot_loop_errors_total", "Errors caught in background loops", ("loop",))
+span_seconds = metrics.histogram("bot_span_seconds", "Traced command / event / DB helper duration", ("span",))
+background_tasks = {}  # name -> asyncio.Task
+metrics.gauge("bot_loop_running", "1 while a background loop task is alive", ("loop",),
+              fn=lambda: {(name,): 0 if task.done() else 1 for name, task in background_tasks.items()})
+metrics.gauge("bot_db_pool_connections", "db_pool connections", ("state",),
+              fn=lambda: {("open",): db_pool.get_size(), ("idle",): db_pool.get_idle_size()} if db_pool else {})
+metrics.gauge("bot_outbound_queue", "Queued outbound actions", ("priority",),
+              fn=lambda: {(name,): count for name, count in dispatcher.depth().items()})
+metrics.gauge("bot_counter_renames", "Counter channel renames (event driven, replaces counter_updater)", ("state",),
+              fn=lambda: {(k,): v for k, v in counter_scheduler.stats().items()})
+metrics.gauge("bot_state_store", "Runtime state store entries and flushes", ("state",),
+              fn=lambda: {(k,): v for k, v in state_store.stats().items()})
+metrics.gauge("bot_xp_cooldowns", "XP cooldown buckets and decisions", ("state",),
+              fn=lambda: {(k,): v for k, v in xp_cooldowns.stats().items()})
+metrics.gauge("bot_gateway_latency_seconds", "Discord gateway heartbeat latency",
+              fn=lambda: {} if math.isnan(client.latency) else {(): client.latency})
+metrics_server = MetricsServer(metrics, METRICS_HOST, METRICS_PORT)
+tracer = Tracer(SLOW_OP_MS / 1000, observe=lambda span, seconds: span_seconds.observe(seconds, (span,)))
+profiler = StackSampler(threading.get_ident())  # the module is imported on the event loop's thread
+logging.getLogger("discord.http").addHandler(RateLimitLogCounter(rate_limited))
+
+def track_task(name: str, coro):
+    task = background_tasks.get(name)
+    if task is None or task.done():
+        task = background_tasks[name] = asyncio.get_running_loop().create_task(coro)
+    else:
+        coro.close()  # already running (e.g. on_ready after a reconnect)
+    return task
+
+def loop_tick(name: str):
+    loop_last_tick.set(time.time(), (name,))
+
+def observe_command(interaction: discord.Interaction, status: str):
+    started = interaction.extras.pop("started", None)
+    if started is not None:
+        name = interaction.command.qualified_name if interaction.command else "unknown"
+        command_seconds.observe(time.perf_counter() - started, (name, status))
+
+def observe_query(record):
+    # asyncpg query logger; labelled by statement keyword to keep the series count small
+    statement = record.query.lstrip().split(None, 1)[0].upper() if record.query.strip() else "?"
+    db_query_seconds.observe(record.elapsed, (statement,))
+    if record.exception is not None:
+        db_query_errors.inc((statement,))
+
+async def init_db_connection(conn):
+    conn.add_query_logger(observe_query)
 
 # ---------- In-memory stores ----------
-recent_channels = {}
-last_joined_member = {}
-custom_status = {}
-counter_channels = {}
 AUTO_MESSAGES = []
 db_pool: Pool = None
+xp_buffer = XPBuffer(flush_interval=XP_FLUSH_SECONDS, flush_batch=XP_FLUSH_EVENTS, max_pending=XP_MAX_PENDING)
+member_cache = MemberStateCache(max_per_guild=MEMBER_CACHE_PER_GUILD)
+# recent_channels (scope guild, key user), custom_status / last_joined_member /
+# counter_channels (scope guild, key 0)
+state_store = StateStore(flush_interval=STATE_FLUSH_SECONDS, max_entries=STATE_CACHE_ENTRIES)
+rank_roles = RankRoleCache(ROLE_PREFIX, lambda guild_id: guild_configs.get(guild_id).rank_order)
+bypass_roles = RoleNameCache(lambda guild_id: guild_configs.get(guild_id).bypass_role)
+
+def guild_config_changed(guild_id: int):
+    # Role caches are keyed by configured names; rescan on next use
+    rank_roles.invalidate(guild_id)
+    bypass_roles.invalidate(guild_id)
+    # The timezone may have changed
+    if scheduler.running and client.get_guild(guild_id):
+        schedule_guild_reset(guild_id)
+
+guild_configs = GuildConfigStore(DEFAULT_GUILD_CONFIG, on_change=guild_config_changed)
+role_sync_tasks = {}
+dispatcher = Dispatcher(observe=lambda kind, seconds, ok: outbound_seconds.observe(seconds, (kind, "ok" if ok else "error")))
+leaderboards = Leaderboards()
+channel_indexes = {}  # (guild_id, "text" | "category") -> NameIndex
+link_policies = {}  # guild_id -> LinkPolicy, compiled from state_store "link_policy"
+invite_cache = InviteCache(ttl=INVITE_CACHE_SECONDS)
+xp_cooldowns = BucketTable(XP_COOLDOWN_MESSAGES, XP_COOLDOWN_SECONDS)
+flood_detector = FloodDetector(
+    user_limit=FLOOD_USER_LIMIT, user_window=FLOOD_USER_WINDOW,
+    channel_limit=FLOOD_CHANNEL_LIMIT, channel_window=FLOOD_CHANNEL_WINDOW
+)
+invite_lookups = {}
+
+async def warm_shard(name: str, scope: int):
+    # Runs before owns_shard() is true: another process may have owned the shard
+    # until now, so whatever is cached for its guilds is stale
+    if name != SHARD_LOCK:
+        return
+    guild_ids = [g.id for g in client.guilds if (g.shard_id or 0) == scope]
+    for guild_id in guild_ids:
+        member_cache.drop_guild(guild_id)
+        leaderboards.reset(guild_id)
+        link_policies.pop(guild_id, None)
+    state_store.forget_scopes(guild_ids)
+    members = await member_cache.warm(db_pool, guild_ids)
+    entries = await leaderboards.warm(db_pool, guild_ids)
+    print(f"✅ Shard {scope} caches loaded ({len(guild_ids)} guilds, {members} members, {entries} leaderboard entries)")
+
+fleet_locks = FleetLocks(DATABASE_URL, retry_interval=FLEET_LOCK_RETRY_SECONDS, on_acquired=warm_shard)
+card_renderer = CardRenderer(BASE_DIR, workers=CARD_WORKERS, cache_size=CARD_CACHE_SIZE)
+bot_http = BotHTTP(
+    ASSET_CACHE_DIR,
+    memory_bytes=ASSET_CACHE_MEMORY_MB * 1024 * 1024,
+    disk_bytes=ASSET_CACHE_DISK_MB * 1024 * 1024
+)
 
 # ---------- Database Setup ----------
 async def init_db():
     global db_pool
+    if db_pool is not None:
+        return  # on_ready runs again after every gateway reconnect
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = TimedPool(await asyncpg.create_pool(DATABASE_URL, init=init_db_connection), db_acquire_seconds)
         print("✅ Connected to PostgreSQL database")
 
         async with db_pool.acquire() as conn:
@@ -91,23 +346,92 @@ async def init_db():
                 )
             """)
 
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS bot_state (
+                    namespace TEXT,
+                    scope_id BIGINT,
+                    key BIGINT,
+                    value TEXT,
+                    PRIMARY KEY (namespace, scope_id, key)
+                )
+            """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS role_sync_queue (
+                    guild_id BIGINT,
+                    user_id BIGINT,
+                    target_rank TEXT,
+                    PRIMARY KEY (guild_id, user_id)
+                )
+            """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS fleet_guilds (
+                    guild_id BIGINT PRIMARY KEY,
+                    shard_id INTEGER,
+                    member_count INTEGER,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS guild_config (
+                    guild_id BIGINT PRIMARY KEY,
+                    auto_channel_id BIGINT,
+                    notification_channel_id BIGINT,
+                    report_channel_id BIGINT,
+                    xp_channel_id BIGINT,
+                    bypass_role TEXT,
+                    ranks TEXT,
+                    timezone TEXT,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_history (
+                    guild_id BIGINT,
+                    user_id BIGINT,
+                    day DATE,
+                    daily_xp INTEGER,
+                    daily_msgs INTEGER,
+                    rank TEXT,
+                    PRIMARY KEY (guild_id, user_id, day)
+                )
+            """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_rollovers (
+                    guild_id BIGINT,
+                    day DATE,
+                    finished_at TIMESTAMPTZ DEFAULT NOW(),
+                    PRIMARY KEY (guild_id, day)
+                )
+            """)
+
         print("✅ Database tables created/verified")
+        xp_buffer.start(db_pool)
+        state_store.start(db_pool)
+        leave_buffer.start(db_pool)
+
+        await guild_configs.start(db_pool, DATABASE_URL)
+        print(f"✅ Guild config loaded ({len(guild_configs)} configured guilds)")
+        # Member cache and leaderboards are loaded per shard by warm_shard as its lock is taken
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
+        if db_pool is not None:
+            await db_pool.close()
+            db_pool = None
         raise
 
 # ---------- Helpers ----------
-def update_recent_channel(user_id: int, guild_id: int, channel_id: int):
-    if user_id not in recent_channels:
-        recent_channels[user_id] = {}
-    if guild_id not in recent_channels[user_id]:
-        recent_channels[user_id][guild_id] = []
-    lst = recent_channels[user_id][guild_id]
-    if channel_id in lst:
-        lst.remove(channel_id)
+async def get_recent_channels(user_id: int, guild_id: int):
+    return await state_store.get("recent_channels", guild_id, user_id, default=[])
+
+async def update_recent_channel(user_id: int, guild_id: int, channel_id: int):
+    lst = [cid for cid in await get_recent_channels(user_id, guild_id) if cid != channel_id]
     lst.insert(0, channel_id)
-    if len(lst) > 30:
-        lst.pop()
+    state_store.set("recent_channels", guild_id, user_id, lst[:RECENT_CHANNELS_KEPT])
 
 def format_content(content: str, bold: bool, underline: bool, code_lang: str):
     if code_lang:
@@ -124,40 +448,54 @@ def parse_message_link(link: str):
         return None
     return match.group(1), match.group(2), match.group(3)
 
-# ---------- Load auto messages from external URL ----------
+# ---------- Load auto messages ----------
+def parse_auto_messages(content: str):
+    # Try JSON format first
+    try:
+        data = json.loads(content)
+        if isinstance(data, list):
+            return data, "JSON format"
+    except json.JSONDecodeError:
+        pass
+
+    # If not JSON, try text format (one message per line)
+    return [line.strip() for line in content.split('\n') if line.strip()], "Text format"
+
+def load_local_auto_messages():
+    global AUTO_MESSAGES
+    try:
+        with open(AUTO_LOCAL_FILE, "r", encoding="utf-8") as f:
+            AUTO_MESSAGES, fmt = parse_auto_messages(f.read())
+        print(f"✅ Loaded {len(AUTO_MESSAGES)} auto messages from {os.path.basename(AUTO_LOCAL_FILE)} ({fmt})")
+    except FileNotFoundError:
+        print(f"⚠️ {os.path.basename(AUTO_LOCAL_FILE)} not found - no local auto messages")
+    except Exception as e:
+        print(f"⚠️ Error loading {os.path.basename(AUTO_LOCAL_FILE)}: {e}")
+
 async def load_auto_messages_from_url():
     global AUTO_MESSAGES
     if not AUTO_FILE_URL:
-        print("⚠️ AUTO_MESSAGES_URL not set - auto messages will be empty")
-        AUTO_MESSAGES = []
+        print("⚠️ AUTO_MESSAGES_URL not set - using local auto messages only")
         return
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(AUTO_FILE_URL) as response:
-                if response.status == 200:
-                    content = await response.text()
-
-                    # Try JSON format first
-                    try:
-                        data = json.loads(content)
-                        if isinstance(data, list):
-                            AUTO_MESSAGES = data
-                            print(f"✅ Loaded {len(AUTO_MESSAGES)} auto messages from URL (JSON format)")
-                            return
-                    except json.JSONDecodeError:
-                        pass
-
-                    # If not JSON, try text format (one message per line)
-                    messages = [line.strip() for line in content.split('\n') if line.strip()]
-                    AUTO_MESSAGES = messages
-                    print(f"✅ Loaded {len(AUTO_MESSAGES)} auto messages from URL (Text format)")
-                else:
-                    print(f"⚠️ Failed to load auto messages from URL: HTTP {response.status}")
-                    AUTO_MESSAGES = []
+        status, content = await bot_http.get_if_changed(AUTO_FILE_URL)
+        if status == 304:
+            print("✅ Auto messages unchanged at URL (304)")
+        elif status == 200:
+            messages, fmt = parse_auto_messages(content)
+            if messages:
+                AUTO_MESSAGES = messages
+                print(f"✅ Loaded {len(AUTO_MESSAGES)} auto messages from URL ({fmt})")
+            else:
+                print("⚠️ Auto messages URL returned no messages - keeping current list")
+        else:
+            print(f"⚠️ Failed to load auto messages from URL: HTTP {status} - keeping current list")
     except Exception as e:
-        print(f"⚠️ Error loading auto messages from URL: {e}")
-        AUTO_MESSAGES = []
+        print(f"⚠️ Error loading auto messages from URL: {e} - keeping current list")
+
+# Bundled file first, so auto messages work without network access
+load_local_auto_messages()
 
 # ---------- Load bad words ----------
 try:
@@ -171,35 +509,43 @@ except Exception as e:
     BAD_WORDS = []
     print(f"⚠️ Error loading badwords.txt: {e}")
 
+BAD_WORD_MATCHER = BadWordMatcher(BAD_WORDS, word_boundary=BADWORD_WORD_BOUNDARY, normalize=BADWORD_NORMALIZE)
+
 # ---------- Autocomplete helpers ----------
+AUTOCOMPLETE_LIMIT = 15
+
+def channel_kind(channel):
+    if isinstance(channel, discord.CategoryChannel):
+        return "category"
+    if isinstance(channel, discord.TextChannel):
+        return "text"
+    return None
+
+def get_channel_index(guild: discord.Guild, kind: str) -> NameIndex:
+    # Built on first use per guild, then kept current by the channel events
+    index = channel_indexes.get((guild.id, kind))
+    if index is None:
+        index = channel_indexes[(guild.id, kind)] = NameIndex()
+        for ch in (guild.categories if kind == "category" else guild.text_channels):
+            index.add(ch.id, ch.name, ch.position)
+    return index
+
 async def channel_autocomplete(interaction: discord.Interaction, current: str):
-    choices = []
     guild = interaction.guild
     if not guild:
         return []
-    user_id = interaction.user.id
-    if user_id in recent_channels and guild.id in recent_channels[user_id]:
-        for cid in recent_channels[user_id][guild.id][:10]:
-            ch = guild.get_channel(cid)
-            if ch and current.lower() in ch.name.lower():
-                choices.append(app_commands.Choice(name=f"⭐ {ch.name}", value=str(ch.id)))
-    for ch in guild.text_channels:
-        if current.lower() in ch.name.lower():
-            choices.append(app_commands.Choice(name=ch.name, value=str(ch.id)))
-        if len(choices) >= 15:
-            break
-    return choices
+    recent = (await get_recent_channels(interaction.user.id, guild.id))[:10]
+    results = get_channel_index(guild, "text").search(current, AUTOCOMPLETE_LIMIT, recent)
+    return [
+        app_commands.Choice(name=f"⭐ {name}" if is_recent else name, value=str(cid))
+        for cid, name, is_recent in results
+    ]
 
 async def category_autocomplete(interaction: discord.Interaction, current: str):
     if not interaction.guild:
         return []
-    choices = []
-    for cat in interaction.guild.categories:
-        if current.lower() in cat.name.lower():
-            choices.append(app_commands.Choice(name=cat.name, value=str(cat.id)))
-        if len(choices) >= 15:
-            break
-    return choices
+    results = get_channel_index(interaction.guild, "category").search(current, AUTOCOMPLETE_LIMIT)
+    return [app_commands.Choice(name=name, value=str(cid)) for cid, name, _ in results]
 
 async def channeltype_autocomplete(interaction: discord.Interaction, current: str):
     options = [("Text Channel", "text"), ("Voice Channel", "voice")]
@@ -212,24 +558,24 @@ def xp_for_message(message_content: str) -> int:
     return base + extra
 
 def required_xp_for_level(level: int) -> int:
-    return 50 * (level ** 2) + 100
+    return LEVEL_CURVE.required_for_level(level)
 
 def total_xp_to_reach_level(level: int) -> int:
-    total = 0
-    for L in range(1, level + 1):
-        total += required_xp_for_level(L)
-    return total
+    return LEVEL_CURVE.total_for_level(level)
 
 def compute_level_from_total_xp(total_xp: int) -> int:
-    level = 0
-    while total_xp >= total_xp_to_reach_level(level + 1):
-        level += 1
-    return level
+    return LEVEL_CURVE.level_for(total_xp)
+
+def rank_for_daily_xp(daily_xp: int, ranks=RANKS):
+    for rank, thresh in ranks:
+        if daily_xp >= thresh:
+            return rank
+    return None
 
 # ---------- Advanced Level Up Notification ----------
 async def send_level_up_notification(member: discord.Member, old_level: int, new_level: int):
     if new_level > old_level:
-        channel = client.get_channel(NOTIFICATION_CHANNEL_ID)
+        channel = client.get_channel(guild_configs.get(member.guild.id).notification_channel_id)
         if channel and channel.permissions_for(member.guild.me).send_messages:
             embed = discord.Embed(
                 title="✨ LEVEL UP ACHIEVEMENT ✨",
@@ -260,12 +606,12 @@ async def send_level_up_notification(member: discord.Member, old_level: int, new
             embed.set_author(name=f"{member.display_name}'s Level Journey", icon_url=member.display_avatar.url)
             embed.set_footer(text=f"Level {new_level} • Keep climbing! 📈")
 
-            await channel.send(embed=embed)
+            dispatcher.submit(NOTIFICATION, ("send", channel.id), lambda: channel.send(embed=embed))
 
 # ---------- Advanced Rank Up Notification ----------
 async def send_rank_up_notification(member: discord.Member, old_rank: str, new_rank: str):
     if new_rank != old_rank:
-        channel = client.get_channel(NOTIFICATION_CHANNEL_ID)
+        channel = client.get_channel(guild_configs.get(member.guild.id).notification_channel_id)
         if channel and channel.permissions_for(member.guild.me).send_messages:
             rank_emoji = RANK_EMOJIS.get(new_rank, "🏆")
 
@@ -276,9 +622,10 @@ async def send_rank_up_notification(member: discord.Member, old_rank: str, new_r
                 timestamp=datetime.now(timezone.utc)
             )
 
-            rank_index = RANK_ORDER.index(new_rank) if new_rank in RANK_ORDER else -1
+            rank_order = guild_configs.get(member.guild.id).rank_order
+            rank_index = rank_order.index(new_rank) if new_rank in rank_order else -1
             if rank_index > 0:
-                next_rank = RANK_ORDER[rank_index - 1] if rank_index > 0 else None
+                next_rank = rank_order[rank_index - 1] if rank_index > 0 else None
                 if next_rank:
                     embed.add_field(
                         name="Next Goal",
@@ -303,45 +650,55 @@ async def send_rank_up_notification(member: discord.Member, old_rank: str, new_r
             embed.set_author(name=f"{member.display_name}'s Rank Achievement", icon_url=member.display_avatar.url)
             embed.set_footer(text=f"{new_rank} Rank • Keep up the great work! 💪")
 
-            await channel.send(embed=embed)
+            dispatcher.submit(NOTIFICATION, ("send", channel.id), lambda: channel.send(embed=embed))
 
 # ---------- DB helpers ----------
+@tracer.span
 async def add_message(guild_id: int, user_id: int, xp: int, channel_id: int):
-    now = int(time.time())
-    async with db_pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO users (guild_id, user_id, total_xp, daily_xp, daily_msgs, last_message_ts, channel_id)
-            VALUES ($1, $2, $3, $4, $5, $6, $7)
-            ON CONFLICT (guild_id, user_id)
-            DO UPDATE SET
-                total_xp = users.total_xp + $3,
-                daily_xp = users.daily_xp + $4,
-                daily_msgs = users.daily_msgs + $5,
-                last_message_ts = $6,
-                channel_id = $7
-        """, guild_id, user_id, xp, xp, 1, now, channel_id)
+    # Buffered; xp_buffer writes it to the users table in batches
+    state = member_cache.add_xp(guild_id, user_id, xp)
+    leaderboards.add_xp(guild_id, user_id, xp, state.total_xp if state else None)
+    await xp_buffer.add(guild_id, user_id, xp, channel_id)
+
+@tracer.span
+async def get_member_state(guild_id: int, user_id: int) -> MemberState:
+    state = member_cache.get(guild_id, user_id)
+    if state is not None:
+        return state
 
-async def get_user_row(guild_id: int, user_id: int):
     async with db_pool.acquire() as conn:
         row = await conn.fetchrow("""
-            SELECT total_xp, daily_msgs, daily_xp
-            FROM users
-            WHERE guild_id=$1 AND user_id=$2
+            SELECT u.total_xp, u.daily_msgs, u.daily_xp, m.forced_rank
+            FROM (SELECT $1::bigint AS guild_id, $2::bigint AS user_id) k
+            LEFT JOIN users u USING (guild_id, user_id)
+            LEFT JOIN manual_ranks m USING (guild_id, user_id)
         """, guild_id, user_id)
 
-        if not row:
-            return {"total_xp": 0, "daily_msgs": 0, "daily_xp": 0}
-        return {"total_xp": row['total_xp'], "daily_msgs": row['daily_msgs'], "daily_xp": row['daily_xp']}
+    # Include XP that is still waiting in the write-behind buffer
+    pending_xp, pending_msgs = xp_buffer.pending_for(guild_id, user_id)
+    state = MemberState(
+        (row['total_xp'] or 0) + pending_xp,
+        (row['daily_xp'] or 0) + pending_xp,
+        (row['daily_msgs'] or 0) + pending_msgs,
+        row['forced_rank']
+    )
+    return member_cache.put(guild_id, user_id, state)
 
-async def reset_all_daily(guild_id: int):
-    async with db_pool.acquire() as conn:
-        await conn.execute("UPDATE users SET daily_msgs=0, daily_xp=0 WHERE guild_id=$1", guild_id)
+@tracer.span
+async def get_user_row(guild_id: int, user_id: int):
+    state = await get_member_state(guild_id, user_id)
+    return state.as_row()
 
+@tracer.span
 async def reset_user_all(guild_id: int, user_id: int):
+    await xp_buffer.discard(guild_id, user_id)
     async with db_pool.acquire() as conn:
         await conn.execute("DELETE FROM users WHERE guild_id=$1 AND user_id=$2", guild_id, user_id)
         await conn.execute("DELETE FROM manual_ranks WHERE guild_id=$1 AND user_id=$2", guild_id, user_id)
+    member_cache.drop(guild_id, [user_id])
+    leaderboards.remove(guild_id, [user_id])
 
+@tracer.span
 async def force_set_manual_rank(guild_id: int, user_id: int, rank_str: str):
     async with db_pool.acquire() as conn:
         await conn.execute("""
@@ -350,110 +707,170 @@ async def force_set_manual_rank(guild_id: int, user_id: int, rank_str: str):
             ON CONFLICT (guild_id, user_id)
             DO UPDATE SET forced_rank = $3
         """, guild_id, user_id, rank_str)
+    member_cache.set_forced_rank(guild_id, user_id, rank_str)
 
+@tracer.span
 async def get_manual_rank(guild_id: int, user_id: int):
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT forced_rank FROM manual_ranks WHERE guild_id=$1 AND user_id=$2", guild_id, user_id)
-        return row['forced_rank'] if row else None
+    state = await get_member_state(guild_id, user_id)
+    return state.forced_rank
 
+@tracer.span
 async def clear_manual_rank(guild_id: int, user_id: int):
     async with db_pool.acquire() as conn:
         await conn.execute("DELETE FROM manual_ranks WHERE guild_id=$1 AND user_id=$2", guild_id, user_id)
+    member_cache.set_forced_rank(guild_id, user_id, None)
 
 # ---------- Role management ----------
 async def get_or_create_role(guild: discord.Guild, rank_name: str):
-    role_name = f"{ROLE_PREFIX}{rank_name}"
-    role = discord.utils.get(guild.roles, name=role_name)
+    role = rank_roles.get_role(guild, rank_name)
     if role:
         return role
+    role_name = f"{ROLE_PREFIX}{rank_name}"
     try:
         role = await guild.create_role(
             name=role_name,
             reason="Auto-created rank role",
             color=RANK_COLORS.get(rank_name, discord.Color.default())
         )
+        rank_roles.remember(guild, rank_name, role)
         return role
     except Exception as e:
         print(f"⚠️ Could not create role {role_name}: {e}")
         return None
 
+async def apply_rank_role(guild: discord.Guild, member: discord.Member, rank_name: str):
+    # One member.edit with the final role list, and only if something changes.
+    # Returns whether roles changed; raises if they couldn't be (RoleSyncJob counts it)
+    target = await get_or_create_role(guild, rank_name) if rank_name else None
+    if rank_name and target is None:
+        raise RuntimeError(f"no role for rank {rank_name}")
+    keep, current, wanted = desired_roles(member, rank_roles.all_ids(guild), target.id if target else None)
+    if wanted == current:
+        return False
+    await member.edit(roles=keep + ([target] if target else []), reason="Rank update")
+    return True
+
+async def sync_rank_role(guild: discord.Guild, member: discord.Member, rank_name: str):
+    # Best effort, for the message path and single-member commands
+    try:
+        return await apply_rank_role(guild, member, rank_name)
+    except Exception:
+        return False
+
 async def remove_rank_roles_from_member(guild: discord.Guild, member: discord.Member):
-    for rn in RANK_ORDER:
-        r = discord.utils.get(guild.roles, name=f"{ROLE_PREFIX}{rn}")
-        if r and r in member.roles:
-            try:
-                await member.remove_roles(r)
-            except Exception:
-                pass
+    await sync_rank_role(guild, member, None)
+
+async def start_role_sync(guild: discord.Guild, plan: dict = None, on_progress=None):
+    # Persist the plan first, then drain role_sync_queue in the background (one job per guild)
+    await RoleSyncJob.enqueue(db_pool, guild.id, plan)
+    task = role_sync_tasks.get(guild.id)
+    if task and not task.done():
+        return task
+    job = RoleSyncJob(
+        db_pool, guild, apply_rank_role,
+        concurrency=ROLE_SYNC_CONCURRENCY,
+        per_second=ROLE_SYNC_PER_SECOND,
+        on_progress=on_progress
+    )
 
-async def assign_rank_role_for_member(guild: discord.Guild, member: discord.Member, rank_name: str):
-    if not rank_name:
-        return
-    role = await get_or_create_role(guild, rank_name)
-    if role:
-        try:
-            await member.add_roles(role)
-        except Exception:
-            pass
+    async def runner():
+        await job.run()
+        if job.total:
+            print(f"✅ Role sync for {guild.name}: {job.changed} changed, {job.failed} failed of {job.total}")
+        return job
+
+    task = asyncio.create_task(runner())
+    role_sync_tasks[guild.id] = task
+    return task
+
+async def resume_role_syncs():
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch("SELECT DISTINCT guild_id FROM role_sync_queue")
+    for row in rows:
+        guild = client.get_guild(row['guild_id'])
+        if guild and fleet_locks.owns_shard(guild.shard_id):
+            print(f"🔄 Resuming unfinished role sync for {guild.name}")
+            await start_role_sync(guild)
 
 async def evaluate_and_update_member_rank(guild: discord.Guild, member: discord.Member, daily_xp: int):
     forced = await get_manual_rank(guild.id, member.id)
     if forced:
-        await remove_rank_roles_from_member(guild, member)
-        await assign_rank_role_for_member(guild, member, forced)
+        await sync_rank_role(guild, member, forced)
         return forced
 
     target_rank = None
-    for rank, thresh in RANKS:
+    for rank, thresh in guild_configs.get(guild.id).ranks:
         if daily_xp >= thresh:
             target_rank = rank
             break
 
-    await remove_rank_roles_from_member(guild, member)
-
-    if target_rank:
-        await assign_rank_role_for_member(guild, member, target_rank)
+    await sync_rank_role(guild, member, target_rank)
 
     return target_rank
 
-# ---------- Leaderboard cache ----------
-leaderboard_cache = {}
-
 # ---------- STATUS / COUNTER / AUTO TASKS ----------
+async def publish_guild_counts():
+    # Member counts of the guilds whose shards this process owns, for status on other processes
+    rows = [(g.id, g.shard_id or 0, g.member_count or 0) for g in client.guilds if fleet_locks.owns_shard(g.shard_id)]
+    if not rows:
+        return
+    async with db_pool.acquire() as conn:
+        await conn.executemany("""
+            INSERT INTO fleet_guilds (guild_id, shard_id, member_count, updated_at)
+            VALUES ($1, $2, $3, NOW())
+            ON CONFLICT (guild_id) DO UPDATE SET shard_id = $2, member_count = $3, updated_at = NOW()
+        """, rows)
+
+async def fleet_member_count(guild_id: int = None) -> int:
+    # One guild's member count (or every guild's) as last published by whichever process owns it
+    async with db_pool.acquire() as conn:
+        return await conn.fetchval("""
+            SELECT COALESCE(SUM(member_count), 0) FROM fleet_guilds
+            WHERE updated_at > NOW() - make_interval(secs => $1)
+              AND ($2::bigint IS NULL OR guild_id = $2)
+        """, FLEET_STALE_SECONDS, guild_id)
+
 async def status_loop():
+    # Every shard shows the same presence, built from the home guild (GUILD_ID, or the
+    # only guild of a single-guild bot) even when another process serves it. Without
+    # a home guild the member count is the whole fleet's.
     await client.wait_until_ready()
-    target_guild = None
-    if GUILD_ID_ENV:
-        try:
-            gid = int(GUILD_ID_ENV)
-            target_guild = client.get_guild(gid)
-        except Exception:
-            target_guild = None
+    home_id = int(GUILD_ID_ENV) if GUILD_ID_ENV else None
 
     while not client.is_closed():
+        loop_tick("status_loop")
         try:
-            guild = target_guild or (client.guilds[0] if client.guilds else None)
-            if not guild:
+            if not client.guilds:
                 await asyncio.sleep(5)
                 continue
+            await publish_guild_counts()
+            gid = home_id or (client.guilds[0].id if len(client.guilds) == 1 and not SHARD_IDS else None)
+            home = client.get_guild(gid) if gid else None
+            if gid and home is None:
+                # Written by the process that owns the home guild; re-read instead of trusting our cache
+                state_store.forget("custom_status", gid)
+                state_store.forget("last_joined_member", gid)
 
             # Agar custom status set hai to use hi dikhaye (Playing ke bina)
-            if custom_status.get(guild.id):
+            status = await state_store.get("custom_status", gid) if gid else None
+            if status:
                 await client.change_presence(
-                    activity=discord.CustomActivity(name=custom_status[guild.id])
+                    activity=discord.CustomActivity(name=status)
                 )
                 await asyncio.sleep(STATUS_SWITCH_SECONDS)
                 continue
 
             # 1) Member count status (Playing prefix removed)
-            count = guild.member_count
+            count = home.member_count if home else await fleet_member_count(gid)
             await client.change_presence(
                 activity=discord.CustomActivity(name=f"Total Member: {count}")
             )
             await asyncio.sleep(STATUS_SWITCH_SECONDS)
 
             # 2) Welcome recent member / waiting status (Playing prefix removed)
-            last = last_joined_member.get(guild.id)
+            if not gid:
+                continue
+            last = await state_store.get("last_joined_member", gid)
             if last:
                 await client.change_presence(
                     activity=discord.CustomActivity(name=f"Welcome {last}")
@@ -468,135 +885,188 @@ async def status_loop():
 
         except Exception as e:
             print(f"⚠️ status_loop error: {e}")
+            loop_errors.inc(("status_loop",))
             await asyncio.sleep(30)
 
-async def counter_updater():
-    await client.wait_until_ready()
-    while not client.is_closed():
-        try:
-            for gid, channels in list(counter_channels.items()):
-                guild = client.get_guild(gid)
-                if not guild:
-                    continue
-                for ch_id, base_name in list(channels.items()):
-                    ch = guild.get_channel(ch_id)
-                    if ch:
-                        new_name = f"{base_name} {guild.member_count}"
-                        if ch.name != new_name:
-                            try:
-                                await ch.edit(name=new_name)
-                            except Exception:
-                                pass
-        except Exception as e:
-            print(f"⚠️ counter_updater error: {e}")
-        await asyncio.sleep(COUNTER_UPDATE_SECONDS)
+# ---------- Member counters ----------
+async def get_counter_channels(guild_id: int):
+    # {channel_id: base_name}; stored as [[channel_id, base_name], ...]
+    return {cid: name for cid, name in await state_store.get("counter_channels", guild_id, default=[])}
+
+async def save_counter_channel(guild_id: int, channel_id: int, base_name: str):
+    channels = await get_counter_channels(guild_id)
+    channels[channel_id] = base_name
+    state_store.set("counter_channels", guild_id, 0, list(channels.items()))
+
+async def delete_counter_channel(guild_id: int, channel_id: int):
+    channels = await get_counter_channels(guild_id)
+    channels.pop(channel_id, None)
+    if channels:
+        state_store.set("counter_channels", guild_id, 0, list(channels.items()))
+    else:
+        state_store.delete("counter_channels", guild_id)
+    counter_scheduler.cancel(channel_id)
+
+def submit_counter_rename(channel, name: str):
+    dispatcher.submit(
+        COSMETIC, ("rename", channel.id),
+        lambda: channel.edit(name=name),
+        coalesce_key=("rename", channel.id)
+    )
+
+counter_scheduler = CounterScheduler(
+    submit_counter_rename,
+    renames=COUNTER_RENAMES_PER_WINDOW,
+    window=COUNTER_RENAME_WINDOW,
+    settle=COUNTER_SETTLE_SECONDS
+)
+
+async def refresh_counters(guild: discord.Guild):
+    # Called on join/leave; the scheduler applies only the latest count per rename window
+    for ch_id, base_name in (await get_counter_channels(guild.id)).items():
+        ch = guild.get_channel(ch_id)
+        if ch:
+            counter_scheduler.request(ch, f"{base_name} {guild.member_count}")
 
 async def auto_message_task():
+    # Posts to the auto channel of every guild on the shards this process owns
     await client.wait_until_ready()
-    channel = client.get_channel(AUTO_CHANNEL_ID)
 
     print(f"🔄 Auto message task started")
     print(f"📝 Loaded {len(AUTO_MESSAGES)} messages")
-    print(f"📢 Target channel ID: {AUTO_CHANNEL_ID}")
-
-    if not channel:
-        print(f"❌ Auto channel {AUTO_CHANNEL_ID} not found. Auto messages disabled.")
-        return
-
-    print(f"✅ Found channel: #{channel.name} ({channel.id})")
 
     last_reload_time = 0
 
     while not client.is_closed():
+        loop_tick("auto_message_task")
         try:
-            # Reload messages every 12 hours
+            # Re-check the URL periodically (conditional request)
             current_time = time.time()
-            if AUTO_FILE_URL and (current_time - last_reload_time) >= 43200:
+            if AUTO_FILE_URL and (current_time - last_reload_time) >= AUTO_RELOAD_SECONDS:
                 print("🔄 Reloading messages from URL...")
                 await load_auto_messages_from_url()
                 last_reload_time = current_time
 
             if AUTO_MESSAGES:
-                msg = random.choice(AUTO_MESSAGES)
-                print(f"📤 Sending message: {msg[:50]}...")
-                await channel.send(msg)
-                print("✅ Message sent successfully")
+                queued = 0
+                for guild in client.guilds:
+                    channel = guild.get_channel(guild_configs.get(guild.id).auto_channel_id)
+                    if channel is None or not fleet_locks.owns_shard(guild.shard_id):
+                        continue
+                    msg = random.choice(AUTO_MESSAGES)
+                    dispatcher.submit(COSMETIC, ("send", channel.id), lambda ch=channel, m=msg: ch.send(m))
+                    queued += 1
+                print(f"✅ Auto message queued for {queued} channels")
             else:
                 print("⚠️ No auto messages available to send")
 
         except Exception as e:
             print(f"❌ Auto message error: {e}")
+            loop_errors.inc(("auto_message_task",))
 
         print(f"⏳ Waiting {AUTO_INTERVAL} seconds...")
         await asyncio.sleep(AUTO_INTERVAL)
 
 # ---------- Daily reset ----------
-async def evaluate_and_reset_for_guild(guild: discord.Guild):
-    async with db_pool.acquire() as conn:
-        rows = await conn.fetch("SELECT user_id, daily_xp FROM users WHERE guild_id=$1", guild.id)
+# Each guild rolls over at its own local midnight (guild config timezone) plus
+# a stable per-guild offset, so guilds don't all hit the database in the same minute.
+scheduler = AsyncIOScheduler()
+
+@tracer.span
+async def evaluate_and_reset_for_guild(guild: discord.Guild, day=None):
+    # day: the local date being closed; defaults to yesterday in the guild's timezone
+    config = guild_configs.get(guild.id)
+    if day is None:
+        day = datetime.now(pytz.timezone(config.timezone)).date() - timedelta(days=1)
+    # Write buffered XP first so yesterday's messages count towards the reset
+    await xp_buffer.flush()
+    targets = await roll_over_guild(db_pool, guild.id, day, config.ranks)
+    if targets is None:
+        print(f"ℹ️ Daily reset for {guild.name} already done for {day}")
+        return
 
-        for row in rows:
-            uid, dxp = row['user_id'], row['daily_xp']
-            member = guild.get_member(uid)
-            if not member:
-                continue
-            try:
-                await evaluate_and_update_member_rank(guild, member, dxp)
-            except Exception as e:
-                print(f"⚠️ Rank update error for {member}: {e}")
+    plan = plan_rank_changes(guild, rank_roles, targets)
+    await RoleSyncJob.enqueue(db_pool, guild.id, plan)
 
-    await reset_all_daily(guild.id)
-    leaderboard_cache.pop(guild.id, None)
-    print(f"✅ Daily reset completed for {guild.name}")
+    member_cache.reset_daily(guild.id)
+    leaderboards.reset(guild.id)
+    await start_role_sync(guild)
+    print(f"✅ Daily reset completed for {guild.name} ({len(plan)} rank roles to update)")
 
-async def reset_daily_ranks_async():
-    for guild in client.guilds:
-        try:
-            await evaluate_and_reset_for_guild(guild)
-        except Exception as e:
-            print(f"⚠️ Daily reset error guild {guild.id}: {e}")
+async def reset_guild_daily(guild_id: int):
+    # Every process schedules its guilds; only the owner of the guild's shard lock resets it
+    guild = client.get_guild(guild_id)
+    if guild is None or not fleet_locks.owns_shard(guild.shard_id):
+        return
+    try:
+        await evaluate_and_reset_for_guild(guild)
+    except Exception as e:
+        print(f"⚠️ Daily reset error guild {guild_id}: {e}")
 
-def schedule_daily_reset():
-    tz = pytz.timezone("Asia/Karachi")
-    scheduler = AsyncIOScheduler(timezone=tz)
+def schedule_guild_reset(guild_id: int):
+    # Fixed job ID: rescheduling (reconnect, timezone change) replaces the old job
+    minute, second = divmod(reset_offset(guild_id, RESET_SPREAD_SECONDS), 60)
     scheduler.add_job(
-        lambda: asyncio.create_task(reset_daily_ranks_async()),
+        reset_guild_daily,
         "cron",
+        args=[guild_id],
+        id=f"daily_reset:{guild_id}",
+        replace_existing=True,
         hour=0,
-        minute=0,
-        misfire_grace_time=3600
+        minute=minute,
+        second=second,
+        timezone=pytz.timezone(guild_configs.get(guild_id).timezone),
+        misfire_grace_time=3600,
+        coalesce=True
     )
-    scheduler.start()
-    print("✅ Scheduled daily reset (00:00 Asia/Karachi)")
+
+def unschedule_guild_reset(guild_id: int):
+    if scheduler.get_job(f"daily_reset:{guild_id}"):
+        scheduler.remove_job(f"daily_reset:{guild_id}")
 
 # ---------- Auto Cleanup Left Users ----------
+async def forget_members(guild_id: int, user_ids):
+    for uid in user_ids:
+        await xp_buffer.discard(guild_id, uid)
+    member_cache.drop(guild_id, user_ids)
+    leaderboards.remove(guild_id, user_ids)
+
+leave_buffer = LeaveBuffer(flush_interval=LEAVE_FLUSH_SECONDS, on_removed=forget_members)
+
 async def cleanup_left_users():
     for guild in client.guilds:
+        if not fleet_locks.owns_shard(guild.shard_id):
+            continue
         try:
-            async with db_pool.acquire() as conn:
-                db_users = await conn.fetch("SELECT user_id FROM users WHERE guild_id=$1", guild.id)
-                db_user_ids = {row['user_id'] for row in db_users}
-
-                current_member_ids = {member.id for member in guild.members}
-
-                left_user_ids = db_user_ids - current_member_ids
-
-                if left_user_ids:
-                    await conn.execute("DELETE FROM users WHERE guild_id=$1 AND user_id = ANY($2::bigint[])",
-                                       guild.id, list(left_user_ids))
-                    await conn.execute("DELETE FROM manual_ranks WHERE guild_id=$1 AND user_id = ANY($2::bigint[])",
-                                       guild.id, list(left_user_ids))
-
-                    print(f"✅ Removed {len(left_user_ids)} left users from database for guild {guild.name}")
-
+            found = await sweep_left_users(db_pool, guild, leave_buffer, chunk_size=LEFT_SWEEP_CHUNK, pause=LEFT_SWEEP_PAUSE)
+            if found:
+                print(f"✅ Queued {found} left users for removal in guild {guild.name}")
         except Exception as e:
             print(f"⚠️ Error cleaning up left users for guild {guild.id}: {e}")
 
-def schedule_user_cleanup():
-    scheduler = AsyncIOScheduler()
-    scheduler.add_job(cleanup_left_users, 'interval', hours=1)
-    scheduler.start()
-    print("✅ Scheduled user cleanup (every 1 hour)")
+def evict_idle_xp_cooldowns():
+    evicted = xp_cooldowns.evict_idle()
+    if evicted:
+        print(f"🧹 Evicted {evicted} idle XP cooldown buckets ({len(xp_cooldowns)} active)")
+
+async def prune_fleet_guilds():
+    # Guilds no process has published for a day (e.g. the bot was removed while down)
+    if not fleet_locks.is_leader():
+        return
+    async with db_pool.acquire() as conn:
+        await conn.execute("DELETE FROM fleet_guilds WHERE updated_at < NOW() - interval '1 day'")
+
+def schedule_jobs():
+    # on_ready runs again after every reconnect: start the scheduler and its
+    # interval jobs once, and (re)place the per-guild resets by job ID
+    if not scheduler.running:
+        scheduler.add_job(cleanup_left_users, 'interval', hours=1, id="cleanup_left_users")
+        scheduler.add_job(prune_fleet_guilds, 'interval', hours=1, id="prune_fleet_guilds")
+        scheduler.add_job(evict_idle_xp_cooldowns, 'interval', minutes=5, id="evict_idle_xp_cooldowns")
+        scheduler.start()
+    for guild in client.guilds:
+        schedule_guild_reset(guild.id)
+    print(f"✅ Scheduled daily resets for {len(client.guilds)} guilds and user cleanup (every 1 hour)")
 
 # ---------- SLASH COMMANDS ----------
 @tree.command(name="say", description="Send formatted message to a channel (Admin only)")
@@ -606,7 +1076,7 @@ async def say(interaction: discord.Interaction, channel_id: str, content: str):
         return await interaction.response.send_message("❌ You are not allowed.", ephemeral=True)
     ch = await client.fetch_channel(int(channel_id))
     sent = await ch.send(content)
-    update_recent_channel(interaction.user.id, interaction.guild.id, int(channel_id))
+    await update_recent_channel(interaction.user.id, interaction.guild.id, int(channel_id))
     await interaction.response.send_message(f"Sent ✅ ({sent.jump_url})", ephemeral=True)
 
 @tree.command(name="embed", description="Send embed message (Admin only)")
@@ -624,7 +1094,7 @@ async def embed(interaction: discord.Interaction, channel_id: str, title: str, d
     if url:
         e.url = url
     sent = await ch.send(embed=e)
-    update_recent_channel(interaction.user.id, interaction.guild.id, int(channel_id))
+    await update_recent_channel(interaction.user.id, interaction.guild.id, int(channel_id))
     await interaction.edit_original_response(content=f"Embed sent ✅ ({sent.jump_url})")
 
 @tree.command(name="edit", description="Edit existing message with link (Admin only)")
@@ -642,11 +1112,9 @@ async def edit(interaction: discord.Interaction, message_link: str, new_content:
 
 @tree.command(name="recent", description="Show your last used channels")
 async def recent(interaction: discord.Interaction):
-    user_id = interaction.user.id
-    guild_id = interaction.guild.id
-    if user_id not in recent_channels or guild_id not in recent_channels[user_id]:
+    ch_list = await get_recent_channels(interaction.user.id, interaction.guild.id)
+    if not ch_list:
         return await interaction.response.send_message("No recent channels yet.", ephemeral=True)
-    ch_list = recent_channels[user_id][guild_id]
     guild = interaction.guild
     names = []
     for cid in ch_list[:10]:
@@ -665,11 +1133,18 @@ async def help_command(interaction: discord.Interaction):
     embed.add_field(name="/recent", value="Show your recent channels", inline=False)
     embed.add_field(name="/purge", value="(Admin) Delete messages", inline=False)
     embed.add_field(name="/setcounter", value="(Admin) Create live counter channel", inline=False)
-    embed.add_field(name="/leaderboard", value="Show Top20 by 24h XP", inline=False)
+    embed.add_field(name="/leaderboard", value="Show Top15 by 24h XP (use page for more, shows your position)", inline=False)
     embed.add_field(name="/rank", value="Show your rank, level & XP", inline=False)
     embed.add_field(name="/addrank", value="(Admin) Force rank to user", inline=False)
     embed.add_field(name="/removefromleaderboard", value="(Admin) Remove user from leaderboard (clear XP & ranks)", inline=False)
     embed.add_field(name="/resetleaderboard", value="(Admin) Reset entire guild leaderboard (clear all XP & ranks)", inline=False)
+    embed.add_field(name="/queuestats", value="(Admin) Show outbound message queue stats", inline=False)
+    embed.add_field(name="/linkrule", value="(Admin) Allow / deny link domains", inline=False)
+    embed.add_field(name="/pipelinestats", value="(Admin) Show message handling timings", inline=False)
+    embed.add_field(name="/guildconfig", value="(Admin) Show this server's channels, roles, ranks & timezone", inline=False)
+    embed.add_field(name="/setconfig", value="(Admin) Change one of those settings (empty value = default)", inline=False)
+    embed.add_field(name="/profile", value="(Admin) Profile the bot for N seconds, report to log channel", inline=False)
+    embed.add_field(name="/xpcooldown", value="(Admin) Set XP cooldown (messages per seconds, empty = default)", inline=False)
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @tree.command(name="purge", description="Delete messages (Admin only)")
@@ -690,18 +1165,13 @@ async def setcounter(interaction: discord.Interaction, category_id: str, channel
     category = discord.utils.get(interaction.guild.categories, id=int(category_id))
     if not category:
         return await interaction.response.send_message("❌ Category not found", ephemeral=True)
+    # Create it with the count already in the name, so no rename is spent
+    initial_name = f"{channel_name} {interaction.guild.member_count}" if guild_counter else channel_name
     if channel_type == "voice":
-        new_ch = await category.create_voice_channel(channel_name)
+        new_ch = await category.create_voice_channel(initial_name)
     else:
-        new_ch = await category.create_text_channel(channel_name)
-    if guild_counter:
-        try:
-            await new_ch.edit(name=f"{channel_name} {interaction.guild.member_count}")
-        except Exception:
-            pass
-    if interaction.guild.id not in counter_channels:
-        counter_channels[interaction.guild.id] = {}
-    counter_channels[interaction.guild.id][new_ch.id] = channel_name
+        new_ch = await category.create_text_channel(initial_name)
+    await save_counter_channel(interaction.guild.id, new_ch.id, channel_name)
     await interaction.response.send_message(f"✅ Counter created: {new_ch.mention}", ephemeral=True)
 
 @tree.command(name="setcustomstatus", description="Set a custom status (Admin only)")
@@ -709,7 +1179,7 @@ async def setcustomstatus(interaction: discord.Interaction, message: str):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
     # Custom status now WITHOUT 'Playing' — plain text
-    custom_status[interaction.guild.id] = message
+    state_store.set("custom_status", interaction.guild.id, 0, message)
     await client.change_presence(activity=discord.CustomActivity(name=message))
     await interaction.response.send_message("✅ Custom status set (default loop paused)", ephemeral=True)
 
@@ -718,8 +1188,7 @@ async def setdefaultstatus(interaction: discord.Interaction):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
 
-    if interaction.guild.id in custom_status:
-        custom_status[interaction.guild.id] = None
+    state_store.delete("custom_status", interaction.guild.id)
 
     await interaction.response.send_message("✅ Default status loop resumed", ephemeral=True)
 
@@ -728,118 +1197,353 @@ async def testauto(interaction: discord.Interaction):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
 
-    channel = client.get_channel(AUTO_CHANNEL_ID)
+    channel_id = guild_configs.get(interaction.guild.id).auto_channel_id
+    channel = interaction.guild.get_channel(channel_id)
     if not channel:
-        return await interaction.response.send_message(f"❌ Channel {AUTO_CHANNEL_ID} not found", ephemeral=True)
+        return await interaction.response.send_message(f"❌ Channel {channel_id} not found (see /setconfig)", ephemeral=True)
 
     await interaction.response.send_message(
         f"✅ Auto message system status:\n"
-        f"• Channel: {channel.mention} ({AUTO_CHANNEL_ID})\n"
+        f"• Channel: {channel.mention} ({channel_id})\n"
         f"• Messages loaded: {len(AUTO_MESSAGES)}\n"
         f"• Interval: {AUTO_INTERVAL} seconds\n"
         f"• Next message in: {AUTO_INTERVAL} seconds",
         ephemeral=True
     )
 
-# ---------- MESSAGE FILTER + XP tracking ----------
-@client.event
-async def on_message(message: discord.Message):
-    if message.author.bot or message.guild is None:
-        return
+async def linkaction_autocomplete(interaction: discord.Interaction, current: str):
+    options = [("Allow domain", "allow"), ("Deny domain", "deny"), ("Remove rule", "remove"), ("List rules", "list")]
+    return [app_commands.Choice(name=n, value=v) for n, v in options if current.lower() in n.lower()][:15]
 
-    # XP check
-    if XP_CHANNEL_ID and message.channel.id == XP_CHANNEL_ID:
-        try:
-            old_data = await get_user_row(message.guild.id, message.author.id)
-            old_level = compute_level_from_total_xp(old_data['total_xp'])
-            old_rank = None
-            for r, thresh in RANKS:
-                if old_data['daily_xp'] >= thresh:
-                    old_rank = r
-                    break
+@tree.command(name="linkrule", description="Allow or deny link domains in this server (Admin only)")
+@app_commands.autocomplete(action=linkaction_autocomplete)
+async def linkrule(interaction: discord.Interaction, action: str, domain: str = ""):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
+    gid = interaction.guild.id
+    rules = await get_link_rules(gid)
+    domain = normalize_domain(domain)
+    if action in ("allow", "deny", "remove"):
+        if not domain:
+            return await interaction.response.send_message("❌ Give a domain, e.g. example.com", ephemeral=True)
+        rules = {kind: [d for d in rules[kind] if d != domain] for kind in ("allow", "deny")}
+        if action != "remove":
+            rules[action].append(domain)
+        state_store.set("link_policy", gid, 0, rules)
+        link_policies.pop(gid, None)
+    elif action != "list":
+        return await interaction.response.send_message("❌ Action must be allow, deny, remove or list", ephemeral=True)
+    await interaction.response.send_message(
+        f"🔗 Link rules:\n"
+        f"• Allowed: {', '.join(LINK_ALLOW_DOMAINS + rules['allow']) or 'none'}\n"
+        f"• Denied: {', '.join(rules['deny']) or 'none'}\n"
+        f"• Invites to this server are always allowed",
+        ephemeral=True
+    )
 
-            xp = xp_for_message(message.content)
-            await add_message(message.guild.id, message.author.id, xp, message.channel.id)
+@tree.command(name="xpcooldown", description="Set how often members can earn XP (Admin only)")
+async def xpcooldown(interaction: discord.Interaction, messages: int = 0, seconds: int = 0):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
+    gid = interaction.guild.id
+    if messages <= 0 or seconds <= 0:
+        # No values: back to the default
+        state_store.delete("xp_cooldown", gid)
+        xp_cooldowns.configure(gid)
+    else:
+        state_store.set("xp_cooldown", gid, 0, {"messages": messages, "seconds": seconds})
+        xp_cooldowns.configure(gid, messages, seconds)
+    messages, seconds = xp_cooldowns.limits(gid)
+    await interaction.response.send_message(
+        f"✅ Members earn XP for up to {messages} messages per {seconds} seconds", ephemeral=True
+    )
 
-            new_data = await get_user_row(message.guild.id, message.author.id)
-            new_level = compute_level_from_total_xp(new_data['total_xp'])
+async def setting_autocomplete(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=n, value=n) for n in SETTINGS if current.lower() in n.lower()][:15]
+
+def describe_config(guild: discord.Guild):
+    config = guild_configs.get(guild.id)
+    lines = []
+    for name in CHANNEL_SETTINGS:
+        channel_id = getattr(config, name)
+        channel = guild.get_channel(channel_id) if channel_id else None
+        lines.append(f"• {name}: {channel.mention if channel else 'off' if not channel_id else f'{channel_id} (not in this server)'}")
+    lines.append(f"• bypass_role: {config.bypass_role}")
+    lines.append(f"• ranks: {format_ranks(config.ranks)}")
+    lines.append(f"• timezone: {config.timezone}")
+    return "\n".join(lines)
+
+@tree.command(name="guildconfig", description="Show this server's bot settings (Admin only)")
+async def guildconfig(interaction: discord.Interaction):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
+    await interaction.response.send_message(f"⚙️ Server settings:\n{describe_config(interaction.guild)}", ephemeral=True)
 
-            new_rank = None
-            for r, thresh in RANKS:
-                if new_data['daily_xp'] >= thresh:
-                    new_rank = r
-                    break
+@tree.command(name="setconfig", description="Change a bot setting for this server; empty value = default (Admin only)")
+@app_commands.autocomplete(setting=setting_autocomplete)
+async def setconfig(interaction: discord.Interaction, setting: str, value: str = ""):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
+    if setting not in SETTINGS:
+        return await interaction.response.send_message(f"❌ Setting must be one of: {', '.join(SETTINGS)}", ephemeral=True)
+    try:
+        parsed = parse_setting(setting, value) if value.strip() else None
+    except ValueError as e:
+        return await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+    # Saved with a NOTIFY, so every bot process picks it up immediately
+    await guild_configs.update(interaction.guild.id, **{setting: parsed})
+    await interaction.response.send_message(
+        f"✅ {setting} {'reset to default' if parsed is None else 'updated'}\n{describe_config(interaction.guild)}",
+        ephemeral=True
+    )
 
-            _ = await evaluate_and_update_member_rank(message.guild, message.author, new_data['daily_xp'])
+@tree.command(name="profile", description="Sample the bot for N seconds and post the top stacks (Admin only)")
+async def profile(interaction: discord.Interaction, seconds: int = 10):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
+    if profiler.running:
+        return await interaction.response.send_message("❌ A profile is already running", ephemeral=True)
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    await interaction.response.send_message(f"⏱️ Profiling for {seconds}s, results go to the report channel", ephemeral=True)
+
+    # The sampler runs in a worker thread and reads the event loop thread's stack
+    stacks, samples = await asyncio.to_thread(profiler.run, seconds)
+    report = format_profile(stacks, samples)
+    log_ch = client.get_channel(guild_configs.get(interaction.guild.id).report_channel_id)
+    if log_ch:
+        dispatcher.submit(NOTIFICATION, ("send", log_ch.id), lambda: log_ch.send(
+            f"⏱️ {seconds}s profile requested by {interaction.user.mention} ({samples} samples, {tracer.slow_calls} slow calls so far)",
+            file=discord.File(io.BytesIO(report.encode()), filename="profile.txt")
+        ))
+    else:
+        print(report)
 
-            if new_level > old_level:
-                await send_level_up_notification(message.author, old_level, new_level)
+@tree.command(name="pipelinestats", description="Show on_message stage timings (Admin only)")
+async def pipelinestats(interaction: discord.Interaction):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
 
-            if new_rank != old_rank:
-                await send_rank_up_notification(message.author, old_rank, new_rank)
+    lines = [
+        f"• {name}: {calls} runs, {stopped} stopped, {errors} errors, avg {avg:.2f} ms, max {peak:.1f} ms"
+        for name, calls, stopped, errors, avg, peak in message_pipeline.snapshot()
+    ]
+    await interaction.response.send_message("⏱️ Message pipeline:\n" + "\n".join(lines), ephemeral=True)
 
-        except Exception as e:
-            print("⚠️ XP add error:", e)
-
-    # Moderation check
-    is_admin = message.author.guild_permissions.administrator
-    has_bypass = any(role.name == BYPASS_ROLE for role in message.author.roles) if hasattr(message.author, 'roles') else False
-
-    if not is_admin and not has_bypass:
-        content_lower = message.content.lower()
-
-        for bad in BAD_WORDS:
-            if bad and bad in content_lower:
-                try:
-                    await message.delete()
-                except Exception:
-                    pass
-                try:
-                    await message.channel.send(
-                        f"🚫 Hey {message.author.mention}, stop! Do not use offensive language. Continued violations may lead to a ban.",
-                        delete_after=8
-                    )
-                except Exception:
-                    pass
-
-                log_ch = client.get_channel(REPORT_CHANNEL_ID)
-                if log_ch:
-                    try:
-                        await log_ch.send(
-                            f"⚠️ {message.author.mention} has misbehaved and used: **{bad}** (in {message.channel.mention})"
-                        )
-                    except Exception:
-                        pass
-                return
-
-        if ("http://" in content_lower or "https://" in content_lower or "discord.gg/" in content_lower):
-            try:
-                await message.delete()
-            except Exception:
-                pass
-            try:
-                await message.channel.send(
-                    f"🚫 {message.author.mention}, please do not advertise or share promotional links here. Contact the server admin for paid partnerships.",
-                    delete_after=8
-                )
-            except Exception:
-                pass
-
-            log_ch = client.get_channel(REPORT_CHANNEL_ID)
-            if log_ch:
-                try:
-                    await log_ch.send(
-                        f"⚠️ {message.author.mention} has advertised: `{message.content}` (in {message.channel.mention})"
-                    )
-                except Exception:
-                    pass
-            return
+@tree.command(name="queuestats", description="Show outbound queue stats (Admin only)")
+async def queuestats(interaction: discord.Interaction):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
+
+    stats = dispatcher.stats()
+    fleet = fleet_locks.stats()
+    depth = " | ".join(f"{name}: {count}" for name, count in stats['by_priority'].items())
+    await interaction.response.send_message(
+        f"📬 Outbound queue:\n"
+        f"• Queued: {stats['queued']} ({depth})\n"
+        f"• Waiting for rate limit: {stats['waiting_for_route']}\n"
+        f"• Sent: {stats['sent']} • Failed: {stats['failed']} • 429s: {stats['rate_limited']}\n"
+        f"• Coalesced: {stats['coalesced']} • Dropped: {stats['dropped']}\n"
+        f"🛰️ Fleet: shards {fleet['shards_owned']} of {client.shard_count}"
+        f"{' • leader' if fleet['leader'] else ''} • lock changes: +{fleet['acquired']} / -{fleet['lost']}",
+        ephemeral=True
+    )
+
+# ---------- Link policy ----------
+async def get_link_rules(guild_id: int):
+    return await state_store.get("link_policy", guild_id, default={"allow": [], "deny": []})
+
+async def get_link_policy(guild_id: int) -> LinkPolicy:
+    policy = link_policies.get(guild_id)
+    if policy is None:
+        rules = await get_link_rules(guild_id)
+        policy = link_policies[guild_id] = LinkPolicy(LINK_ALLOW_DOMAINS + rules["allow"], rules["deny"])
+    return policy
+
+async def fetch_invite_guild(code: str):
+    try:
+        invite = await client.fetch_invite(code, with_counts=False)
+        guild_id = invite.guild.id if invite.guild else 0
+    except discord.NotFound:
+        guild_id = 0
+    except Exception as e:
+        print(f"⚠️ Invite lookup failed for {code}: {e}")
+        return None  # not cached; a later message may retry
+    invite_cache.put(code, guild_id)
+    return guild_id
+
+async def resolve_invite_guild(code: str):
+    # Guild the invite points to (0 if invalid), or None if unknown: lookups share the
+    # dispatcher's "invite" bucket and are waited on for at most INVITE_LOOKUP_TIMEOUT,
+    # so a spammer posting fresh codes can't stall on_message. A slow lookup keeps
+    # running and fills the cache. Concurrent lookups of one code share a request.
+    guild_id = invite_cache.get(code)
+    if guild_id is not None:
+        return guild_id
+    task = invite_lookups.get(code)
+    if task is None:
+        if not dispatcher.try_take(("invite", 0)):
+            return None
+        task = invite_lookups[code] = asyncio.ensure_future(fetch_invite_guild(code))
+        task.add_done_callback(lambda _: invite_lookups.pop(code, None))
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), INVITE_LOOKUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+
+async def find_blocked_link(message: discord.Message):
+    # First link in the message the guild's policy doesn't allow, or None
+    policy = await get_link_policy(message.guild.id)
+    blocked, invites = policy.scan(message.content)
+    if blocked:
+        return blocked
+    for code, link in invites:
+        if code == message.guild.vanity_url_code:
+            continue
+        # Unknown (throttled, slow or failed lookup) counts as another guild's invite
+        if await resolve_invite_guild(code) != message.guild.id:
+            return link
+    return None
+
+# ---------- MESSAGE FILTER + XP tracking ----------
+# guard -> permissions -> flood -> moderation -> xp -> notifications -> commands; see pipeline.py
+async def stage_guard(ctx: MessageContext):
+    if ctx.author.bot or ctx.guild is None or not isinstance(ctx.author, discord.Member):
+        return STOP
+
+async def stage_permissions(ctx: MessageContext):
+    # Bypass role IDs are cached per guild instead of comparing role names on every message
+    if bypass_roles.member_has(ctx.author) or ctx.author.guild_permissions.administrator:
+        ctx.moderate = False
+
+async def stage_flood(ctx: MessageContext):
+    # Runs before the bad-word / link scans so a flood is dropped as cheaply as possible
+    if not ctx.moderate:
+        return
+    message = ctx.message
+    kind, first = flood_detector.check(ctx.guild.id, message.channel.id, ctx.author.id)
+    if kind is None:
+        return
+    dispatcher.submit(MODERATION, ("delete", message.channel.id), message.delete)
+    if not first:
+        return STOP  # already acted on this flood; just keep deleting
+
+    member = ctx.author
+    if kind == USER_FLOOD:
+        dispatcher.submit(MODERATION, ("timeout", ctx.guild.id), lambda: member.timeout(
+            timedelta(seconds=FLOOD_TIMEOUT_SECONDS), reason="Message flood"
+        ))
+        warning = f"🚫 {member.mention}, you are sending messages too fast and have been timed out for {FLOOD_TIMEOUT_SECONDS} seconds."
+        report = f"⚠️ {member.mention} was timed out for flooding (in {message.channel.mention})"
+    else:
+        warning = "🚫 This channel is receiving too many messages. Please slow down."
+        report = f"⚠️ Possible raid: message flood in {message.channel.mention}, last from {member.mention}"
+    dispatcher.submit(WARNING, ("send", message.channel.id), lambda: message.channel.send(warning, delete_after=8))
+
+    log_ch = client.get_channel(guild_configs.get(ctx.guild.id).report_channel_id)
+    if log_ch:
+        dispatcher.submit(NOTIFICATION, ("send", log_ch.id), lambda: log_ch.send(report))
+    return STOP
+
+async def stage_moderation(ctx: MessageContext):
+    if not ctx.moderate:
+        return
+    message = ctx.message
+
+    bad = BAD_WORD_MATCHER.find(message.content)
+    if bad:
+        dispatcher.submit(MODERATION, ("delete", message.channel.id), message.delete)
+        dispatcher.submit(WARNING, ("send", message.channel.id), lambda: message.channel.send(
+            f"🚫 Hey {message.author.mention}, stop! Do not use offensive language. Continued violations may lead to a ban.",
+            delete_after=8
+        ))
+
+        log_ch = client.get_channel(guild_configs.get(message.guild.id).report_channel_id)
+        if log_ch:
+            dispatcher.submit(NOTIFICATION, ("send", log_ch.id), lambda: log_ch.send(
+                f"⚠️ {message.author.mention} has misbehaved and used: **{bad}** (in {message.channel.mention})"
+            ))
+        return STOP
+
+    blocked_link = await find_blocked_link(message)
+    if blocked_link:
+        dispatcher.submit(MODERATION, ("delete", message.channel.id), message.delete)
+        dispatcher.submit(WARNING, ("send", message.channel.id), lambda: message.channel.send(
+            f"🚫 {message.author.mention}, please do not advertise or share promotional links here. Contact the server admin for paid partnerships.",
+            delete_after=8
+        ))
+
+        log_ch = client.get_channel(guild_configs.get(message.guild.id).report_channel_id)
+        if log_ch:
+            dispatcher.submit(NOTIFICATION, ("send", log_ch.id), lambda: log_ch.send(
+                f"⚠️ {message.author.mention} has advertised `{blocked_link}`: `{message.content}` (in {message.channel.mention})"
+            ))
+        return STOP
+
+async def load_xp_cooldown(guild_id: int):
+    limits = await state_store.get("xp_cooldown", guild_id)
+    if limits:
+        xp_cooldowns.configure(guild_id, limits["messages"], limits["seconds"])
+    else:
+        xp_cooldowns.configure(guild_id)
+
+async def stage_xp(ctx: MessageContext):
+    xp_channel_id = guild_configs.get(ctx.guild.id).xp_channel_id
+    if not xp_channel_id or ctx.message.channel.id != xp_channel_id:
+        return
+    if not xp_cooldowns.has_limits(ctx.guild.id):
+        await load_xp_cooldown(ctx.guild.id)
+    if not xp_cooldowns.allow(ctx.guild.id, ctx.author.id):
+        return  # inside the cooldown: no XP, no DB work, nothing to notify
+    # Served from member_cache; only a cold member costs a DB read
+    state = await get_member_state(ctx.guild.id, ctx.author.id)
+    old_total, old_daily = state.total_xp, state.daily_xp
+    ctx.xp = xp_for_message(ctx.message.content)
+    ctx.old_level = compute_level_from_total_xp(old_total)
+    ctx.new_level = compute_level_from_total_xp(old_total + ctx.xp)
+    ranks = guild_configs.get(ctx.guild.id).ranks
+    ctx.old_rank = rank_for_daily_xp(old_daily, ranks)
+    ctx.new_rank = rank_for_daily_xp(old_daily + ctx.xp, ranks)
+
+    # The buffered XP write and the rank role check are independent
+    await asyncio.gather(
+        add_message(ctx.guild.id, ctx.author.id, ctx.xp, ctx.message.channel.id),
+        evaluate_and_update_member_rank(ctx.guild, ctx.author, old_daily + ctx.xp)
+    )
+
+async def stage_notifications(ctx: MessageContext):
+    if ctx.new_level > ctx.old_level:
+        await send_level_up_notification(ctx.author, ctx.old_level, ctx.new_level)
+    if ctx.new_rank != ctx.old_rank:
+        await send_rank_up_notification(ctx.author, ctx.old_rank, ctx.new_rank)
 
+async def stage_commands(ctx: MessageContext):
+    message = ctx.message
     if message.content.strip().lower().startswith("!ping"):
-        try:
-            await message.channel.send(f"🏓 Pong! Latency: {round(client.latency * 1000)}ms")
-        except Exception:
-            pass
+        dispatcher.submit(NOTIFICATION, ("send", message.channel.id), lambda: message.channel.send(
+            f"🏓 Pong! Latency: {round(client.latency * 1000)}ms"
+        ))
+
+message_pipeline = Pipeline([
+    ("guard", stage_guard),
+    ("permissions", stage_permissions),
+    ("flood", stage_flood),
+    ("moderation", stage_moderation),
+    ("xp", stage_xp),
+    ("notifications", stage_notifications),
+    ("commands", stage_commands),
+], observe=lambda stage, seconds: stage_seconds.observe(seconds, (stage,)))
+
+@client.event
+async def on_message(message: discord.Message):
+    if not owns_events(message.guild):
+        return
+    started = time.perf_counter()
+    await message_pipeline.run(MessageContext(message))
+    message_seconds.observe(time.perf_counter() - started)
+
+@client.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    observe_command(interaction, "ok")
 
 # ---------- Enhanced Rank Command ----------
 @tree.command(name="rank", description="Show your rank and level")
@@ -847,6 +1551,8 @@ async def rank_cmd(interaction: discord.Interaction, member: discord.Member = No
     member = member or interaction.user
     if interaction.guild is None:
         return await interaction.response.send_message("Guild-only.", ephemeral=True)
+    # An avatar download or a cold render pool can outlast the 3 s interaction deadline
+    await interaction.response.defer()
 
     row = await get_user_row(interaction.guild.id, member.id)
     total_xp = row['total_xp']
@@ -854,13 +1560,14 @@ async def rank_cmd(interaction: discord.Interaction, member: discord.Member = No
 
     lvl = compute_level_from_total_xp(total_xp)
 
+    config = guild_configs.get(interaction.guild.id)
     forced_rank = await get_manual_rank(interaction.guild.id, member.id)
     if forced_rank:
         rank_name = forced_rank
         rank_source = " (Admin Set)"
     else:
         rank_name = None
-        for r, thresh in RANKS:
+        for r, thresh in config.ranks:
             if daily_xp >= thresh:
                 rank_name = r
                 break
@@ -902,12 +1609,12 @@ async def rank_cmd(interaction: discord.Interaction, member: discord.Member = No
     embed.add_field(name="⭐ 24h XP", value=f"**{daily_xp}**", inline=True)
 
     next_rank = None
-    if rank_name:
-        current_rank_index = RANK_ORDER.index(rank_name)
+    if rank_name in config.rank_order:
+        current_rank_index = config.rank_order.index(rank_name)
         if current_rank_index > 0:
-            next_rank = RANKS[current_rank_index - 1]
-    else:
-        next_rank = RANKS[-1]
+            next_rank = config.ranks[current_rank_index - 1]
+    elif not rank_name:
+        next_rank = config.ranks[-1]
 
     if next_rank:
         xp_needed_to_next = max(0, next_rank[1] - daily_xp)
@@ -918,36 +1625,88 @@ async def rank_cmd(interaction: discord.Interaction, member: discord.Member = No
             inline=True
         )
 
-    rank_info = " | ".join([f"{r}: {t} XP" for r, t in RANKS])
+    rank_info = " | ".join([f"{r}: {t} XP" for r, t in config.ranks])
     embed.set_footer(text=f"Rank Requirements: {rank_info}")
 
-    await interaction.response.send_message(embed=embed)
+    card = None
+    if RANK_CARDS:
+        avatar = member.display_avatar.with_size(256)
+        # Cached by everything drawn on the card, so repeat /rank calls skip rendering
+        key = (member.id, member.display_name, total_xp, daily_xp, lvl, rank_name, avatar.key)
+        try:
+            png = await card_renderer.rank_card(key, {
+                "name": member.display_name,
+                "rank": rank_name,
+                "level": lvl,
+                "total_xp": total_xp,
+                "daily_xp": daily_xp,
+                "xp_progress": xp_progress,
+                "xp_needed": xp_needed,
+                "color": embed_color.value
+            }, fetch_avatar=lambda: bot_http.asset_bytes(f"avatar:{avatar.key}:256", avatar.url))
+            card = discord.File(io.BytesIO(png), filename="rank.png")
+            embed.set_image(url="attachment://rank.png")
+        except Exception as e:
+            print(f"⚠️ Rank card render failed: {e}")
+
+    if card:
+        await interaction.followup.send(embed=embed, file=card)
+    else:
+        await interaction.followup.send(embed=embed)
 
 # ---------- Enhanced Leaderboard Command ----------
 @tree.command(name="leaderboard", description="Show server leaderboard (Top 15 by 24h XP)")
-async def leaderboard(interaction: discord.Interaction):
+async def leaderboard(interaction: discord.Interaction, page: int = 1):
     guild = interaction.guild
     if not guild:
         return await interaction.response.send_message("Guild-only.", ephemeral=True)
+    await interaction.response.defer()  # the card render can outlast the 3 s deadline
 
-    now_ts = time.time()
-    cache = leaderboard_cache.get(guild.id)
-    if cache and now_ts - cache[0] < CACHE_DURATION:
-        return await interaction.response.send_message(embed=cache[1])
-
-    embed = await build_leaderboard_embed(guild)
-    leaderboard_cache[guild.id] = (now_ts, embed)
-    await interaction.response.send_message(embed=embed)
+    embed = await build_leaderboard_embed(guild, page=page, viewer=interaction.user)
+    card = await build_leaderboard_card(guild, page=page) if RANK_CARDS else None
+    if card:
+        embed.set_image(url="attachment://leaderboard.png")
+        await interaction.followup.send(embed=embed, file=card)
+    else:
+        await interaction.followup.send(embed=embed)
+
+async def build_leaderboard_card(guild: discord.Guild, page: int = 1):
+    board = leaderboards.board(guild.id)
+    pages = max(1, -(-len(board) // LEADERBOARD_PAGE_SIZE))
+    page = min(max(page, 1), pages)
+    offset = (page - 1) * LEADERBOARD_PAGE_SIZE
+    top = board.top(offset, LEADERBOARD_PAGE_SIZE)
+    levels = LEVEL_CURVE.levels_for(txp for _, _, txp in top)
+
+    config = guild_configs.get(guild.id)
+    rows = []
+    for idx, (uid, dxp, _) in enumerate(top):
+        member = guild.get_member(uid)
+        if not member:
+            continue
+        user_rank = rank_for_daily_xp(dxp, config.ranks)
+        color = RANK_COLORS.get(user_rank, discord.Color.light_grey()).value
+        rows.append((offset + idx + 1, member.display_name, user_rank, dxp, levels[idx], color))
+
+    data = {
+        "title": f"{guild.name} — Daily Leaderboard",
+        "subtitle": f"Page {page}/{pages} • Reset daily at 12:00 AM {config.timezone}",
+        "rows": rows
+    }
+    try:
+        png = await card_renderer.leaderboard_card((guild.id, guild.name, page, pages, tuple(rows)), data)
+    except Exception as e:
+        print(f"⚠️ Leaderboard card render failed: {e}")
+        return None
+    return discord.File(io.BytesIO(png), filename="leaderboard.png")
 
-async def build_leaderboard_embed(guild: discord.Guild):
-    async with db_pool.acquire() as conn:
-        rows = await conn.fetch("""
-            SELECT user_id, daily_xp, total_xp
-            FROM users
-            WHERE guild_id=$1
-            ORDER BY daily_xp DESC
-            LIMIT 15
-        """, guild.id)
+async def build_leaderboard_embed(guild: discord.Guild, page: int = 1, viewer: discord.Member = None):
+    # Read from the live in-memory board; no database access
+    board = leaderboards.board(guild.id)
+    pages = max(1, -(-len(board) // LEADERBOARD_PAGE_SIZE))
+    page = min(max(page, 1), pages)
+    offset = (page - 1) * LEADERBOARD_PAGE_SIZE
+    rows = board.top(offset, LEADERBOARD_PAGE_SIZE)
 
     embed = discord.Embed(
         title=f"🏆 {guild.name} — Daily Leaderboard",
@@ -961,21 +1720,24 @@ async def build_leaderboard_embed(guild: discord.Guild):
     desc = ""
     medal_emojis = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟", "⑪", "⑫", "⑬", "⑭", "⑮"]
 
-    for idx, row in enumerate(rows):
-        uid, dxp, txp = row['user_id'], row['daily_xp'], row['total_xp']
+    levels = LEVEL_CURVE.levels_for(txp for _, _, txp in rows)
+    config = guild_configs.get(guild.id)
+
+    for idx, (uid, dxp, _) in enumerate(rows):
         member = guild.get_member(uid)
 
         if member:
-            lvl = compute_level_from_total_xp(txp)
+            lvl = levels[idx]
 
             user_rank = None
-            for r, thresh in RANKS:
+            for r, thresh in config.ranks:
                 if dxp >= thresh:
                     user_rank = r
                     break
 
             rank_emoji = RANK_EMOJIS.get(user_rank, "🔹") if user_rank else "🔸"
-            medal = medal_emojis[idx] if idx < len(medal_emojis) else f"{idx+1}."
+            pos = offset + idx
+            medal = medal_emojis[pos] if pos < len(medal_emojis) else f"{pos+1}."
 
             desc += f"{medal} **{member.mention}**\n"
             desc += f"  {rank_emoji} {user_rank if user_rank else 'No Rank'} • ⭐ {dxp} XP • 📈 Lv {lvl}\n"
@@ -986,8 +1748,16 @@ async def build_leaderboard_embed(guild: discord.Guild):
 
     embed.description = desc
 
-    rank_guide = " | ".join([f"{RANK_EMOJIS.get(r, '')} {r}" for r in RANK_ORDER])
-    embed.set_footer(text=f"Ranks: {rank_guide} | Reset daily at 12:00 AM PKT")
+    if viewer:
+        position = board.position(viewer.id)
+        embed.add_field(
+            name="📍 Your Position",
+            value=f"**#{position}** of {len(board)} • ⭐ {board.daily_xp(viewer.id)} XP" if position else "Not on today's board yet",
+            inline=False
+        )
+
+    rank_guide = " | ".join([f"{RANK_EMOJIS.get(r, '')} {r}" for r in config.rank_order])
+    embed.set_footer(text=f"Page {page}/{pages} | Ranks: {rank_guide} | Reset daily at 12:00 AM {config.timezone}")
 
     return embed
 
@@ -997,13 +1767,13 @@ async def addrank(interaction: discord.Interaction, member: discord.Member, rank
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
     rank = rank.strip()
-    if rank not in RANK_ORDER:
+    rank_order = guild_configs.get(interaction.guild.id).rank_order
+    if rank not in rank_order:
         return await interaction.response.send_message(
-            f"❌ Invalid rank. Choose from: {', '.join(RANK_ORDER)}", ephemeral=True
+            f"❌ Invalid rank. Choose from: {', '.join(rank_order)}", ephemeral=True
         )
     await force_set_manual_rank(interaction.guild.id, member.id, rank)
-    await remove_rank_roles_from_member(interaction.guild, member)
-    await assign_rank_role_for_member(interaction.guild, member, rank)
+    await sync_rank_role(interaction.guild, member, rank)
     await interaction.response.send_message("✅ Forced rank applied.", ephemeral=True)
 
 @tree.command(name="removefromleaderboard", description="Admin: remove user from leaderboard (clear XP & ranks)")
@@ -1019,35 +1789,51 @@ async def removefromleaderboard(interaction: discord.Interaction, member: discor
 async def resetleaderboard(interaction: discord.Interaction):
     if not interaction.user.guild_permissions.administrator:
         return await interaction.response.send_message("❌ Not allowed", ephemeral=True)
+    await interaction.response.defer(ephemeral=True)
+    guild = interaction.guild
+    await xp_buffer.discard(guild.id)
     async with db_pool.acquire() as conn:
-        await conn.execute("DELETE FROM users WHERE guild_id=$1", interaction.guild.id)
-        await conn.execute("DELETE FROM manual_ranks WHERE guild_id=$1", interaction.guild.id)
-    for member in interaction.guild.members:
+        await conn.execute("DELETE FROM users WHERE guild_id=$1", guild.id)
+        await conn.execute("DELETE FROM manual_ranks WHERE guild_id=$1", guild.id)
+    member_cache.drop_guild(guild.id)
+    leaderboards.reset(guild.id)
+
+    # Only members that still hold a rank role need an edit
+    plan = plan_rank_changes(guild, rank_roles, {})
+    last_update = 0
+
+    async def report(job):
+        nonlocal last_update
+        now = time.time()
+        if job.done < job.total and now - last_update < 5:
+            return
+        last_update = now
         try:
-            await remove_rank_roles_from_member(interaction.guild, member)
+            await interaction.edit_original_response(
+                content=f"⏳ Guild leaderboard reset. Removing rank roles: {job.done}/{job.total}"
+                if job.done < job.total else
+                f"✅ Guild leaderboard reset. Rank roles removed from {job.changed} members."
+            )
         except Exception:
-            pass
-    await interaction.response.send_message("✅ Guild leaderboard reset.", ephemeral=True)
+            pass  # interaction token expired; the job keeps going
+
+    await interaction.edit_original_response(
+        content=f"⏳ Guild leaderboard reset. Removing rank roles from {len(plan)} members in the background."
+    )
+    await start_role_sync(guild, plan, on_progress=report)
 
 # ---------- EVENTS ----------
 @client.event
 async def on_ready():
+    dispatcher.start()
     await init_db()
+    await fleet_locks.start([(LEADER_LOCK, 0)] + [(SHARD_LOCK, shard_id) for shard_id in client.shards])
+    fleet = fleet_locks.stats()
+    print(f"✅ Shards {fleet['shards_wanted']} of {client.shard_count}; "
+          f"owning {fleet['shards_owned']}{', fleet leader' if fleet['leader'] else ''}")
 
     await load_auto_messages_from_url()
 
-    channel = client.get_channel(AUTO_CHANNEL_ID)
-    if channel:
-        print(f"✅ Auto message channel found: #{channel.name}")
-    else:
-        print(f"❌ ERROR: Auto channel {AUTO_CHANNEL_ID} not found!")
-
-    report_channel = client.get_channel(REPORT_CHANNEL_ID)
-    if report_channel:
-        print(f"✅ Report channel found: #{report_channel.name}")
-    else:
-        print(f"❌ ERROR: Report channel {REPORT_CHANNEL_ID} not found!")
-
     try:
         if not hasattr(client, 'commands_synced'):
             await tree.sync()
@@ -1063,23 +1849,93 @@ async def on_ready():
     except Exception as e:
         print(f"⚠️ Sync error: {e}")
 
-    client.loop.create_task(status_loop())
-    client.loop.create_task(counter_updater())
-    client.loop.create_task(auto_message_task())
-    schedule_daily_reset()
-    schedule_user_cleanup()
+    track_task("status_loop", status_loop())
+    for guild in client.guilds:
+        try:
+            await refresh_counters(guild)
+        except Exception as e:
+            print(f"⚠️ Counter refresh failed for {guild.id}: {e}")
+    track_task("auto_message_task", auto_message_task())
+    try:
+        await resume_role_syncs()
+    except Exception as e:
+        print(f"⚠️ Could not resume role sync: {e}")
+    schedule_jobs()
+
+@client.event
+async def on_guild_role_create(role):
+    rank_roles.invalidate(role.guild.id)
+    bypass_roles.invalidate(role.guild.id)
+
+@client.event
+async def on_guild_role_delete(role):
+    rank_roles.invalidate(role.guild.id)
+    bypass_roles.invalidate(role.guild.id)
+
+@client.event
+async def on_guild_role_update(before, after):
+    if before.name != after.name:
+        rank_roles.invalidate(after.guild.id)
+        bypass_roles.invalidate(after.guild.id)
+
+@client.event
+async def on_guild_channel_create(channel):
+    kind = channel_kind(channel)
+    index = channel_indexes.get((channel.guild.id, kind))
+    if index is not None:
+        index.add(channel.id, channel.name, channel.position)
+
+@client.event
+async def on_guild_channel_update(before, after):
+    kind = channel_kind(after)
+    index = channel_indexes.get((after.guild.id, kind))
+    if index is not None and (before.name != after.name or before.position != after.position):
+        index.add(after.id, after.name, after.position)
+
+@client.event
+async def on_guild_channel_delete(channel):
+    index = channel_indexes.get((channel.guild.id, channel_kind(channel)))
+    if index is not None:
+        index.remove(channel.id)
+    try:
+        if channel.id in await get_counter_channels(channel.guild.id):
+            await delete_counter_channel(channel.guild.id, channel.id)
+    except Exception as e:
+        print(f"⚠️ Error removing counter channel {channel.id}: {e}")
+
+@client.event
+async def on_guild_join(guild):
+    if scheduler.running:
+        schedule_guild_reset(guild.id)
+
+@client.event
+async def on_guild_remove(guild):
+    if scheduler.running:
+        unschedule_guild_reset(guild.id)
+    try:
+        async with db_pool.acquire() as conn:
+            await conn.execute("DELETE FROM fleet_guilds WHERE guild_id=$1", guild.id)
+    except Exception as e:
+        print(f"⚠️ Could not drop fleet entry for {guild.id}: {e}")
 
 @client.event
 async def on_member_join(member):
-    last_joined_member[member.guild.id] = member.name
+    if not owns_events(member.guild):
+        return
+    state_store.set("last_joined_member", member.guild.id, 0, member.name)
+    leave_buffer.cancel(member.guild.id, member.id)
+    await refresh_counters(member.guild)
 
 @client.event
 async def on_member_remove(member):
+    if not owns_events(member.guild):
+        return
     try:
-        await reset_user_all(member.guild.id, member.id)
-        print(f"✅ Removed {member.name} from database (left server)")
+        await refresh_counters(member.guild)
     except Exception as e:
-        print(f"⚠️ Error removing {member.name} from database: {e}")
+        print(f"⚠️ Counter refresh failed for {member.guild.id}: {e}")
+    # Deleted with the next batch; see leave_buffer
+    leave_buffer.add(member.guild.id, [member.id])
 
 # ---------- RUN ----------
 if __name__ == "__main__":
@@ -1087,6 +1943,8 @@ if __name__ == "__main__":
         raise RuntimeError("DISCORD_TOKEN missing — set it in Railway variables.")
     if not DATABASE_URL:
         raise RuntimeError("DATABASE_URL missing — add PostgreSQL database in Railway.")
+    if SHARD_IDS and not SHARD_COUNT:
+        raise RuntimeError("SHARD_IDS needs SHARD_COUNT (the total number of shards across all processes).")
 
     try:
         client.run(TOKEN)
@@ -0,0 +1,248 @@
+# ---------- Image rank / leaderboard cards ----------
+# Rendering runs in a process pool so Pillow never blocks the gateway loop.
+# Each worker loads bg.png and the Montserrat fonts once in its initializer;
+# finished PNGs are kept in an LRU keyed by everything drawn on the card.
+import asyncio
+import io
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+
+RANK_CARD_SIZE = (934, 282)
+BOARD_WIDTH = 800
+BOARD_HEADER = 110
+BOARD_ROW = 52
+FONT_FILES = {
+    "bold": "Montserrat-Bold.ttf",
+    "regular": "Montserrat-Regular.ttf",
+    "light": "Montserrat-Light.ttf",
+}
+FONT_SIZES = (18, 22, 26, 32, 40, 48)
+
+# Per-worker assets, filled by load_assets()
+_ASSETS = {}
+
+
+def load_assets(base_dir: str):
+    bg = Image.open(os.path.join(base_dir, "assets", "bg.png")).convert("RGBA")
+    _ASSETS["bg"] = bg
+    _ASSETS["covers"] = {RANK_CARD_SIZE: _cover(bg, RANK_CARD_SIZE)}
+    _ASSETS["fonts"] = {
+        (style, size): ImageFont.truetype(os.path.join(base_dir, "fonts", name), size)
+        for style, name in FONT_FILES.items()
+        for size in FONT_SIZES
+    }
+
+
+def _cover(img, size):
+    # Scale to fill size, then centre-crop
+    w, h = size
+    scale = max(w / img.width, h / img.height)
+    resized = img.resize((max(w, int(img.width * scale)), max(h, int(img.height * scale))), Image.LANCZOS)
+    left = (resized.width - w) // 2
+    top = (resized.height - h) // 2
+    return resized.crop((left, top, left + w, top + h))
+
+
+def _background(size):
+    # Leaderboard heights vary with row count; keep one scaled copy per size
+    cover = _ASSETS["covers"].get(size)
+    if cover is None:
+        cover = _ASSETS["covers"][size] = _cover(_ASSETS["bg"], size)
+    return cover.copy()
+
+
+def _font(style: str, size: int):
+    return _ASSETS["fonts"][(style, size)]
+
+
+def _fit(draw, text: str, style: str, size: int, max_width: int):
+    font = _font(style, size)
+    if draw.textlength(text, font=font) <= max_width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > max_width:
+        text = text[:-1]
+    return text + "…"
+
+
+def _rgb(color: int):
+    return (color >> 16) & 255, (color >> 8) & 255, color & 255
+
+
+def _png(img) -> bytes:
+    buf = io.BytesIO()
+    # PNG encoding dominates render time; zlib level 1 roughly triples throughput
+    img.convert("RGB").save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+def render_rank_card(data: dict, avatar: bytes = None) -> bytes:
+    # data: name, rank, level, total_xp, daily_xp, xp_progress, xp_needed, color
+    if not _ASSETS:
+        load_assets(os.path.dirname(os.path.abspath(__file__)))
+    w, h = RANK_CARD_SIZE
+    card = _background(RANK_CARD_SIZE)
+    shade = Image.new("RGBA", card.size, (0, 0, 0, 0))
+    ImageDraw.Draw(shade).rounded_rectangle((20, 20, w - 20, h - 20), radius=24, fill=(0, 0, 0, 170))
+    card.alpha_composite(shade)
+    draw = ImageDraw.Draw(card)
+    accent = _rgb(data.get("color", 0xE02424))
+
+    size = 190
+    ax, ay = 46, (h - size) // 2
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size, size), fill=255)
+    if avatar:
+        try:
+            av = _cover(Image.open(io.BytesIO(avatar)).convert("RGBA"), (size, size))
+        except Exception:
+            av = None
+    else:
+        av = None
+    if av is None:
+        av = Image.new("RGBA", (size, size), (60, 60, 60, 255))
+    card.paste(av, (ax, ay), mask)
+    draw.ellipse((ax - 4, ay - 4, ax + size + 4, ay + size + 4), outline=accent, width=5)
+
+    x = ax + size + 36
+    right = w - 50
+    rank_text = f"RANK {data['rank']}" if data.get("rank") else "NO RANK"
+    level_text = f"LEVEL {data['level']}"
+    level_w = draw.textlength(level_text, font=_font("bold", 40))
+    draw.text((right - level_w, 46), level_text, font=_font("bold", 40), fill=accent)
+    rank_w = draw.textlength(rank_text, font=_font("regular", 26))
+    draw.text((right - rank_w, 96), rank_text, font=_font("regular", 26), fill=(235, 235, 235))
+
+    name = _fit(draw, data["name"], "bold", 40, int(right - level_w - x - 30))
+    draw.text((x, 50), name, font=_font("bold", 40), fill=(255, 255, 255))
+    draw.text((x, 104), f"24h XP: {data['daily_xp']}", font=_font("light", 26), fill=(210, 210, 210))
+
+    progress, needed = data["xp_progress"], max(1, data["xp_needed"])
+    bar = (x, 180, right, 220)
+    draw.rounded_rectangle(bar, radius=20, fill=(45, 45, 45))
+    fill_w = int((bar[2] - bar[0]) * min(1.0, progress / needed))
+    if fill_w > 40:
+        draw.rounded_rectangle((bar[0], bar[1], bar[0] + fill_w, bar[3]), radius=20, fill=accent)
+    xp_text = f"{progress} / {needed} XP"
+    xp_w = draw.textlength(xp_text, font=_font("regular", 22))
+    draw.text((right - xp_w, 146), xp_text, font=_font("regular", 22), fill=(220, 220, 220))
+    draw.text((x, 146), f"Total {data['total_xp']} XP", font=_font("regular", 22), fill=(220, 220, 220))
+    return _png(card)
+
+
+def render_leaderboard_card(data: dict) -> bytes:
+    # data: title, subtitle, rows=[(position, name, rank, daily_xp, level, color)]
+    if not _ASSETS:
+        load_assets(os.path.dirname(os.path.abspath(__file__)))
+    rows = data["rows"]
+    h = BOARD_HEADER + BOARD_ROW * max(1, len(rows)) + 30
+    card = _background((BOARD_WIDTH, h))
+    shade = Image.new("RGBA", card.size, (0, 0, 0, 0))
+    sd = ImageDraw.Draw(shade)
+    sd.rounded_rectangle((16, 16, BOARD_WIDTH - 16, h - 16), radius=22, fill=(0, 0, 0, 200))
+    for i in range(0, len(rows), 2):
+        top = BOARD_HEADER + i * BOARD_ROW
+        sd.rectangle((30, top, BOARD_WIDTH - 30, top + BOARD_ROW), fill=(28, 28, 28, 200))
+    card.alpha_composite(shade)
+    draw = ImageDraw.Draw(card)
+
+    title = _fit(draw, data["title"], "bold", 32, BOARD_WIDTH - 80)
+    draw.text((40, 34), title, font=_font("bold", 32), fill=(255, 255, 255))
+    draw.text((40, 76), data.get("subtitle", ""), font=_font("light", 18), fill=(200, 200, 200))
+
+    if not rows:
+        draw.text((40, BOARD_HEADER + 12), "No activity yet.", font=_font("regular", 22), fill=(220, 220, 220))
+    for i, (position, name, rank, daily_xp, level, color) in enumerate(rows):
+        top = BOARD_HEADER + i * BOARD_ROW + 12
+        accent = _rgb(color)
+        draw.text((44, top), f"#{position}", font=_font("bold", 22), fill=accent)
+        draw.text((120, top), _fit(draw, name, "regular", 22, 330), font=_font("regular", 22), fill=(255, 255, 255))
+        draw.text((470, top), rank or "—", font=_font("bold", 22), fill=accent)
+        stats = f"{daily_xp} XP • Lv {level}"
+        stats_w = draw.textlength(stats, font=_font("regular", 22))
+        draw.text((BOARD_WIDTH - 44 - stats_w, top), stats, font=_font("regular", 22), fill=(230, 230, 230))
+    return _png(card)
+
+
+class CardRenderer:
+    def __init__(self, base_dir: str, workers: int = 2, cache_size: int = 512):
+        self.base_dir = base_dir
+        self.workers = workers
+        self.cache_size = cache_size
+        self._pool = None
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _executor(self):
+        if self._pool is None:
+            ctx = multiprocessing.get_context("fork") if hasattr(os, "fork") else None
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=ctx,
+                initializer=load_assets, initargs=(self.base_dir,)
+            )
+        return self._pool
+
+    def start(self):
+        # Fork the workers early, before the bot has started helper threads
+        pool = self._executor()
+        for _ in range(self.workers):
+            pool.submit(int)
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _remember(self, key, png: bytes):
+        self._cache[key] = png
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _render(self, key, fn, *args, prepare=None):
+        png = self._cache.get(key)
+        if png is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return png
+        # Identical requests in flight share one render. Shielded, so a waiter
+        # being cancelled doesn't cancel the render the others are waiting for
+        fut = self._inflight.get(key)
+        if fut is not None:
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            # The request that was rendering got cancelled; render it here instead
+            return await self._render(key, fn, *args, prepare=prepare)
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        fut = self._inflight[key] = loop.create_future()
+        try:
+            if prepare is not None:
+                args = args + (await prepare(),)
+            png = await loop.run_in_executor(self._executor(), fn, *args)
+            self._remember(key, png)
+            fut.set_result(png)
+            return png
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._inflight[key]
+            if not fut.done():
+                fut.cancel()  # this render was cancelled; wakes the waiters
+
+    async def rank_card(self, key, data: dict, fetch_avatar=None):
+        # fetch_avatar: async callable returning avatar bytes, only awaited on a cache miss
+        return await self._render(("rank",) + tuple(key), render_rank_card, data, prepare=fetch_avatar)
+
+    async def leaderboard_card(self, key, data: dict):
+        return await self._render(("board",) + tuple(key), render_leaderboard_card, data)
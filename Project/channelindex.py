@@ -0,0 +1,204 @@
+# ---------- Channel / category name index ----------
+# Names are normalized once when a channel is added, not on every keystroke.
+# Results are ranked by match quality (exact, prefix, word prefix, substring,
+# then close misses when a letter is wrong), then by the user's recent
+# channels, then by channel position. Each quality tier is read from an index
+# when it is small: sorted name and word lists for the prefix tiers, trigram
+# postings for substrings. A large tier is walked in result order instead and
+# stops once it has enough, so a common query like "ge" in a huge guild costs
+# about as much as the old first-15 substring scan.
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter
+from itertools import compress, repeat
+
+_SEPARATORS = re.compile(r"[\s\-_.|・•]+")
+FUZZY_MIN_SHARE = 0.6  # share of the query's trigrams a close miss must contain
+_LAST_CHAR = chr(0x10FFFF)
+
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+
+
+def split_name(name: str):
+    return [t for t in _SEPARATORS.split(name.casefold()) if t]
+
+
+def _trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _prefix_range(words, q: str):
+    # [lo, hi) of a sorted [(word, item_id)] list whose words start with q
+    return bisect_left(words, (q,)), bisect_left(words, (q + _LAST_CHAR,))
+
+
+class _Entry:
+    __slots__ = ("name", "position", "words", "compact")
+
+    def __init__(self, name: str, position: int):
+        self.name = name
+        self.position = position
+        self.words = split_name(name)
+        self.compact = "".join(self.words)
+
+
+class NameIndex:
+    def __init__(self):
+        self._entries = {}  # item_id -> _Entry
+        self._postings = {}  # trigram -> set(item_id)
+        self._prefixes = None  # (sorted [(name, item_id)], sorted [(word, item_id)]), rebuilt lazily after changes
+        self._order = None  # item_id -> place by position
+        self._ranked = []  # item_ids by position
+        self._ranked_names = []  # their normalized names, for walking a large tier
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item_id):
+        return item_id in self._entries
+
+    def add(self, item_id: int, name: str, position: int = 0):
+        # Also used for updates: renames replace the old entry
+        old = self._entries.get(item_id)
+        if old is not None:
+            if old.name == name:
+                if old.position != position:
+                    old.position = position
+                    self._order = None
+                return
+            self.remove(item_id)
+        entry = self._entries[item_id] = _Entry(name, position)
+        for tri in _trigrams(entry.compact):
+            self._postings.setdefault(tri, set()).add(item_id)
+        self._prefixes = None
+        self._order = None
+
+    def remove(self, item_id: int):
+        entry = self._entries.pop(item_id, None)
+        if entry is None:
+            return
+        for tri in _trigrams(entry.compact):
+            ids = self._postings.get(tri)
+            if ids:
+                ids.discard(item_id)
+                if not ids:
+                    del self._postings[tri]
+        self._prefixes = None
+        self._order = None
+
+    def _prefix_lists(self):
+        if self._prefixes is None:
+            names = sorted((entry.compact, item_id) for item_id, entry in self._entries.items())
+            words = sorted(
+                (w, item_id) for item_id, entry in self._entries.items() if len(entry.words) > 1 for w in entry.words
+            )
+            self._prefixes = names, words
+        return self._prefixes
+
+    def _ordering(self):
+        # item_id -> place by channel position, used as the tie-breaker
+        if self._order is None:
+            self._ranked = sorted(self._entries, key=lambda i: (self._entries[i].position, i))
+            self._ranked_names = [self._entries[i].compact for i in self._ranked]
+            self._order = {item_id: n for n, item_id in enumerate(self._ranked)}
+        return self._order
+
+    @staticmethod
+    def _quality(entry: _Entry, q: str):
+        if entry.compact == q:
+            return EXACT
+        if entry.compact.startswith(q):
+            return PREFIX
+        for w in entry.words:
+            if w.startswith(q):
+                return WORD_PREFIX
+        return SUBSTRING if q in entry.compact else None
+
+    def _tiers(self, q: str):
+        # (quality, candidate count, candidates) per tier; candidates may also
+        # hold items of a better tier, and the count is an upper bound
+        names, words = self._prefix_lists()
+        lo, hi = _prefix_range(names, q)
+        exact = lo
+        while exact < hi and names[exact][0] == q:
+            exact += 1
+        word_lo, word_hi = _prefix_range(words, q)
+        yield EXACT, exact - lo, lambda: (item_id for _, item_id in names[lo:exact])
+        yield PREFIX, hi - exact, lambda: (item_id for _, item_id in names[exact:hi])
+        yield WORD_PREFIX, word_hi - word_lo, lambda: (item_id for _, item_id in words[word_lo:word_hi])
+        if len(q) < 3:
+            yield SUBSTRING, len(self._entries), lambda: self._entries
+            return
+        smallest = min((self._postings.get(tri, ()) for tri in _trigrams(q)), key=len)
+        yield SUBSTRING, len(smallest), lambda: smallest
+
+    def _matches(self, q: str, limit: int, recency, key):
+        # Up to limit item_ids, by quality and then key. A tier with more than
+        # about sqrt(limit * n / 10) candidates is walked in key order instead
+        # of sorted; the walk tests names a slice at a time and stops after
+        # roughly limit * n / candidates of them
+        entries = self._entries
+        n = len(entries)
+        best = []
+        for quality, count, candidates in self._tiers(q):
+            need = limit - len(best)
+            if need <= 0:
+                break
+            if not count:
+                continue
+            if 10 * count * count <= need * n:
+                ids = {item_id for item_id in candidates() if self._quality(entries[item_id], q) == quality}
+                best.extend(heapq.nsmallest(need, ids, key=key))
+                continue
+            picked = [i for i in sorted(recency, key=recency.get) if self._quality(entries[i], q) == quality]
+            test = str.startswith if quality <= PREFIX else str.__contains__
+            start, step = 0, max(64, need * n // count * 5 // 4)
+            while len(picked) < need and start < n:
+                stop = start + step
+                hits = compress(self._ranked[start:stop], map(test, self._ranked_names[start:stop], repeat(q)))
+                picked.extend(i for i in hits if i not in recency and self._quality(entries[i], q) == quality)
+                start = stop
+            best.extend(picked[:need])
+        return best
+
+    def _close_misses(self, q: str, found):
+        # Names sharing most of the query's trigrams, e.g. one letter wrong
+        tris = _trigrams(q)
+        counts = Counter()
+        for tri in tris:
+            ids = self._postings.get(tri)
+            if ids:
+                counts.update(ids)
+        need = max(1, round(len(tris) * FUZZY_MIN_SHARE))
+        return {
+            item_id: FUZZY + 1 - hits / len(tris)
+            for item_id, hits in counts.items()
+            if hits >= need and item_id not in found
+        }
+
+    def search(self, query: str, limit: int = 15, recent=()):
+        # [(item_id, name, is_recent)], best first and without duplicates
+        q = "".join(split_name(query))
+        order = self._ordering()
+        recency = {item_id: n - len(recent) for n, item_id in enumerate(recent) if item_id in order}
+        entries = self._entries
+        if not q:
+            best = sorted(recency, key=recency.get)[:limit]
+            for item_id in self._ranked:
+                if len(best) >= limit:
+                    break
+                if item_id not in recency:
+                    best.append(item_id)
+            return [(item_id, entries[item_id].name, item_id in recency) for item_id in best]
+
+        # Within a tier: recent channels first (most recent first), then by position
+        def key(item_id):
+            return recency.get(item_id, order[item_id])
+
+        best = self._matches(q, limit, recency, key)
+        if len(best) < limit and len(q) >= 3:
+            # Every tier came up short, so best holds every match
+            misses = self._close_misses(q, set(best))
+            best.extend(heapq.nsmallest(limit - len(best), misses, key=lambda item_id: (misses[item_id], key(item_id))))
+        return [(item_id, entries[item_id].name, item_id in recency) for item_id in best]
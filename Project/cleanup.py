@@ -0,0 +1,108 @@
+# ---------- Left-user cleanup ----------
+# Member leaves are buffered and deleted per guild with one ANY($2::bigint[])
+# statement per table, so a raid or mass kick costs a handful of queries.
+# The periodic reconciliation walks users in small keyset-paginated chunks
+# and sleeps between chunks instead of diffing whole guilds at once.
+import asyncio
+
+from flushloop import FlushLoop
+
+DELETE_USERS_SQL = "DELETE FROM users WHERE guild_id=$1 AND user_id = ANY($2::bigint[])"
+DELETE_RANKS_SQL = "DELETE FROM manual_ranks WHERE guild_id=$1 AND user_id = ANY($2::bigint[])"
+
+
+class LeaveBuffer:
+    def __init__(self, flush_interval: float = 2.0, flush_batch: int = 200, on_removed=None):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.on_removed = on_removed  # async (guild_id, user_ids) -> None, runs before the delete
+        self.pool = None
+        self._pending = {}  # guild_id -> set(user_id)
+        self._count = 0
+        self._lock = asyncio.Lock()
+        self._loop = FlushLoop(self.flush, flush_interval)
+        self.removed = 0
+        self.failed_flushes = 0
+
+    def start(self, pool):
+        self.pool = pool
+        self._loop.start()
+
+    async def stop(self):
+        await self._loop.stop()
+
+    def __len__(self):
+        return self._count
+
+    def add(self, guild_id: int, user_ids):
+        pending = self._pending.setdefault(guild_id, set())
+        before = len(pending)
+        pending.update(user_ids)
+        self._count += len(pending) - before
+        if self._count >= self.flush_batch:
+            self._loop.wake()
+
+    def cancel(self, guild_id: int, user_id: int):
+        # Rejoined before the flush: keep their data
+        pending = self._pending.get(guild_id)
+        if pending and user_id in pending:
+            pending.discard(user_id)
+            self._count -= 1
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending or self.pool is None:
+                return 0
+            batch, self._pending, self._count = self._pending, {}, 0
+            removed = 0
+            try:
+                for guild_id in list(batch):
+                    ids = list(batch[guild_id])
+                    if ids:
+                        try:
+                            if self.on_removed:
+                                await self.on_removed(guild_id, ids)
+                            async with self.pool.acquire() as conn:
+                                async with conn.transaction():
+                                    await conn.execute(DELETE_USERS_SQL, guild_id, ids)
+                                    await conn.execute(DELETE_RANKS_SQL, guild_id, ids)
+                            removed += len(ids)
+                        except Exception as e:
+                            self.failed_flushes += 1
+                            self.add(guild_id, ids)
+                            print(f"⚠️ Left-user delete failed for guild {guild_id} ({len(ids)} kept for retry): {e}")
+                    del batch[guild_id]
+            except BaseException:
+                # Cancelled mid-flush: guilds not deleted yet go back for the next flush
+                for guild_id, user_ids in batch.items():
+                    self.add(guild_id, user_ids)
+                raise
+            finally:
+                self.removed += removed
+            return removed
+
+
+async def sweep_left_users(pool, guild, leaves: LeaveBuffer, chunk_size: int = 500, pause: float = 0.5):
+    # Keyset pagination over (guild_id, user_id); each chunk is one indexed range
+    # scan and a dict lookup per row against the gateway member cache.
+    if not guild.chunked:
+        return 0  # member list incomplete; absent members are not necessarily gone
+    found = 0
+    last_id = 0
+    while True:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT user_id FROM users WHERE guild_id=$1 AND user_id > $2 ORDER BY user_id LIMIT $3",
+                guild.id, last_id, chunk_size
+            )
+        if not rows:
+            break
+        last_id = rows[-1]['user_id']
+        gone = [row['user_id'] for row in rows if guild.get_member(row['user_id']) is None]
+        if gone:
+            leaves.add(guild.id, gone)
+            found += len(gone)
+        if len(rows) < chunk_size:
+            break
+        await asyncio.sleep(pause)
+    return found
@@ -0,0 +1,70 @@
+# ---------- Debounced counter channel renames ----------
+# Discord allows about two renames per channel per 10 minutes. Join / leave
+# events only record the wanted name; each channel gets one timer that fires
+# when its rename window opens (after a short settle delay), and only the
+# latest name is applied.
+import asyncio
+from collections import deque
+
+
+class CounterScheduler:
+    def __init__(self, apply, renames: int = 2, window: float = 600.0, settle: float = 5.0):
+        self.apply = apply  # (channel, name) -> None, performs / queues the rename
+        self.renames = renames
+        self.window = window
+        self.settle = settle
+        self._history = {}  # channel_id -> deque of rename times
+        self._pending = {}  # channel_id -> (channel, name)
+        self._timers = {}   # channel_id -> TimerHandle
+        self.requested = 0
+        self.applied = 0
+        self.skipped = 0
+
+    def request(self, channel, name: str):
+        self.requested += 1
+        if channel.name == name and channel.id not in self._pending:
+            return
+        self._pending[channel.id] = (channel, name)
+        if channel.id in self._timers:
+            return  # already scheduled; the latest name wins when it fires
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        delay = max(self.settle, self._next_slot(channel.id, now) - now)
+        self._timers[channel.id] = loop.call_later(delay, self._fire, channel.id)
+
+    def _next_slot(self, channel_id: int, now: float) -> float:
+        history = self._history.get(channel_id)
+        if not history or len(history) < self.renames:
+            return now
+        return history[0] + self.window
+
+    def _fire(self, channel_id: int):
+        self._timers.pop(channel_id, None)
+        item = self._pending.pop(channel_id, None)
+        if not item:
+            return
+        channel, name = item
+        if channel.name == name:
+            self.skipped += 1
+            return
+        history = self._history.get(channel_id)
+        if history is None:
+            history = self._history[channel_id] = deque(maxlen=self.renames)
+        history.append(asyncio.get_running_loop().time())
+        self.applied += 1
+        self.apply(channel, name)
+
+    def cancel(self, channel_id: int):
+        timer = self._timers.pop(channel_id, None)
+        if timer:
+            timer.cancel()
+        self._pending.pop(channel_id, None)
+        self._history.pop(channel_id, None)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "requested": self.requested,
+            "applied": self.applied,
+            "skipped": self.skipped,
+        }
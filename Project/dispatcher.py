@@ -0,0 +1,190 @@
+# ---------- Outbound REST dispatcher ----------
+# Handlers queue their sends / deletes / edits here and return straight away.
+# Actions run by priority, each route (kind, channel_id) has its own token
+# bucket, and actions sharing a coalesce_key collapse into the latest one.
+# stop() lets moderation actions already queued go out before the workers end.
+import asyncio
+import heapq
+import itertools
+from collections import Counter
+
+from ratelimit import TokenBucket
+
+MODERATION = 0    # message deletes, member timeouts
+WARNING = 1       # moderation warnings to the offender
+NOTIFICATION = 2  # level / rank embeds, report logs, replies
+COSMETIC = 3      # counter renames, auto messages
+PRIORITY_NAMES = {MODERATION: "moderation", WARNING: "warning", NOTIFICATION: "notification", COSMETIC: "cosmetic"}
+
+# kind -> (burst, per seconds)
+DEFAULT_ROUTE_LIMITS = {
+    "delete": (5, 1.0),
+    "send": (5, 5.0),
+    "edit": (5, 5.0),
+    "timeout": (5, 5.0),  # member timeouts, routed per guild
+    "rename": (2, 600.0),  # Discord allows ~2 channel renames per 10 minutes
+    "invite": (5, 10.0),  # inline invite lookups from on_message (see try_take)
+}
+
+
+class OutboundAction:
+    __slots__ = ("priority", "seq", "route", "factory", "coalesce_key", "future", "reserved")
+
+    def __init__(self, priority, seq, route, factory, coalesce_key, future):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.factory = factory
+        self.coalesce_key = coalesce_key
+        self.future = future
+        self.reserved = False  # already holds its route token (parked until it is usable)
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Dispatcher:
+    def __init__(self, workers: int = 4, max_queue: int = 5000, route_limits: dict = None, observe=None):
+        self.workers = workers
+        self.observe = observe  # optional (kind, seconds, ok) -> None, called after each REST call
+        self.max_queue = max_queue
+        self.route_limits = dict(DEFAULT_ROUTE_LIMITS, **(route_limits or {}))
+        self._heap = []
+        self._seq = itertools.count()
+        self._buckets = {}
+        self._coalesce = {}
+        self._waiting = 0  # actions parked until their route has a token
+        self._unfinished = Counter()  # priority -> actions queued, parked or running
+        self._wake = None
+        self._tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def drain(self, max_priority: int = COSMETIC):
+        # Wait until no action at max_priority or more urgent is left
+        while self._tasks and any(n for p, n in self._unfinished.items() if p <= max_priority):
+            await asyncio.sleep(0.05)
+
+    async def stop(self, timeout: float = 10.0):
+        # Queued moderation actions still go out (up to timeout); anything less urgent may be dropped
+        try:
+            await asyncio.wait_for(self.drain(MODERATION), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Dispatcher stopped with {self._unfinished[MODERATION]} moderation actions unsent")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, priority: int, route, factory, coalesce_key=None):
+        # factory: zero-arg callable returning the coroutine to run (e.g. lambda: ch.send(...))
+        loop = asyncio.get_running_loop()
+        if coalesce_key is not None:
+            queued = self._coalesce.get(coalesce_key)
+            if queued is not None:
+                queued.factory = factory
+                self.coalesced += 1
+                return queued.future
+        if len(self._heap) + self._waiting >= self.max_queue and priority >= COSMETIC:
+            self.dropped += 1
+            future = loop.create_future()
+            future.set_result(None)
+            return future
+
+        action = OutboundAction(priority, next(self._seq), route, factory, coalesce_key, loop.create_future())
+        if coalesce_key is not None:
+            self._coalesce[coalesce_key] = action
+        self._unfinished[priority] += 1
+        self._push(action)
+        return action.future
+
+    def try_take(self, route) -> bool:
+        # For REST calls made inline that can't queue: a token of route's bucket now, or no call
+        return self._bucket(route).take() == 0.0
+
+    def _push(self, action):
+        heapq.heappush(self._heap, action)
+        if self._wake:
+            self._wake.set()
+
+    def _requeue(self, action):
+        self._waiting -= 1
+        self._push(action)
+
+    def _bucket(self, route):
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            burst, per = self.route_limits.get(route[0], (5, 5.0))
+            bucket = self._buckets[route] = TokenBucket(burst, per)
+        return bucket
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            action = heapq.heappop(self._heap)
+            if not action.reserved:
+                # The token is reserved even when it isn't there yet, so actions parked
+                # on one route wake one refill apart instead of all at once
+                delay = self._bucket(action.route).reserve()
+                if delay > 0:
+                    # Park it; other routes keep flowing meanwhile
+                    action.reserved = True
+                    self._waiting += 1
+                    loop.call_later(delay, self._requeue, action)
+                    continue
+            if action.coalesce_key is not None and self._coalesce.get(action.coalesce_key) is action:
+                del self._coalesce[action.coalesce_key]
+            started = loop.time()
+            try:
+                result = await action.factory()
+                self.sent += 1
+                if self.observe:
+                    self.observe(action.route[0], loop.time() - started, True)
+                if not action.future.done():
+                    action.future.set_result(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                if self.observe:
+                    self.observe(action.route[0], loop.time() - started, False)
+                if getattr(e, "status", None) == 429:
+                    self.rate_limited += 1
+                if not action.future.done():
+                    action.future.set_result(None)
+                if getattr(e, "status", None) not in (403, 404):
+                    print(f"⚠️ Outbound {action.route[0]} failed ({PRIORITY_NAMES.get(action.priority)}): {e}")
+            finally:
+                self._unfinished[action.priority] -= 1
+
+    def depth(self):
+        counts = {name: 0 for name in PRIORITY_NAMES.values()}
+        for action in self._heap:
+            name = PRIORITY_NAMES.get(action.priority, "other")
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def stats(self):
+        return {
+            "queued": len(self._heap),
+            "waiting_for_route": self._waiting,
+            "by_priority": self.depth(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
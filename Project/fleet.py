@@ -0,0 +1,134 @@
+# ---------- Sharding / multi-process coordination ----------
+# Discord sends every guild's events to exactly one shard, and each process
+# runs its own range of shards, so per-guild state (member cache, leaderboards,
+# XP buffer, state store) stays process-local without conflicts. What has to
+# be agreed across the fleet goes through Postgres session advisory locks,
+# held on one dedicated connection: one lock per shard decides which process
+# runs that shard's scheduled jobs (even if two deploys briefly overlap), and
+# one "leader" lock covers the jobs that aren't tied to a guild. If a process
+# dies its connection closes, the locks are released, and a standby takes
+# them on its next retry. A lock only counts as held once on_acquired has
+# run for it (the bot reloads that shard's caches there), and a failed check
+# only gives the locks up once the connection is actually closed.
+import asyncio
+import zlib
+
+import asyncpg
+
+LEADER_LOCK = "leader"
+SHARD_LOCK = "shard"
+
+
+def parse_shard_ids(spec: str):
+    # "0-3,8" -> [0, 1, 2, 3, 8]; empty -> None (run every shard)
+    ids = set()
+    for part in (p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        ids.update(range(int(first), int(last or first) + 1))
+    return sorted(ids) or None
+
+
+def lock_key(name: str) -> int:
+    # Stable signed 32-bit key (hash() is salted per process)
+    return zlib.crc32(f"discord-bot:{name}".encode()) - 2 ** 31
+
+
+class FleetLocks:
+    def __init__(self, dsn: str, retry_interval: float = 15.0, max_failures: int = 3, on_acquired=None):
+        self.dsn = dsn
+        self.retry_interval = retry_interval
+        self.max_failures = max_failures  # failed checks in a row before the connection is dropped
+        self.on_acquired = on_acquired  # async (name, scope) -> None
+        self._conn = None
+        self._wanted = set()  # (name, scope)
+        self._held = set()
+        self._failures = 0
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.acquired = 0
+        self.lost = 0
+
+    async def start(self, wanted):
+        # Takes whatever locks are free right away, then keeps retrying the rest
+        self._wanted.update(wanted)
+        await self._attempt()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._conn.close()  # releases every session lock
+            self._conn = None
+        self._held.clear()
+
+    def held(self, name: str, scope: int = 0) -> bool:
+        return (name, scope) in self._held
+
+    def is_leader(self) -> bool:
+        return self.held(LEADER_LOCK)
+
+    def owns_shard(self, shard_id) -> bool:
+        return self.held(SHARD_LOCK, shard_id or 0)
+
+    async def _attempt(self):
+        async with self._lock:
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._drop_held()
+                    self._conn = await asyncpg.connect(self.dsn)
+                else:
+                    await self._conn.fetchval("SELECT 1", timeout=self.retry_interval)
+                self._failures = 0
+                for name, scope in sorted(self._wanted - self._held):
+                    if await self._conn.fetchval("SELECT pg_try_advisory_lock($1, $2)", lock_key(name), scope):
+                        await self._acquired(name, scope)
+            except Exception as e:
+                # Session locks last as long as the connection, so a slow or failed
+                # check alone doesn't lose them; only give up on a closed connection
+                self._failures += 1
+                print(f"⚠️ Fleet lock check failed ({self._failures} in a row): {e}")
+                if self._conn is not None and not self._conn.is_closed() and self._failures >= self.max_failures:
+                    self._conn.terminate()
+                if self._conn is not None and self._conn.is_closed():
+                    self._conn = None
+                    self._drop_held()
+
+    async def _acquired(self, name: str, scope: int):
+        if self.on_acquired is not None:
+            try:
+                await self.on_acquired(name, scope)
+            except Exception as e:
+                print(f"⚠️ Fleet lock {name}:{scope} setup failed, releasing it for a retry: {e}")
+                await self._conn.fetchval("SELECT pg_advisory_unlock($1, $2)", lock_key(name), scope)
+                return
+        self._held.add((name, scope))
+        self.acquired += 1
+
+    def _drop_held(self):
+        if self._held:
+            self.lost += len(self._held)
+            print(f"⚠️ Lost {len(self._held)} fleet locks with the lock connection")
+        self._held.clear()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            await self._attempt()
+
+    def stats(self):
+        return {
+            "leader": self.is_leader(),
+            "shards_owned": sorted(scope for name, scope in self._held if name == SHARD_LOCK),
+            "shards_wanted": sorted(scope for name, scope in self._wanted if name == SHARD_LOCK),
+            "acquired": self.acquired,
+            "lost": self.lost,
+        }
@@ -0,0 +1,72 @@
+# ---------- Flood / spam detection ----------
+# Message rates are counted in sliding-window count-min sketches: the window
+# is split into a few time slots, each a fixed depth x width table of
+# counters. Memory is the same with ten active users or ten thousand, and a
+# check is depth x slots counter reads. Collisions can only over-count, so
+# widths are sized to keep that rare at realistic traffic.
+from array import array
+import time
+
+
+class SlidingSketch:
+    def __init__(self, window: float, slots: int = 5, width: int = 4096, depth: int = 4):
+        self.slot_seconds = window / slots
+        self.slots = slots
+        self.width = width
+        self.depth = depth
+        self._tables = [array("I", bytes(4 * width * depth)) for _ in range(slots)]
+        self._current = 0  # absolute slot number of the newest table
+
+    def _advance(self, now: float):
+        slot = int(now / self.slot_seconds)
+        gap = slot - self._current
+        if gap <= 0:
+            return
+        # Zero the tables that fell out of the window
+        empty = bytes(4 * self.width * self.depth)
+        for s in range(self._current + 1, self._current + 1 + min(gap, self.slots)):
+            self._tables[s % self.slots] = array("I", empty)
+        self._current = slot
+
+    def _cells(self, key):
+        width = self.width
+        return [row * width + hash((key, row)) % width for row in range(self.depth)]
+
+    def add(self, key, now: float = None):
+        # Count one event for key; returns (estimate before, estimate after)
+        self._advance(time.monotonic() if now is None else now)
+        cells = self._cells(key)
+        before = min(sum(t[c] for t in self._tables) for c in cells)
+        table = self._tables[self._current % self.slots]
+        for c in cells:
+            table[c] += 1
+        return before, before + 1
+
+
+USER_FLOOD, CHANNEL_FLOOD = "user", "channel"
+
+
+class FloodDetector:
+    def __init__(self, user_limit: int = 6, user_window: float = 5.0,
+                 channel_limit: int = 25, channel_window: float = 5.0,
+                 width: int = 4096, depth: int = 4):
+        self.user_limit = user_limit
+        self.channel_limit = channel_limit
+        self._users = SlidingSketch(user_window, width=width, depth=depth)
+        self._channels = SlidingSketch(channel_window, width=max(64, width // 4), depth=depth)
+        self.user_floods = 0
+        self.channel_floods = 0
+
+    def check(self, guild_id: int, channel_id: int, user_id: int, now: float = None):
+        # (kind, first) where kind is USER_FLOOD / CHANNEL_FLOOD / None and first
+        # is True only for the message that crossed the limit (act once, then delete)
+        now = time.monotonic() if now is None else now
+        before, after = self._users.add((guild_id, user_id), now)
+        if after > self.user_limit:
+            self.user_floods += 1
+            return USER_FLOOD, before <= self.user_limit
+        before, after = self._channels.add(channel_id, now)
+        if after > self.channel_limit:
+            self.channel_floods += 1
+            return CHANNEL_FLOOD, before <= self.channel_limit
+        return None, False
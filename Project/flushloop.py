@@ -0,0 +1,41 @@
+# ---------- Write-behind flush loop ----------
+# The background loop shared by the write-behind buffers (XP, runtime state,
+# left users): flush every interval seconds, or sooner when woken. stop()
+# never cancels a flush in progress, since that flush has already taken its
+# batch out of the buffer; it lets it finish and then flushes once more.
+# Each buffer's flush still puts its batch back if it is cancelled anyway.
+import asyncio
+
+
+class FlushLoop:
+    def __init__(self, flush, interval: float):
+        self.flush = flush  # async () -> int
+        self.interval = interval
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._stopping.clear()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        self._wake.set()
+
+    async def stop(self):
+        if self._task:
+            self._stopping.set()
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
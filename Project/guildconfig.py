@@ -0,0 +1,196 @@
+# ---------- Per-guild configuration ----------
+# Each configured guild has one guild_config row, and NULL columns fall back to
+# the defaults from bot.py. Every row is loaded into an immutable GuildConfig
+# at startup, so the message path reads settings as plain attributes.
+# An update writes the row and NOTIFYs in the same transaction. Every process
+# LISTENs on a dedicated connection and reloads just that guild when the
+# notification arrives. If the listen connection drops, the whole table is
+# reloaded, because notifications sent meanwhile are lost.
+import asyncio
+import json
+import re
+from typing import NamedTuple
+
+import asyncpg
+import pytz
+
+NOTIFY_CHANNEL = "guild_config"
+CHANNEL_SETTINGS = ("auto_channel_id", "notification_channel_id", "report_channel_id", "xp_channel_id")
+SETTINGS = CHANNEL_SETTINGS + ("bypass_role", "ranks", "timezone")
+
+
+class GuildConfig(NamedTuple):
+    auto_channel_id: int
+    notification_channel_id: int
+    report_channel_id: int
+    xp_channel_id: int
+    bypass_role: str
+    ranks: tuple  # ((rank_name, min_daily_xp), ...), highest first
+    timezone: str
+
+    @property
+    def rank_order(self):
+        return [name for name, _ in self.ranks]
+
+
+def parse_ranks(text: str) -> tuple:
+    # "S+:500, A:400, B:300" -> (("S+", 500), ("A", 400), ("B", 300))
+    ranks = []
+    for part in (p.strip() for p in text.split(",")):
+        if not part:
+            continue
+        name, sep, thresh = part.rpartition(":")
+        if not sep or not name.strip() or not thresh.strip().isdigit():
+            raise ValueError(f"'{part}' is not name:xp")
+        ranks.append((name.strip(), int(thresh)))
+    if not ranks:
+        raise ValueError("give at least one rank")
+    if len({name for name, _ in ranks}) != len(ranks):
+        raise ValueError("rank names must be unique")
+    return tuple(sorted(ranks, key=lambda r: -r[1]))
+
+
+def format_ranks(ranks) -> str:
+    return ", ".join(f"{name}:{thresh}" for name, thresh in ranks)
+
+
+def parse_setting(name: str, value: str):
+    # Admin input -> stored value; raises ValueError with a message for the admin
+    value = value.strip()
+    if name in CHANNEL_SETTINGS:
+        if value.lower() in ("0", "off", "none"):
+            return 0
+        match = re.fullmatch(r"<#(\d+)>|(\d+)", value)
+        if not match:
+            raise ValueError("give a channel mention or ID (or off)")
+        return int(match.group(1) or match.group(2))
+    if name == "bypass_role":
+        if not value:
+            raise ValueError("give a role name")
+        return value.lstrip("@")
+    if name == "ranks":
+        return parse_ranks(value)
+    if name == "timezone":
+        try:
+            return pytz.timezone(value).zone
+        except pytz.UnknownTimeZoneError:
+            raise ValueError(f"unknown timezone {value}, e.g. Asia/Karachi or UTC")
+    raise ValueError(f"unknown setting {name}")
+
+
+class GuildConfigStore:
+    def __init__(self, defaults: GuildConfig, on_change=None, check_interval: float = 30.0):
+        self.defaults = defaults
+        self.on_change = on_change  # optional (guild_id) -> None, after a guild's config changed
+        self.check_interval = check_interval
+        self.pool = None
+        self.dsn = None
+        self._configs = {}  # guild_id -> GuildConfig, only for guilds with a row
+        self._conn = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._configs)
+
+    def get(self, guild_id: int) -> GuildConfig:
+        return self._configs.get(guild_id, self.defaults)
+
+    def _build(self, row) -> GuildConfig:
+        values = {name: row[name] for name in SETTINGS if row[name] is not None}
+        if "ranks" in values:
+            values["ranks"] = tuple((name, thresh) for name, thresh in json.loads(values["ranks"]))
+        return self.defaults._replace(**values)
+
+    def _apply(self, guild_id: int, config):
+        old = self._configs.get(guild_id, self.defaults)
+        if config is None:
+            self._configs.pop(guild_id, None)
+        else:
+            self._configs[guild_id] = config
+        if self.on_change and (config or self.defaults) != old:
+            self.on_change(guild_id)
+
+    async def start(self, pool, dsn: str):
+        if self._conn is not None and not self._conn.is_closed():
+            return  # already listening; on_ready runs again after every gateway reconnect
+        self.pool = pool
+        self.dsn = dsn
+        await self.reload_all()
+        await self._listen()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def reload_all(self):
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT * FROM guild_config")
+        fresh = {row['guild_id']: self._build(row) for row in rows}
+        for guild_id in set(self._configs) | set(fresh):
+            self._apply(guild_id, fresh.get(guild_id))
+        return len(fresh)
+
+    async def reload(self, guild_id: int):
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM guild_config WHERE guild_id=$1", guild_id)
+        self._apply(guild_id, self._build(row) if row else None)
+
+    async def update(self, guild_id: int, **changes) -> GuildConfig:
+        # changes: setting -> value, or None to go back to the default
+        names = [name for name in SETTINGS if name in changes]
+        values = [json.dumps(changes[n]) if n == "ranks" and changes[n] is not None else changes[n] for n in names]
+        columns = ", ".join(names)
+        params = ", ".join(f"${i}" for i in range(2, len(names) + 2))
+        updates = ", ".join(f"{n} = EXCLUDED.{n}" for n in names)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(f"""
+                    INSERT INTO guild_config (guild_id, {columns}) VALUES ($1, {params})
+                    ON CONFLICT (guild_id) DO UPDATE SET {updates}, updated_at = NOW()
+                """, guild_id, *values)
+                # Delivered to every listener (this process too) when the transaction commits
+                await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, str(guild_id))
+        await self.reload(guild_id)
+        return self.get(guild_id)
+
+    async def _listen(self):
+        self._conn = await asyncpg.connect(self.dsn)
+        await self._conn.add_listener(NOTIFY_CHANNEL, self._notified)
+
+    def _notified(self, connection, pid, channel, payload):
+        asyncio.get_running_loop().create_task(self._reload_logged(int(payload)))
+
+    async def _reload_logged(self, guild_id: int):
+        try:
+            await self.reload(guild_id)
+        except Exception as e:
+            print(f"⚠️ Guild config reload failed for {guild_id}: {e}")
+
+    async def _run(self):
+        # Only checks that the listen connection is alive; config changes arrive by NOTIFY
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    raise ConnectionError("listen connection closed")
+                await self._conn.fetchval("SELECT 1")
+            except Exception as e:
+                print(f"⚠️ Guild config listener lost ({e}); reconnecting")
+                if self._conn is not None:
+                    self._conn.terminate()
+                    self._conn = None
+                try:
+                    await self._listen()
+                    await self.reload_all()
+                except Exception as e:
+                    print(f"⚠️ Guild config listener reconnect failed: {e}")
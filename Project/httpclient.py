@@ -0,0 +1,167 @@
+# ---------- Shared HTTP client ----------
+# One pooled aiohttp session for the whole bot, conditional GETs (ETag /
+# Last-Modified) for files we poll, and a size-bounded memory + disk LRU for
+# asset bytes such as avatars and guild icons.
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+
+import aiohttp
+
+
+class AssetCache:
+    def __init__(self, cache_dir: str, memory_bytes: int = 16 * 1024 * 1024, disk_bytes: int = 128 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()  # key -> bytes
+        self._memory_size = 0
+        self._disk = OrderedDict()  # filename -> size, oldest first
+        self._disk_size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def load_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isfile(path):
+                st = os.stat(path)
+                entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_size += size
+
+    @staticmethod
+    def _filename(key: str) -> str:
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _remember(self, key: str, data: bytes):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_size -= len(dropped)
+
+    def _read_disk(self, name: str):
+        path = os.path.join(self.cache_dir, name)
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        return data
+
+    def _write_disk(self, name: str, data: bytes, evict):
+        with open(os.path.join(self.cache_dir, name), "wb") as f:
+            f.write(data)
+        for old in evict:
+            try:
+                os.remove(os.path.join(self.cache_dir, old))
+            except OSError:
+                pass
+
+    async def get(self, key: str):
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return data
+        name = self._filename(key)
+        if name in self._disk:
+            try:
+                data = await asyncio.to_thread(self._read_disk, name)
+            except OSError:
+                self._disk_size -= self._disk.pop(name)
+                data = None
+            if data is not None:
+                self._disk.move_to_end(name)
+                self._remember(key, data)
+                self.disk_hits += 1
+                return data
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: bytes):
+        self._remember(key, data)
+        name = self._filename(key)
+        if name in self._disk:
+            self._disk_size -= self._disk.pop(name)
+        self._disk[name] = len(data)
+        self._disk_size += len(data)
+        evict = []
+        while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+            old, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            evict.append(old)
+        try:
+            await asyncio.to_thread(self._write_disk, name, data, evict)
+        except OSError as e:
+            self._disk_size -= self._disk.pop(name, 0)
+            print(f"⚠️ Asset cache write failed: {e}")
+
+
+class BotHTTP:
+    def __init__(self, cache_dir: str, connections: int = 20, timeout: float = 15.0, **cache_kwargs):
+        self.connections = connections
+        self.timeout = timeout
+        self.session = None
+        self.assets = AssetCache(cache_dir, **cache_kwargs)
+        self._validators = {}  # url -> (etag, last_modified)
+        self._inflight = {}
+
+    async def start(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            await asyncio.to_thread(self.assets.load_index)
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    async def get_if_changed(self, url: str):
+        # (status, text). status 304 means unchanged since the last 200; text is then None
+        headers = {}
+        etag, last_modified = self._validators.get(url, (None, None))
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 304:
+                return 304, None
+            if response.status != 200:
+                return response.status, None
+            text = await response.text()
+            self._validators[url] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            return 200, text
+
+    async def asset_bytes(self, key: str, url: str):
+        # key should include the asset hash and size, so a changed avatar is a new key
+        data = await self.assets.get(key)
+        if data is not None:
+            return data
+        fut = self._inflight.get(key)
+        if fut is not None:
+            return await fut
+        fut = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                data = await response.read()
+            await self.assets.put(key, data)
+            fut.set_result(data)
+            return data
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()
+            raise
+        finally:
+            del self._inflight[key]
@@ -0,0 +1,166 @@
+# ---------- Live daily leaderboard ----------
+# Every member with daily XP sits in a bucketed sorted list keyed by
+# (-daily_xp, user_id). Updates are a bisect + insert into one small bucket,
+# and both "top N from offset" and "position of user" are answered without
+# touching the database.
+from bisect import bisect_left, insort
+
+BUCKET_SIZE = 256
+
+
+class RankedList:
+    def __init__(self):
+        self._buckets = []
+        self._maxes = []
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def _locate(self, key):
+        i = bisect_left(self._maxes, key)
+        return min(i, len(self._buckets) - 1)
+
+    def add(self, key):
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            return
+        i = self._locate(key)
+        bucket = self._buckets[i]
+        insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+        self._len += 1
+        if len(bucket) > 2 * BUCKET_SIZE:
+            self._buckets[i:i + 1] = [bucket[:BUCKET_SIZE], bucket[BUCKET_SIZE:]]
+            self._maxes[i:i + 1] = [bucket[BUCKET_SIZE - 1], bucket[-1]]
+
+    def remove(self, key):
+        if not self._buckets:
+            return False
+        i = self._locate(key)
+        bucket = self._buckets[i]
+        j = bisect_left(bucket, key)
+        if j == len(bucket) or bucket[j] != key:
+            return False
+        del bucket[j]
+        self._len -= 1
+        if bucket:
+            self._maxes[i] = bucket[-1]
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+        return True
+
+    def index(self, key):
+        if not self._buckets:
+            return None
+        i = self._locate(key)
+        bucket = self._buckets[i]
+        j = bisect_left(bucket, key)
+        if j == len(bucket) or bucket[j] != key:
+            return None
+        return sum(len(b) for b in self._buckets[:i]) + j
+
+    def slice(self, offset: int, limit: int):
+        out = []
+        for bucket in self._buckets:
+            if offset >= len(bucket):
+                offset -= len(bucket)
+                continue
+            out.extend(bucket[offset:offset + limit - len(out)])
+            offset = 0
+            if len(out) >= limit:
+                break
+        return out
+
+
+class DailyBoard:
+    def __init__(self):
+        self._ranked = RankedList()
+        self._xp = {}  # user_id -> [daily_xp, total_xp]
+
+    def __len__(self):
+        return len(self._xp)
+
+    def __contains__(self, user_id):
+        return user_id in self._xp
+
+    def set(self, user_id: int, daily_xp: int, total_xp: int):
+        self.remove(user_id)
+        if daily_xp > 0:
+            self._xp[user_id] = [daily_xp, total_xp]
+            self._ranked.add((-daily_xp, user_id))
+
+    def add(self, user_id: int, xp: int, total_xp: int = None):
+        # total_xp is the member's new all-time XP, when the caller knows it
+        entry = self._xp.get(user_id)
+        if entry is None:
+            self.set(user_id, xp, xp if total_xp is None else total_xp)
+            return
+        self._ranked.remove((-entry[0], user_id))
+        entry[0] += xp
+        entry[1] = entry[1] + xp if total_xp is None else total_xp
+        self._ranked.add((-entry[0], user_id))
+
+    def remove(self, user_id: int):
+        entry = self._xp.pop(user_id, None)
+        if entry is not None:
+            self._ranked.remove((-entry[0], user_id))
+
+    def top(self, offset: int = 0, limit: int = 15):
+        # [(user_id, daily_xp, total_xp)]
+        return [(uid, -neg, self._xp[uid][1]) for neg, uid in self._ranked.slice(offset, limit)]
+
+    def position(self, user_id: int):
+        # 1-based place on today's board, or None without daily XP
+        entry = self._xp.get(user_id)
+        if entry is None:
+            return None
+        return self._ranked.index((-entry[0], user_id)) + 1
+
+    def daily_xp(self, user_id: int) -> int:
+        entry = self._xp.get(user_id)
+        return entry[0] if entry else 0
+
+
+class Leaderboards:
+    def __init__(self):
+        self._boards = {}
+
+    def board(self, guild_id: int) -> DailyBoard:
+        board = self._boards.get(guild_id)
+        if board is None:
+            board = self._boards[guild_id] = DailyBoard()
+        return board
+
+    def add_xp(self, guild_id: int, user_id: int, xp: int, total_xp: int = None):
+        self.board(guild_id).add(user_id, xp, total_xp)
+
+    def remove(self, guild_id: int, user_ids):
+        board = self._boards.get(guild_id)
+        if board:
+            for uid in user_ids:
+                board.remove(uid)
+
+    def reset(self, guild_id: int):
+        self._boards.pop(guild_id, None)
+
+    async def warm(self, pool, guild_ids=None):
+        async with pool.acquire() as conn:
+            if guild_ids is None:
+                rows = await conn.fetch("SELECT guild_id, user_id, daily_xp, total_xp FROM users WHERE daily_xp > 0")
+            else:
+                rows = await conn.fetch(
+                    "SELECT guild_id, user_id, daily_xp, total_xp FROM users"
+                    " WHERE daily_xp > 0 AND guild_id = ANY($1::bigint[])", list(guild_ids)
+                )
+        loaded = 0
+        for row in rows:
+            board = self.board(row['guild_id'])
+            if row['user_id'] in board:
+                continue  # live entry is newer than the DB (reconnect)
+            board.set(row['user_id'], row['daily_xp'], row['total_xp'])
+            loaded += 1
+        return loaded
@@ -0,0 +1,61 @@
+# ---------- Level curve ----------
+# Cumulative XP per level is precomputed once, so turning total XP into a level
+# is a bisect instead of re-summing the curve for every candidate level.
+from bisect import bisect_right
+
+
+class LevelCurve:
+    def __init__(self, required_xp, initial_levels: int = 200):
+        # required_xp(level) -> XP needed to go from level-1 to level
+        self.required_xp = required_xp
+        self._totals = [0]
+        self._extend(initial_levels)
+
+    @classmethod
+    def polynomial(cls, coef: float = 50, power: float = 2, base: float = 100, **kwargs):
+        return cls(lambda level: int(coef * (level ** power) + base), **kwargs)
+
+    @classmethod
+    def linear(cls, step: int = 100, base: int = 100, **kwargs):
+        return cls(lambda level: step * level + base, **kwargs)
+
+    @classmethod
+    def exponential(cls, base: int = 100, growth: float = 1.15, **kwargs):
+        return cls(lambda level: int(base * (growth ** (level - 1))), **kwargs)
+
+    @property
+    def max_cached_level(self) -> int:
+        return len(self._totals) - 1
+
+    def _extend(self, up_to_level: int):
+        totals = self._totals
+        for level in range(len(totals), up_to_level + 1):
+            need = self.required_xp(level)
+            if need <= 0:
+                raise ValueError(f"Level curve must be increasing (level {level} needs {need} XP)")
+            totals.append(totals[-1] + need)
+
+    def required_for_level(self, level: int) -> int:
+        return self.required_xp(level)
+
+    def total_for_level(self, level: int) -> int:
+        if level <= 0:
+            return 0
+        if level > self.max_cached_level:
+            self._extend(max(level, self.max_cached_level * 2))
+        return self._totals[level]
+
+    def level_for(self, total_xp: int) -> int:
+        totals = self._totals
+        while total_xp >= totals[-1]:
+            self._extend(max(1, self.max_cached_level) * 2)
+        return max(0, bisect_right(totals, total_xp) - 1)
+
+    def levels_for(self, xp_values):
+        # Batch lookup for leaderboards and resets; grows the table once for the largest value
+        xp_values = list(xp_values)
+        if not xp_values:
+            return []
+        self.level_for(max(xp_values))
+        totals = self._totals
+        return [max(0, bisect_right(totals, xp) - 1) for xp in xp_values]
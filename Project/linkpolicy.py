@@ -0,0 +1,94 @@
+# ---------- Link / invite policy ----------
+# One compiled regex pulls URLs and Discord invite codes out of a message in a
+# single pass. URL hosts are checked against a per-guild suffix trie of
+# allowed / denied domains (the longest matching suffix wins, anything
+# unlisted is blocked), and resolved invite codes are kept in a TTL cache so
+# invites to the guild itself don't need a REST lookup every time.
+import re
+import time
+
+LINK_RE = re.compile(
+    r"(?:https?://)?(?:www\.)?(?:discord(?:app)?\.com/invite|discord\.gg)/(?P<invite>[A-Za-z0-9-]+)"
+    r"|https?://(?:[^\s/@<>]+@)?(?P<host>[^\s/:?#<>()\[\]]+)",
+    re.IGNORECASE
+)
+ALLOW, DENY = True, False
+
+
+def normalize_domain(domain: str) -> str:
+    domain = domain.strip().lower()
+    domain = re.sub(r"^[a-z]+://", "", domain).split("/", 1)[0]
+    # A rule covers its subdomains anyway, so "*.example.com" is the same rule as "example.com"
+    if domain.startswith("*."):
+        domain = domain[2:]
+    return domain.strip(".")
+
+
+class DomainTrie:
+    def __init__(self):
+        self._root = {}  # label -> child node; None key holds the verdict
+
+    def add(self, domain: str, verdict: bool):
+        node = self._root
+        for label in reversed(normalize_domain(domain).split(".")):
+            node = node.setdefault(label, {})
+        node[None] = verdict
+
+    def lookup(self, host: str):
+        # Verdict of the longest listed suffix of host, or None
+        node = self._root
+        verdict = None
+        for label in reversed(host.lower().rstrip(".").split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            verdict = node.get(None, verdict)
+        return verdict
+
+
+class LinkPolicy:
+    def __init__(self, allow=(), deny=()):
+        self.allow = sorted({normalize_domain(d) for d in allow if d.strip()})
+        self.deny = sorted({normalize_domain(d) for d in deny if d.strip()})
+        self._trie = DomainTrie()
+        for domain in self.allow:
+            self._trie.add(domain, ALLOW)
+        for domain in self.deny:
+            self._trie.add(domain, DENY)
+
+    def scan(self, text: str):
+        # (first blocked link or None, [(invite_code, link)]) — invites still need resolving
+        invites = []
+        for m in LINK_RE.finditer(text):
+            code = m.group("invite")
+            if code:
+                invites.append((code, m.group()))
+            elif self._trie.lookup(m.group("host")) is not ALLOW:
+                return m.group(), invites
+        return None, invites
+
+
+class InviteCache:
+    def __init__(self, ttl: float = 3600.0, invalid_ttl: float = 300.0, max_entries: int = 5000):
+        self.ttl = ttl
+        self.invalid_ttl = invalid_ttl
+        self.max_entries = max_entries
+        self._codes = {}  # code -> (guild_id or 0 for invalid, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, code: str):
+        entry = self._codes.get(code)
+        if entry is None or entry[1] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def put(self, code: str, guild_id: int):
+        now = time.monotonic()
+        if len(self._codes) >= self.max_entries:
+            self._codes = {c: e for c, e in self._codes.items() if e[1] >= now}
+            if len(self._codes) >= self.max_entries:
+                self._codes.pop(next(iter(self._codes)))
+        self._codes[code] = (guild_id, now + (self.ttl if guild_id else self.invalid_ttl))
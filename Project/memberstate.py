@@ -0,0 +1,104 @@
+# ---------- Hot member-state cache ----------
+# The bot is the only writer to users / manual_ranks, so once a member is loaded
+# their XP and forced rank can be served from memory. Each guild keeps at most
+# max_per_guild members; the least recently used ones are evicted first.
+from collections import OrderedDict
+
+
+class MemberState:
+    __slots__ = ("total_xp", "daily_xp", "daily_msgs", "forced_rank")
+
+    def __init__(self, total_xp: int = 0, daily_xp: int = 0, daily_msgs: int = 0, forced_rank: str = None):
+        self.total_xp = total_xp
+        self.daily_xp = daily_xp
+        self.daily_msgs = daily_msgs
+        self.forced_rank = forced_rank
+
+    def as_row(self):
+        return {"total_xp": self.total_xp, "daily_msgs": self.daily_msgs, "daily_xp": self.daily_xp}
+
+
+class MemberStateCache:
+    def __init__(self, max_per_guild: int = 20000):
+        self.max_per_guild = max_per_guild
+        self._guilds = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return sum(len(members) for members in self._guilds.values())
+
+    def get(self, guild_id: int, user_id: int):
+        members = self._guilds.get(guild_id)
+        state = members.get(user_id) if members else None
+        if state is None:
+            self.misses += 1
+            return None
+        members.move_to_end(user_id)
+        self.hits += 1
+        return state
+
+    def put(self, guild_id: int, user_id: int, state: MemberState):
+        members = self._guilds.get(guild_id)
+        if members is None:
+            members = self._guilds[guild_id] = OrderedDict()
+        members[user_id] = state
+        members.move_to_end(user_id)
+        while len(members) > self.max_per_guild:
+            members.popitem(last=False)
+            self.evictions += 1
+        return state
+
+    def add_xp(self, guild_id: int, user_id: int, xp: int):
+        members = self._guilds.get(guild_id)
+        state = members.get(user_id) if members else None
+        if state is not None:
+            state.total_xp += xp
+            state.daily_xp += xp
+            state.daily_msgs += 1
+        return state
+
+    def set_forced_rank(self, guild_id: int, user_id: int, rank_str):
+        members = self._guilds.get(guild_id)
+        state = members.get(user_id) if members else None
+        if state is not None:
+            state.forced_rank = rank_str
+
+    def drop(self, guild_id: int, user_ids):
+        members = self._guilds.get(guild_id)
+        if members:
+            for uid in user_ids:
+                members.pop(uid, None)
+
+    def drop_guild(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def reset_daily(self, guild_id: int):
+        for state in self._guilds.get(guild_id, {}).values():
+            state.daily_xp = 0
+            state.daily_msgs = 0
+
+    async def warm(self, pool, guild_ids=None):
+        # Oldest activity first, so the most recent members survive the LRU cap;
+        # guild_ids limits the load to those guilds
+        where = "" if guild_ids is None else "WHERE guild_id = ANY($1::bigint[])"
+        args = () if guild_ids is None else (list(guild_ids),)
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(f"""
+                SELECT guild_id, user_id, u.total_xp, u.daily_xp, u.daily_msgs, m.forced_rank
+                FROM users u
+                FULL OUTER JOIN manual_ranks m USING (guild_id, user_id)
+                {where}
+                ORDER BY COALESCE(u.last_message_ts, 0)
+            """, *args)
+        loaded = 0
+        for row in rows:
+            members = self._guilds.get(row['guild_id'])
+            if members and row['user_id'] in members:
+                continue  # already live in memory (e.g. reconnect), which is newer than the DB
+            self.put(row['guild_id'], row['user_id'], MemberState(
+                row['total_xp'] or 0, row['daily_xp'] or 0, row['daily_msgs'] or 0, row['forced_rank']
+            ))
+            loaded += 1
+        return loaded
@@ -0,0 +1,199 @@
+# ---------- Prometheus metrics ----------
+# Minimal counters / gauges / histograms rendered in the Prometheus text
+# format and served by aiohttp on the bot's own event loop. Recording is a
+# dict lookup plus a bisect, so it is cheap enough for on_message.
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+
+    def inc(self, labels=(), amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _fmt_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn  # optional () -> {labels: value}, read at scrape time
+
+    def set(self, value: float, labels=()):
+        self._values[labels] = value
+
+    def samples(self):
+        values = self.fn() if self.fn else self._values
+        for labels, value in values.items():
+            yield self.name, _fmt_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, labels=()):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def samples(self):
+        for labels, state in self._values.items():
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                running += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", _fmt_labels(self.labelnames, labels, f'le="{le}"'), running
+            yield f"{self.name}_sum", _fmt_labels(self.labelnames, labels), state[-1]
+            yield f"{self.name}_count", _fmt_labels(self.labelnames, labels), running
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels=(), fn=None):
+        return self._add(Gauge(name, help, labels, fn))
+
+    def histogram(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{labels} {value}")
+            except Exception as e:
+                lines.append(f"# error collecting {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def _handle(self, request):
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class TimedPool:
+    # Wraps an asyncpg pool so `async with pool.acquire()` records how long
+    # callers waited for a connection; everything else is passed through.
+    def __init__(self, pool, acquire_seconds: Histogram):
+        self._pool = pool
+        self._acquire_seconds = acquire_seconds
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def acquire(self, timeout=None):
+        return _TimedAcquire(self._pool, self._acquire_seconds, timeout)
+
+
+class _TimedAcquire:
+    __slots__ = ("pool", "hist", "timeout", "conn")
+
+    def __init__(self, pool, hist, timeout):
+        self.pool = pool
+        self.hist = hist
+        self.timeout = timeout
+        self.conn = None
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        self.conn = await self.pool.acquire(timeout=self.timeout)
+        self.hist.observe(time.perf_counter() - start)
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        conn, self.conn = self.conn, None
+        await self.pool.release(conn)
+
+
+class RateLimitLogCounter(logging.Handler):
+    # discord.py retries 429s internally and only logs them; count those log lines
+    def __init__(self, counter: Counter):
+        super().__init__(logging.WARNING)
+        self.counter = counter
+
+    def emit(self, record):
+        msg = record.msg if isinstance(record.msg, str) else ""
+        if msg.startswith("We are being rate limited"):
+            method = record.args[0] if record.args else "?"
+            self.counter.inc((str(method),))
+        elif msg.startswith("Global rate limit"):
+            self.counter.inc(("GLOBAL",))
+
+
+async def watch_loop_lag(gauge: Gauge, hist: Histogram, interval: float = 0.5):
+    # How late a sleep(interval) wakes up is how long the loop was blocked
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        gauge.set(lag)
+        hist.observe(lag)
@@ -0,0 +1,72 @@
+# ---------- Staged message pipeline ----------
+# on_message runs a fixed list of stages over one MessageContext. A stage
+# returns STOP to skip the rest (bots, bypassed members, deleted messages),
+# errors are logged per stage without stopping the others, and every stage
+# keeps call count / time totals for /pipelinestats.
+import time
+
+STOP = object()
+
+
+class MessageContext:
+    __slots__ = ("message", "guild", "author", "moderate", "xp", "old_level", "new_level", "old_rank", "new_rank")
+
+    def __init__(self, message):
+        self.message = message
+        self.guild = message.guild
+        self.author = message.author
+        self.moderate = True
+        self.xp = 0
+        self.old_level = self.new_level = 0
+        self.old_rank = self.new_rank = None
+
+
+class StageStats:
+    __slots__ = ("calls", "stopped", "errors", "total", "max")
+
+    def __init__(self):
+        self.calls = 0
+        self.stopped = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class Pipeline:
+    def __init__(self, stages, observe=None):
+        # stages: [(name, async fn(ctx) -> STOP | None)]
+        self.stages = list(stages)
+        self.stats = {name: StageStats() for name, _ in self.stages}
+        self.observe = observe  # optional (stage_name, seconds) -> None, e.g. a metrics histogram
+
+    async def run(self, ctx):
+        for name, stage in self.stages:
+            stats = self.stats[name]
+            start = time.perf_counter()
+            try:
+                result = await stage(ctx)
+            except Exception as e:
+                stats.errors += 1
+                result = None
+                print(f"⚠️ on_message stage {name} failed: {e}")
+            elapsed = time.perf_counter() - start
+            stats.record(elapsed)
+            if self.observe:
+                self.observe(name, elapsed)
+            if result is STOP:
+                stats.stopped += 1
+                return name
+        return None
+
+    def snapshot(self):
+        # [(name, calls, stopped, errors, avg_ms, max_ms)]
+        return [
+            (name, s.calls, s.stopped, s.errors, s.total / s.calls * 1000 if s.calls else 0.0, s.max * 1000)
+            for name, s in self.stats.items()
+        ]
@@ -0,0 +1,89 @@
+# ---------- Token buckets ----------
+import time
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, per_seconds: float):
+        # capacity tokens, refilled evenly over per_seconds
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, amount: float = 1.0, now: float = None) -> float:
+        # 0 if the tokens were taken, otherwise seconds until they will be available
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def reserve(self, amount: float = 1.0, now: float = None) -> float:
+        # Like take(), but the tokens are always taken: the bucket goes negative and
+        # the caller waits the returned seconds, so callers queue up one refill apart
+        # instead of all retrying when the next token arrives
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class BucketTable:
+    # One TokenBucket per key, with limits set per group (e.g. per guild).
+    # A bucket left alone for per_seconds is full again, which is the same as
+    # having no bucket, so evict_idle() can drop it without changing behaviour.
+    def __init__(self, capacity: float, per_seconds: float):
+        self.default = (capacity, per_seconds)
+        self._limits = {}  # group -> (capacity, per_seconds)
+        self._buckets = {}  # (group, key) -> TokenBucket
+        self.allowed = 0
+        self.denied = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def has_limits(self, group) -> bool:
+        return group in self._limits
+
+    def limits(self, group):
+        return self._limits.get(group, self.default)
+
+    def configure(self, group, capacity: float = None, per_seconds: float = None):
+        # None for both restores the default; existing buckets of the group are reset
+        if capacity is None or per_seconds is None:
+            capacity, per_seconds = self.default
+        self._limits[group] = (capacity, per_seconds)
+        for k in [k for k in self._buckets if k[0] == group]:
+            del self._buckets[k]
+
+    def allow(self, group, key, now: float = None) -> bool:
+        bucket = self._buckets.get((group, key))
+        if bucket is None:
+            bucket = self._buckets[(group, key)] = TokenBucket(*self.limits(group))
+        if bucket.take(now=now) == 0.0:
+            self.allowed += 1
+            return True
+        self.denied += 1
+        return False
+
+    def evict_idle(self, now: float = None) -> int:
+        now = time.monotonic() if now is None else now
+        idle = [k for k, b in self._buckets.items() if now - b.updated >= b.capacity / b.rate]
+        for k in idle:
+            del self._buckets[k]
+        return len(idle)
+
+    def stats(self):
+        return {
+            "buckets": len(self._buckets),
+            "allowed": self.allowed,
+            "denied": self.denied,
+        }
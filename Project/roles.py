@@ -0,0 +1,197 @@
+# ---------- Rank role cache / reconciliation ----------
+# Rank role IDs are looked up once per guild and kept until a role event
+# invalidates them. Rank changes are applied as a single member.edit(roles=...)
+# and only when the member's roles actually differ from the target.
+import asyncio
+
+
+class RankRoleCache:
+    def __init__(self, prefix: str, rank_names):
+        self.prefix = prefix
+        self.rank_names = rank_names  # list, or (guild_id) -> list for per-guild ranks
+        self._by_guild = {}  # guild_id -> {rank_name: role_id}
+
+    def _scan(self, guild):
+        names = self.rank_names(guild.id) if callable(self.rank_names) else self.rank_names
+        wanted = {f"{self.prefix}{rn}": rn for rn in names}
+        found = {}
+        for role in guild.roles:
+            rn = wanted.get(role.name)
+            if rn and rn not in found:
+                found[rn] = role.id
+        self._by_guild[guild.id] = found
+        return found
+
+    def role_ids(self, guild):
+        found = self._by_guild.get(guild.id)
+        if found is None:
+            found = self._scan(guild)
+        return found
+
+    def all_ids(self, guild):
+        return set(self.role_ids(guild).values())
+
+    def get_role(self, guild, rank_name: str):
+        role_id = self.role_ids(guild).get(rank_name)
+        role = guild.get_role(role_id) if role_id else None
+        if role_id and role is None:
+            # Deleted behind our back; rescan once
+            role_id = self._scan(guild).get(rank_name)
+            role = guild.get_role(role_id) if role_id else None
+        return role
+
+    def remember(self, guild, rank_name: str, role):
+        self.role_ids(guild)[rank_name] = role.id
+
+    def invalidate(self, guild_id: int):
+        self._by_guild.pop(guild_id, None)
+
+
+class RoleNameCache:
+    # IDs of every role with a given name (e.g. the moderation bypass role), per guild
+    def __init__(self, name):
+        self.name = name  # role name, or (guild_id) -> name for a per-guild setting
+        self._by_guild = {}  # guild_id -> frozenset(role_id)
+
+    def role_ids(self, guild):
+        ids = self._by_guild.get(guild.id)
+        if ids is None:
+            name = self.name(guild.id) if callable(self.name) else self.name
+            ids = self._by_guild[guild.id] = frozenset(r.id for r in guild.roles if r.name == name)
+        return ids
+
+    def member_has(self, member) -> bool:
+        return any(member.get_role(role_id) for role_id in self.role_ids(member.guild))
+
+    def invalidate(self, guild_id: int):
+        self._by_guild.pop(guild_id, None)
+
+
+def desired_roles(member, rank_role_ids, target_role_id):
+    # Member's roles with every rank role swapped for the target one (if any)
+    keep = [r for r in member.roles if not r.is_default() and r.id not in rank_role_ids]
+    current = {r.id for r in member.roles if not r.is_default()}
+    wanted = {r.id for r in keep}
+    if target_role_id:
+        wanted.add(target_role_id)
+    return keep, current, wanted
+
+
+def plan_rank_changes(guild, cache: RankRoleCache, targets):
+    # targets: user_id -> rank name (or None). Returns only the members whose
+    # rank roles don't already match, found by walking the rank roles' holders
+    # instead of every member of the guild.
+    held = {}
+    for rank_name, role_id in cache.role_ids(guild).items():
+        role = guild.get_role(role_id)
+        if role:
+            for m in role.members:
+                held.setdefault(m.id, set()).add(rank_name)
+
+    plan = {}
+    for uid in held.keys() | targets.keys():
+        want = targets.get(uid)
+        have = held.get(uid, set())
+        if have == ({want} if want else set()):
+            continue
+        if guild.get_member(uid) is None:
+            continue
+        plan[uid] = want
+    return plan
+
+
+# ---------- Bulk role sync job ----------
+# The plan is written to role_sync_queue before any role is touched and rows
+# are deleted as members are done, so a restart resumes where it stopped.
+class RoleSyncJob:
+    def __init__(self, pool, guild, apply, concurrency: int = 4, per_second: float = 2.0,
+                 on_progress=None, checkpoint_every: int = 25):
+        self.pool = pool
+        self.guild = guild
+        self.apply = apply  # async (guild, member, rank_name) -> changed; raises when it fails
+        self.concurrency = concurrency
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self.on_progress = on_progress
+        self.checkpoint_every = checkpoint_every
+        self.total = 0
+        self.done = 0
+        self.changed = 0
+        self.failed = 0
+        self._next_slot = 0.0
+        self._finished = []
+
+    @staticmethod
+    async def enqueue(pool, guild_id: int, plan):
+        if not plan:
+            return
+        async with pool.acquire() as conn:
+            await conn.executemany("""
+                INSERT INTO role_sync_queue (guild_id, user_id, target_rank)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (guild_id, user_id)
+                DO UPDATE SET target_rank = $3
+            """, [(guild_id, uid, rank) for uid, rank in plan.items()])
+
+    async def _pace(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _checkpoint(self):
+        if not self._finished:
+            return
+        done, self._finished = self._finished, []
+        # Only rows still holding the rank we applied: enqueue may have upserted a
+        # newer target meanwhile, which run() picks up on its next pass
+        async with self.pool.acquire() as conn:
+            await conn.execute("""
+                DELETE FROM role_sync_queue q
+                USING unnest($2::bigint[], $3::text[]) AS d(user_id, target_rank)
+                WHERE q.guild_id = $1 AND q.user_id = d.user_id
+                  AND q.target_rank IS NOT DISTINCT FROM d.target_rank
+            """, self.guild.id, [uid for uid, _ in done], [rank for _, rank in done])
+
+    async def _worker(self, queue):
+        while True:
+            try:
+                uid, rank_name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            member = self.guild.get_member(uid)
+            try:
+                if member:
+                    await self._pace()
+                    if await self.apply(self.guild, member, rank_name):
+                        self.changed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️ Role sync error for {uid} in {self.guild.id}: {e}")
+            self.done += 1
+            self._finished.append((uid, rank_name))
+            if len(self._finished) >= self.checkpoint_every:
+                await self._checkpoint()
+                if self.on_progress:
+                    await self.on_progress(self)
+
+    async def run(self):
+        # Keep draining: rows added while running (e.g. another reset) are picked up too
+        while True:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    "SELECT user_id, target_rank FROM role_sync_queue WHERE guild_id=$1 ORDER BY user_id",
+                    self.guild.id
+                )
+            if not rows:
+                break
+            queue = asyncio.Queue()
+            for row in rows:
+                queue.put_nowait((row['user_id'], row['target_rank']))
+            self.total += len(rows)
+            await asyncio.gather(*(self._worker(queue) for _ in range(self.concurrency)))
+            await self._checkpoint()
+        if self.on_progress:
+            await self.on_progress(self)
+        return self
@@ -0,0 +1,62 @@
+# ---------- Daily rollover ----------
+# One transaction per guild: claims (guild, day) in daily_rollovers so a
+# second run for the same day (restart, shard failover) is a no-op, then one
+# statement locks the guild's active users rows, archives their daily counters
+# and the rank they earned (a manual rank wins) into daily_history, zeroes the
+# counters and returns every member who should hold a rank role. XP merged
+# while it runs waits on the row locks and lands in the new day instead of
+# being lost between a read and a separate reset.
+import zlib
+
+CLAIM_SQL = """
+    INSERT INTO daily_rollovers (guild_id, day) VALUES ($1, $2)
+    ON CONFLICT (guild_id, day) DO NOTHING
+    RETURNING day
+"""
+
+# FOR UPDATE can't lock the nullable side of an outer join, so the users rows
+# are locked on their own and joined with manual_ranks afterwards
+ROLLOVER_SQL = """
+    WITH ranks AS (
+        SELECT name, min_xp FROM unnest($3::text[], $4::int[]) AS r(name, min_xp)
+    ), active AS (
+        SELECT user_id, daily_xp, daily_msgs FROM users
+        WHERE guild_id = $1 AND (daily_xp <> 0 OR daily_msgs <> 0)
+        FOR UPDATE
+    ), old AS (
+        SELECT user_id, COALESCE(a.daily_xp, 0) AS daily_xp, COALESCE(a.daily_msgs, 0) AS daily_msgs,
+               COALESCE(m.forced_rank, (
+                   SELECT name FROM ranks WHERE COALESCE(a.daily_xp, 0) >= min_xp ORDER BY min_xp DESC LIMIT 1
+               )) AS rank
+        FROM active a
+        FULL JOIN (SELECT user_id, forced_rank FROM manual_ranks WHERE guild_id = $1) m USING (user_id)
+    ), archived AS (
+        INSERT INTO daily_history (guild_id, user_id, day, daily_xp, daily_msgs, rank)
+        SELECT $1, user_id, $2, daily_xp, daily_msgs, rank FROM old
+    ), reset AS (
+        UPDATE users u SET daily_xp = 0, daily_msgs = 0
+        FROM active a
+        WHERE u.guild_id = $1 AND u.user_id = a.user_id
+    )
+    SELECT user_id, rank FROM old WHERE rank IS NOT NULL
+"""
+
+
+def reset_offset(guild_id: int, spread_seconds: int) -> int:
+    # Seconds after local midnight for this guild's rollover; stable across restarts
+    if spread_seconds <= 0:
+        return 0
+    return zlib.crc32(str(guild_id).encode()) % spread_seconds
+
+
+async def roll_over_guild(pool, guild_id: int, day, ranks):
+    # ranks: ((rank_name, min_daily_xp), ...). Returns user_id -> rank for every
+    # member who should hold one (everyone else holds none), or None if the day
+    # was already done
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            if await conn.fetchval(CLAIM_SQL, guild_id, day) is None:
+                return None
+            rows = await conn.fetch(ROLLOVER_SQL, guild_id, day,
+                                    [name for name, _ in ranks], [thresh for _, thresh in ranks])
+    return {row['user_id']: row['rank'] for row in rows}
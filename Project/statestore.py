@@ -0,0 +1,156 @@
+# ---------- Durable runtime state ----------
+# Small key/value layer for bot state that used to live in module-level dicts
+# (recent channels, custom status, counter channels, last joined member).
+# Entries are loaded from bot_state on first access, kept in a bounded LRU,
+# and changes are written behind in batches every flush_interval seconds.
+import asyncio
+import json
+from collections import OrderedDict
+
+from flushloop import FlushLoop
+
+_MISSING = object()  # cached "no row in the database"
+_DELETED = object()  # pending delete in the dirty map
+
+UPSERT_SQL = """
+    INSERT INTO bot_state (namespace, scope_id, key, value)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (namespace, scope_id, key)
+    DO UPDATE SET value = EXCLUDED.value
+"""
+DELETE_SQL = "DELETE FROM bot_state WHERE namespace=$1 AND scope_id=$2 AND key=$3"
+
+
+class StateStore:
+    def __init__(self, flush_interval: float = 5.0, max_entries: int = 50000):
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.pool = None
+        self._cache = OrderedDict()  # (namespace, scope_id, key) -> value or _MISSING
+        self._dirty = {}  # (namespace, scope_id, key) -> value or _DELETED
+        self._loading = {}
+        self._lock = asyncio.Lock()
+        self._loop = FlushLoop(self.flush, flush_interval)
+        self.hits = 0
+        self.loads = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+
+    def start(self, pool):
+        self.pool = pool
+        self._loop.start()
+
+    async def stop(self):
+        await self._loop.stop()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _remember(self, k, value):
+        self._cache[k] = value
+        self._cache.move_to_end(k)
+        # Evicting a dirty entry is safe: _dirty keeps it until the next flush
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def get(self, namespace: str, scope_id: int, key: int = 0, default=None):
+        k = (namespace, scope_id, key)
+        value = self._cache.get(k, _MISSING)
+        if value is not _MISSING or k in self._cache:
+            self._cache.move_to_end(k)
+            self.hits += 1
+            return default if value is _MISSING else value
+        value = self._dirty.get(k, _MISSING)
+        if value is not _MISSING:
+            value = _MISSING if value is _DELETED else value
+        else:
+            value = await self._load(k)
+        return default if value is _MISSING else value
+
+    async def _load(self, k):
+        fut = self._loading.get(k)
+        if fut is not None:
+            return await fut
+        fut = self._loading[k] = asyncio.get_running_loop().create_future()
+        try:
+            async with self.pool.acquire() as conn:
+                raw = await conn.fetchval(
+                    "SELECT value FROM bot_state WHERE namespace=$1 AND scope_id=$2 AND key=$3", *k
+                )
+            self.loads += 1
+            if k in self._cache:
+                value = self._cache[k]  # set() while we were loading; that one is newer
+            else:
+                value = _MISSING if raw is None else json.loads(raw)
+                self._remember(k, value)
+            fut.set_result(value)
+            return value
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()
+            raise
+        finally:
+            del self._loading[k]
+
+    def forget(self, namespace: str, scope_id: int, key: int = 0):
+        # Drop a cached value so the next get() re-reads it (state another process writes)
+        k = (namespace, scope_id, key)
+        if k not in self._dirty:
+            self._cache.pop(k, None)
+
+    def forget_scopes(self, scope_ids):
+        # Drop every cached value for these scopes (guilds another process owned until now)
+        scope_ids = set(scope_ids)
+        for k in [k for k in self._cache if k[1] in scope_ids and k not in self._dirty]:
+            del self._cache[k]
+
+    def set(self, namespace: str, scope_id: int, key: int, value):
+        k = (namespace, scope_id, key)
+        self._remember(k, value)
+        self._dirty[k] = value
+
+    def delete(self, namespace: str, scope_id: int, key: int = 0):
+        k = (namespace, scope_id, key)
+        self._remember(k, _MISSING)
+        self._dirty[k] = _DELETED
+
+    async def flush(self):
+        async with self._lock:
+            if not self._dirty or self.pool is None:
+                return 0
+            batch, self._dirty = self._dirty, {}
+            upserts = [k + (json.dumps(v),) for k, v in batch.items() if v is not _DELETED]
+            deletes = [k for k, v in batch.items() if v is _DELETED]
+            try:
+                async with self.pool.acquire() as conn:
+                    async with conn.transaction():
+                        if upserts:
+                            await conn.executemany(UPSERT_SQL, upserts)
+                        if deletes:
+                            await conn.executemany(DELETE_SQL, deletes)
+                self.flushed += len(batch)
+                return len(batch)
+            except Exception as e:
+                self.failed_flushes += 1
+                self._requeue(batch)
+                print(f"⚠️ State flush failed ({len(batch)} entries kept for retry): {e}")
+                return 0
+            except BaseException:
+                # Cancelled mid-write: the transaction was rolled back, keep the batch
+                self._requeue(batch)
+                raise
+
+    def _requeue(self, batch):
+        # Keep anything not overwritten since, so the next flush retries it
+        for k, v in batch.items():
+            self._dirty.setdefault(k, v)
+
+    def stats(self):
+        return {
+            "cached": len(self._cache),
+            "dirty": len(self._dirty),
+            "hits": self.hits,
+            "loads": self.loads,
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+        }
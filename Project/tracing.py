@@ -0,0 +1,130 @@
+# ---------- Timing spans / slow-operation log / sampling profiler ----------
+# Tracer.span wraps a coroutine function and times every call. Slow calls are
+# logged with the guild / user IDs found in their arguments; the IDs are only
+# dug out once a call is already over the threshold, so fast calls pay for
+# two perf_counter() reads and a callback.
+# StackSampler samples the event-loop thread's stack from a helper thread,
+# so it can be switched on in production for a few seconds at a time.
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def _ids_from(value):
+    # (guild_id, user_id) for the discord objects we pass around
+    guild = getattr(value, "guild", None)
+    guild_id = getattr(guild, "id", None) or getattr(value, "guild_id", None)
+    user = getattr(value, "user", None) or getattr(value, "author", None)
+    user_id = getattr(user, "id", None)
+    if user_id is None and guild is not None and hasattr(value, "roles"):
+        user_id = getattr(value, "id", None)  # a Member
+    if guild_id is None and hasattr(value, "roles") and hasattr(value, "member_count"):
+        guild_id = getattr(value, "id", None)  # a Guild
+    return guild_id, user_id
+
+
+class Tracer:
+    def __init__(self, slow_seconds: float = 0.25, observe=None):
+        self.slow_seconds = slow_seconds
+        self.observe = observe  # optional (span_name, seconds) -> None
+        self.slow_calls = 0
+
+    def span(self, fn=None, *, name: str = None):
+        # Usable as @tracer.span or @tracer.span(name="...")
+        if fn is None:
+            return lambda f: self.span(f, name=name)
+        span_name = name or fn.__name__
+        params = list(inspect.signature(fn).parameters)
+        id_positions = {p: params.index(p) for p in ("guild_id", "user_id") if p in params}
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if self.observe:
+                    self.observe(span_name, elapsed)
+                if elapsed >= self.slow_seconds:
+                    self._log_slow(span_name, elapsed, args, kwargs, id_positions)
+
+        return wrapper
+
+    def _log_slow(self, span_name, elapsed, args, kwargs, id_positions):
+        self.slow_calls += 1
+        ids = {}
+        for param, pos in id_positions.items():
+            value = kwargs.get(param, args[pos] if pos < len(args) else None)
+            if value is not None:
+                ids[param] = value
+        for value in list(args) + list(kwargs.values()):
+            if len(ids) == 2:
+                break
+            guild_id, user_id = _ids_from(value)
+            if guild_id and "guild_id" not in ids:
+                ids["guild_id"] = guild_id
+            if user_id and "user_id" not in ids:
+                ids["user_id"] = user_id
+        where = ", ".join(f"{k.split('_')[0]}={v}" for k, v in ids.items())
+        print(f"🐢 Slow {span_name}: {elapsed * 1000:.0f} ms" + (f" ({where})" if where else ""))
+
+
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 40):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _stack(self, frame):
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return tuple(reversed(parts))
+
+    def run(self, seconds: float):
+        # Blocking: call it from a worker thread. Returns (Counter of stacks, sample count)
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("profiler already running")
+        try:
+            stacks = Counter()
+            samples = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    stacks[self._stack(frame)] += 1
+                    samples += 1
+                del frame
+                time.sleep(self.interval)
+            return stacks, samples
+        finally:
+            self._lock.release()
+
+
+def format_profile(stacks: Counter, samples: int, top: int = 15) -> str:
+    # Top full stacks, then the functions that were on top of the stack most often
+    if not samples:
+        return "No samples collected."
+    lines = [f"{samples} samples", "", f"Top {top} stacks (leaf last):"]
+    for stack, count in stacks.most_common(top):
+        lines.append(f"{count / samples:6.1%}  " + " > ".join(stack[-8:]))
+    leaves = Counter()
+    for stack, count in stacks.items():
+        if stack:
+            leaves[stack[-1]] += count
+    lines += ["", f"Top {top} functions (self time):"]
+    for leaf, count in leaves.most_common(top):
+        lines.append(f"{count / samples:6.1%}  {leaf}")
+    return "\n".join(lines)
@@ -0,0 +1,115 @@
+# ---------- Bad word matcher (Aho-Corasick) ----------
+# All words from badwords.txt are compiled once into a single automaton, so a
+# message is scanned in one pass no matter how long the list is.
+import re
+
+LEET_TABLE = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s",
+    "7": "t", "8": "b", "@": "a", "$": "s", "!": "i",
+})
+SEPARATORS = r"[\s._*\-]"
+# Three or more single characters split by separators, e.g. "f u c k" / "f.u.c.k"
+SPACED_RUN = re.compile(rf"(?<!\w)\w(?:{SEPARATORS}+\w(?!\w)){{2,}}")
+SEPARATOR_RE = re.compile(SEPARATORS + "+")
+
+
+def normalize_text(text: str) -> str:
+    text = text.lower().translate(LEET_TABLE)
+    return SPACED_RUN.sub(lambda m: SEPARATOR_RE.sub("", m.group()), text)
+
+
+class BadWordMatcher:
+    def __init__(self, words, word_boundary: bool = False, normalize: bool = False):
+        self.word_boundary = word_boundary
+        self.normalize = normalize
+        self._words = []
+        self._lengths = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._term = [-1]   # pattern id ending exactly at this state
+        self._link = [0]    # nearest proper suffix state that ends a pattern
+        self._out = [-1]    # first pattern id reachable from this state
+
+        seen = set()
+        for word in words:
+            word = word.strip().lower()
+            if not word:
+                continue
+            key = normalize_text(word) if normalize else word
+            if key in seen:
+                continue
+            seen.add(key)
+            self._add(key, word)
+        self._build()
+
+    def __len__(self):
+        return len(self._words)
+
+    def _add(self, key: str, word: str):
+        state = 0
+        for ch in key:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._term.append(-1)
+                self._link.append(0)
+                self._out.append(-1)
+                self._goto[state][ch] = nxt
+            state = nxt
+        if self._term[state] < 0:
+            self._term[state] = len(self._words)
+            self._words.append(word)
+            self._lengths.append(len(key))
+
+    def _build(self):
+        goto, fail, term, link, out = self._goto, self._fail, self._term, self._link, self._out
+        queue = list(goto[0].values())
+        for s in queue:
+            out[s] = term[s]
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i += 1
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[nxt] = f
+                link[nxt] = f if term[f] >= 0 else link[f]
+                out[nxt] = term[nxt] if term[nxt] >= 0 else out[f]
+                queue.append(nxt)
+
+    def _bounded(self, text: str, end: int, length: int) -> bool:
+        start = end - length + 1
+        if start > 0 and text[start - 1].isalnum():
+            return False
+        if end + 1 < len(text) and text[end + 1].isalnum():
+            return False
+        return True
+
+    def find(self, text: str):
+        if not self._words or not text:
+            return None
+        text = normalize_text(text) if self.normalize else text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0) if state else root.get(ch, 0)
+            hit = out[state]
+            if hit < 0:
+                continue
+            if not self.word_boundary:
+                return self._words[hit]
+            s = state if self._term[state] >= 0 else self._link[state]
+            while s:
+                pid = self._term[s]
+                if self._bounded(text, i, self._lengths[pid]):
+                    return self._words[pid]
+                s = self._link[s]
+        return None
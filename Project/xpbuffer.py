@@ -0,0 +1,134 @@
+# ---------- Write-behind XP buffer ----------
+# XP increments are summed per (guild_id, user_id) in memory and written to the
+# users table in one COPY + merge every flush_interval seconds or flush_batch
+# events, whichever comes first.
+import asyncio
+import time
+
+from flushloop import FlushLoop
+
+MERGE_SQL = """
+    INSERT INTO users (guild_id, user_id, total_xp, daily_xp, daily_msgs, last_message_ts, channel_id)
+    SELECT guild_id, user_id, xp, xp, msgs, last_message_ts, channel_id FROM xp_batch
+    ON CONFLICT (guild_id, user_id)
+    DO UPDATE SET
+        total_xp = users.total_xp + EXCLUDED.total_xp,
+        daily_xp = users.daily_xp + EXCLUDED.daily_xp,
+        daily_msgs = users.daily_msgs + EXCLUDED.daily_msgs,
+        last_message_ts = EXCLUDED.last_message_ts,
+        channel_id = EXCLUDED.channel_id
+"""
+BATCH_COLUMNS = ("guild_id", "user_id", "xp", "msgs", "last_message_ts", "channel_id")
+
+
+class XPBuffer:
+    def __init__(self, flush_interval: float = 2.0, flush_batch: int = 500, max_pending: int = 10000):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_pending = max_pending
+        self.pool = None
+        # (guild_id, user_id) -> [xp, msgs, last_message_ts, channel_id]
+        self._pending = {}
+        self._inflight = {}
+        self._events = 0
+        self._lock = asyncio.Lock()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._loop = FlushLoop(self.flush, flush_interval)
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+
+    def start(self, pool):
+        self.pool = pool
+        self._loop.start()
+
+    async def stop(self):
+        await self._loop.stop()
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def add(self, guild_id: int, user_id: int, xp: int, channel_id: int):
+        key = (guild_id, user_id)
+        # Backpressure: wait for a flush instead of growing without bound. Before
+        # start() there is no pool to flush to, so nothing would ever drain it
+        while self.pool is not None and key not in self._pending and len(self._pending) >= self.max_pending:
+            self._drained.clear()
+            self._loop.wake()
+            await self._drained.wait()
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [xp, 1, int(time.time()), channel_id]
+        else:
+            entry[0] += xp
+            entry[1] += 1
+            entry[2] = int(time.time())
+            entry[3] = channel_id
+        self._events += 1
+        if self._events >= self.flush_batch:
+            self._loop.wake()
+
+    def pending_for(self, guild_id: int, user_id: int):
+        xp = msgs = 0
+        for store in (self._inflight, self._pending):
+            entry = store.get((guild_id, user_id))
+            if entry:
+                xp += entry[0]
+                msgs += entry[1]
+        return xp, msgs
+
+    async def discard(self, guild_id: int, user_id: int = None):
+        async with self._lock:
+            if user_id is not None:
+                self._pending.pop((guild_id, user_id), None)
+                return
+            for key in [k for k in self._pending if k[0] == guild_id]:
+                del self._pending[key]
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending or self.pool is None:
+                self._drained.set()
+                return 0
+            self._inflight, self._pending = self._pending, {}
+            self._events = 0
+            self._drained.set()
+            records = [(gid, uid, e[0], e[1], e[2], e[3]) for (gid, uid), e in self._inflight.items()]
+            try:
+                async with self.pool.acquire() as conn:
+                    async with conn.transaction():
+                        await conn.execute("""
+                            CREATE TEMP TABLE xp_batch (
+                                guild_id BIGINT,
+                                user_id BIGINT,
+                                xp INTEGER,
+                                msgs INTEGER,
+                                last_message_ts INTEGER,
+                                channel_id BIGINT
+                            ) ON COMMIT DROP
+                        """)
+                        await conn.copy_records_to_table("xp_batch", records=records, columns=BATCH_COLUMNS)
+                        await conn.execute(MERGE_SQL)
+                self.flushed_rows += len(records)
+                return len(records)
+            except Exception as e:
+                self.failed_flushes += 1
+                self._requeue_inflight()
+                print(f"⚠️ XP flush failed ({len(records)} rows kept for retry): {e}")
+                return 0
+            except BaseException:
+                # Cancelled mid-write: the transaction was rolled back, keep the batch
+                self._requeue_inflight()
+                raise
+            finally:
+                self._inflight = {}
+
+    def _requeue_inflight(self):
+        # Put the batch back so the next flush retries it
+        for key, failed in self._inflight.items():
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = failed
+            else:
+                entry[0] += failed[0]
+                entry[1] += failed[1]